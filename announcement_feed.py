@@ -0,0 +1,122 @@
+"""
+Лента объявлений: закреплённые сверху, затем свежие по категории
+Закреплённые отдаются только на первой странице (частичный индекс по
+is_pinned), остальные листаются keyset-курсором (created_at, id) по индексу
+(category, created_at DESC, id DESC). Первая страница - то, что запрашивает
+каждая загрузка дашборда, поэтому приложения держат её в HotCache.
+"""
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from duty_calendar import FilterError
+
+ANNOUNCEMENT_PRIORITIES = ('normal', 'important', 'urgent')
+
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE = 50
+MAX_PINNED = 20
+
+
+def feed_columns(quote: str = '"') -> str:
+    """SELECT list of the feed; quote is the alias quoting of the dialect"""
+    q = quote
+    return (f'a.id, a.title, a.content, a.category, a.priority, a.is_pinned as {q}isPinned{q}, '
+            f'a.author_id as {q}authorId{q}, a.created_at as {q}createdAt{q}, u.name as {q}authorName{q}')
+
+
+def encode_cursor(row: Mapping[str, Any]) -> str:
+    created = row['createdAt']
+    created = created.isoformat() if hasattr(created, 'isoformat') else str(created)
+    return base64.urlsafe_b64encode(f"{created}|{row['id']}".encode()).decode()
+
+
+def decode_cursor(value: str) -> Tuple[datetime, str]:
+    """Keyset position (created_at, id) from an opaque cursor"""
+    try:
+        created, row_id = base64.urlsafe_b64decode(value.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(created), row_id
+    except (ValueError, UnicodeDecodeError):
+        raise FilterError('Invalid cursor')
+
+
+class FeedQuery:
+    """Parsed feed request: SQL for the pinned and recent parts and the cache key"""
+
+    __slots__ = ('category', 'limit', 'cursor', 'position')
+
+    def __init__(self, category: Optional[str], limit: int, cursor: Optional[str]):
+        self.category = category
+        self.limit = limit
+        self.cursor = cursor
+        self.position = decode_cursor(cursor) if cursor else None
+
+    @property
+    def first_page(self) -> bool:
+        return self.position is None
+
+    @property
+    def cache_key(self) -> Tuple[Optional[str], int]:
+        return self.category, self.limit
+
+    @property
+    def etag_params(self) -> Dict[str, Any]:
+        # Нормализованные параметры: лишние аргументы запроса не плодят варианты ETag
+        return {'category': self.category, 'limit': self.limit, 'cursor': self.cursor}
+
+    def pinned(self, columns: str) -> Tuple[str, List[Any]]:
+        where, params = ['a.is_pinned = TRUE'], []
+        if self.category:
+            where.append('a.category = %s')
+            params.append(self.category)
+        return (f"""SELECT {columns} FROM announcements a LEFT JOIN users u ON a.author_id = u.id
+                    WHERE {' AND '.join(where)} ORDER BY a.created_at DESC LIMIT %s""",
+                params + [MAX_PINNED])
+
+    def recent(self, columns: str) -> Tuple[str, List[Any]]:
+        where, params = ['a.is_pinned = FALSE'], []
+        if self.category:
+            where.append('a.category = %s')
+            params.append(self.category)
+        if self.position:
+            where.append('(a.created_at, a.id) < (%s, %s)')
+            params.extend(self.position)
+        # Одна лишняя строка показывает, есть ли следующая страница
+        return (f"""SELECT {columns} FROM announcements a LEFT JOIN users u ON a.author_id = u.id
+                    WHERE {' AND '.join(where)} ORDER BY a.created_at DESC, a.id DESC LIMIT %s""",
+                params + [self.limit + 1])
+
+    def payload(self, pinned: List[Dict[str, Any]], recent: List[Dict[str, Any]]) -> Dict[str, Any]:
+        next_cursor = encode_cursor(recent[self.limit - 1]) if len(recent) > self.limit else None
+        return {'pinned': pinned, 'announcements': recent[:self.limit], 'nextCursor': next_cursor}
+
+
+def feed_query(args: Mapping[str, str]) -> FeedQuery:
+    """Parse category/limit/cursor; raises FilterError with a client-facing message"""
+    category = (args.get('category') or '').strip()[:100] or None
+    raw_limit = args.get('limit')
+    try:
+        limit = int(raw_limit) if raw_limit else FEED_PAGE_SIZE
+    except ValueError:
+        raise FilterError('Invalid limit')
+    if not 1 <= limit <= MAX_FEED_PAGE:
+        raise FilterError(f'limit must be between 1 and {MAX_FEED_PAGE}')
+    return FeedQuery(category, limit, args.get('cursor') or None)
+
+
+def announcement_fields(data: Mapping[str, Any], partial: bool = False) -> Dict[str, Any]:
+    """category/priority/isPinned of a create or edit payload as column values"""
+    fields: Dict[str, Any] = {}
+    if 'category' in data or not partial:
+        fields['category'] = str(data.get('category') or '').strip()[:100] or None
+    if 'priority' in data or not partial:
+        priority = data.get('priority') or 'normal'
+        if priority not in ANNOUNCEMENT_PRIORITIES:
+            raise FilterError('Invalid priority')
+        fields['priority'] = priority
+    if 'isPinned' in data or not partial:
+        is_pinned = data.get('isPinned', False)
+        if not isinstance(is_pinned, bool):
+            raise FilterError('isPinned must be a boolean')
+        fields['is_pinned'] = is_pinned
+    return fields
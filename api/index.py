@@ -1,19 +1,31 @@
 """
 Vercel Serverless Function для работы с базой данных портала общежития
 """
+import time
+
+_import_started = time.perf_counter()  # профиль холодного старта: импорт модуля целиком
+
 import json
+import logging
 import os
 import hashlib
 import uuid
 import re
-import time
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from authz import AuthError, authorize, issue_token, resource_name
+from cold_start import WarmConnections, startup
+from http_cache import bump_versions
+from permissions import VERSION_TABLE, normalize_positions, permission_cache, replace_positions, resolve
+from serialization import dumps, row_to_camel, rows_to_camel
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger('dormitory.api')
+
 # Rate limiting storage (in-memory, per function instance)
 rate_limit_storage = {}
 RATE_LIMIT_REQUESTS = 100  # requests
@@ -42,15 +54,6 @@ def sanitize_string(value: str, max_length: int = 500) -> str:
         return ""
     return str(value)[:max_length].strip()
 
-def snake_to_camel(snake_str: str) -> str:
-    """Convert snake_case to camelCase"""
-    components = snake_str.split('_')
-    return components[0] + ''.join(x.title() for x in components[1:])
-
-def convert_dict_keys_to_camel(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert all dictionary keys from snake_case to camelCase"""
-    return {snake_to_camel(key): value for key, value in data.items()}
-
 def check_rate_limit(ip: str) -> bool:
     """Check if request is within rate limit"""
     current_time = time.time()
@@ -81,10 +84,43 @@ def get_client_ip(request) -> str:
     """Extract client IP from Vercel request"""
     return request.headers.get('x-real-ip', request.headers.get('x-forwarded-for', 'unknown').split(',')[0])
 
-def get_db_connection():
-    conn = psycopg2.connect(DATABASE_URL)
+@lru_cache(maxsize=None)
+def driver():
+    """psycopg2 and RealDictCursor, imported on the first connection of the instance"""
+    with startup.phase('import_driver'):
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+    return psycopg2, RealDictCursor
+
+def get_db_connection(tenant: str = 'default'):
+    psycopg2, _ = driver()
+    with startup.phase('db_connect'):
+        conn = psycopg2.connect(DATABASE_URL)
     return conn
 
+# Соединение не закрывается после запроса, а ждёт следующего вызова экземпляра
+warm_connections = WarmConnections(get_db_connection)
+
+def warmup() -> Dict[str, Any]:
+    """GET /warmup: import the driver and park a checked connection before traffic arrives"""
+    status = 200
+    conn = None
+    try:
+        conn = warm_connections.take('default')
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.close()
+    except Exception:
+        status = 503
+    finally:
+        if conn is not None:
+            warm_connections.put('default', conn)
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'application/json', 'Cache-Control': 'no-store'},
+        'body': json.dumps({'warm': status == 200, 'startup': startup.as_dict()})
+    }
+
 def handle_users(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]:
     if method == 'GET':
         cur.execute("SELECT id, email, name, role, room, room_group as group, positions FROM users ORDER BY name")
@@ -92,7 +128,7 @@ def handle_users(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'users': [dict(u) for u in users]}, default=str)
+            'body': dumps({'users': users})
         }
     
     elif method == 'POST':
@@ -124,7 +160,7 @@ def handle_users(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
             
             return {
                 'statusCode': 200,
-                'body': json.dumps({'user': dict(user)}, default=str)
+                'body': dumps({'user': user, 'token': issue_token(user['id'])})
             }
         
         elif action == 'register':
@@ -164,7 +200,7 @@ def handle_users(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
             
             return {
                 'statusCode': 201,
-                'body': json.dumps({'user': dict(user)}, default=str)
+                'body': dumps({'user': user, 'token': issue_token(user_id)})
             }
     
     elif method == 'PUT':
@@ -198,10 +234,14 @@ def handle_users(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
             updates.append('role = %s')
             params.append(role)
         
+        positions = None
         if 'positions' in body:
-            positions = body['positions']
-            if not isinstance(positions, list):
+            if not isinstance(body['positions'], list):
                 return {'statusCode': 400, 'body': json.dumps({'error': 'Positions must be array'})}
+            try:
+                positions = normalize_positions(body['positions'])
+            except ValueError as e:
+                return {'statusCode': 400, 'body': json.dumps({'error': str(e)})}
             updates.append('positions = %s::jsonb')
             params.append(json.dumps(positions))
         
@@ -217,11 +257,17 @@ def handle_users(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
         if not user:
             return {'statusCode': 404, 'body': json.dumps({'error': 'User not found'})}
         
+        # Роль и должности - вход кэша прав
+        if positions is not None:
+            replace_positions(cur, user_id, positions)
+        if 'role' in body or positions is not None:
+            bump_versions(cur, VERSION_TABLE)
         conn.commit()
+        permission_cache.invalidate(user_id)
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'user': dict(user)}, default=str)
+            'body': dumps({'user': user})
         }
 
 def handle_announcements(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]:
@@ -231,7 +277,7 @@ def handle_announcements(method: str, body: Dict[str, Any], conn, cur) -> Dict[s
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'announcements': [convert_dict_keys_to_camel(dict(a)) for a in announcements]}, default=str)
+            'body': dumps({'announcements': rows_to_camel(cur, announcements)})
         }
     
     elif method == 'POST':
@@ -258,7 +304,7 @@ def handle_announcements(method: str, body: Dict[str, Any], conn, cur) -> Dict[s
         
         return {
             'statusCode': 201,
-            'body': json.dumps({'announcement': convert_dict_keys_to_camel(dict(announcement))}, default=str)
+            'body': dumps({'announcement': row_to_camel(cur, announcement)})
         }
 
 def handle_tasks(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]:
@@ -272,7 +318,7 @@ def handle_tasks(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'tasks': [convert_dict_keys_to_camel(dict(t)) for t in tasks]}, default=str)
+            'body': dumps({'tasks': rows_to_camel(cur, tasks)})
         }
     
     elif method == 'POST':
@@ -311,7 +357,7 @@ def handle_tasks(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
         
         return {
             'statusCode': 201,
-            'body': json.dumps({'task': convert_dict_keys_to_camel(dict(task))}, default=str)
+            'body': dumps({'task': row_to_camel(cur, task)})
         }
     
     elif method == 'PUT':
@@ -383,7 +429,7 @@ def handle_tasks(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'task': convert_dict_keys_to_camel(dict(task))}, default=str)
+            'body': dumps({'task': row_to_camel(cur, task)})
         }
 
 def handle_duty_schedule(method: str, body: Dict[str, Any], conn, cur) -> Dict[str, Any]:
@@ -397,7 +443,7 @@ def handle_duty_schedule(method: str, body: Dict[str, Any], conn, cur) -> Dict[s
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'duties': [convert_dict_keys_to_camel(dict(d)) for d in duties]}, default=str)
+            'body': dumps({'duties': rows_to_camel(cur, duties)})
         }
     
     elif method == 'POST':
@@ -429,7 +475,7 @@ def handle_duty_schedule(method: str, body: Dict[str, Any], conn, cur) -> Dict[s
         
         return {
             'statusCode': 201,
-            'body': json.dumps({'duty': convert_dict_keys_to_camel(dict(duty))}, default=str)
+            'body': dumps({'duty': row_to_camel(cur, duty)})
         }
     
     elif method == 'PUT':
@@ -457,11 +503,19 @@ def handle_duty_schedule(method: str, body: Dict[str, Any], conn, cur) -> Dict[s
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'duty': convert_dict_keys_to_camel(dict(duty))}, default=str)
+            'body': dumps({'duty': row_to_camel(cur, duty)})
         }
 
 def handler(request):
     """Vercel handler function"""
+    started = time.perf_counter()
+    try:
+        return route(request)
+    finally:
+        if startup.first_invocation(started):
+            logger.info('cold start %s', startup.as_dict())
+
+def route(request):
     try:
         client_ip = get_client_ip(request)
         
@@ -480,19 +534,32 @@ def handler(request):
                 'headers': {
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-Id, X-Auth-Token',
                     'Access-Control-Max-Age': '86400'
                 },
                 'body': ''
             }
         
         path = request.path
+        if path.rstrip('/') == '/warmup':
+            return warmup()
         body = request.get_json() if request.method in ['POST', 'PUT'] else {}
         
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        conn = warm_connections.take('default')
+        cur = conn.cursor(cursor_factory=driver()[1])
         
         try:
+            try:
+                fields = {**request.args, **(body if isinstance(body, dict) else {})}
+                authorize(resource_name(path.rstrip('/')), method, request.headers, 'default', fields,
+                          lambda claims: resolve(cur, claims.user_id))
+            except AuthError as e:
+                return {
+                    'statusCode': e.status,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': e.message})
+                }
+            
             if path.startswith('/users'):
                 result = handle_users(method, body, conn, cur)
             elif path.startswith('/announcements'):
@@ -516,7 +583,7 @@ def handler(request):
             
         finally:
             cur.close()
-            conn.close()
+            warm_connections.put('default', conn)
     
     except Exception as e:
         return {
@@ -524,3 +591,5 @@ def handler(request):
             'headers': {'Content-Type': 'application/json'},
             'body': json.dumps({'error': str(e)})
         }
+
+startup.record('import', _import_started)
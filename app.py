@@ -10,21 +10,51 @@ import re
 import time
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from db_pool import ConnectionPool
+from db_replicas import WROTE_AT_COOKIE, WROTE_AT_HEADER, ReplicaRouter, init_flask as init_replicas, parse_wrote_at
+from announcement_feed import announcement_fields, feed_columns, feed_query
+from authz import init_flask as init_authz, issue_token
+from duty_calendar import FilterError, calendar_grid, calendar_range, duty_filters
+from duty_roster import parse_roster_request, plan_roster, roster_rows, roster_summary
+from health import HealthChecker
+from hot_cache import HotCache
+from http_cache import bump_versions, cache_headers, etag_matches, resource_etag
+from instrumentation import init_flask, record_exception, track, track_query
+from jobs import JOB_SQL, enqueue, job_view, parse_job_id
+from permissions import HOLDERS_SQL, VERSION_TABLE, normalize_positions, permission_cache, replace_positions, resolve
+from scheduler import start_background as start_scheduler
+from serialization import dumps
+from single_flight import SingleFlight, flask_view as single_flight_view, request_key
+from task_filters import task_query
+from tenancy import DEFAULT_SHARD, DEFAULT_TENANT, PerTenant, TenantConfig, init_flask as init_tenancy, postgres_options
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag', 'Server-Timing', 'X-Last-Write'])
+init_flask(app)
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+# Реплики для чтения: postgres://... через запятую, у каждой свой пул
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+DB_REPLICA_POOL_SIZE = int(os.environ.get('DB_REPLICA_POOL_SIZE', DB_POOL_SIZE))
+
+tenant_config = TenantConfig.from_env()
+init_tenancy(app, tenant_config)
 
 # Rate limiting storage
 rate_limit_storage = {}
 RATE_LIMIT_REQUESTS = 100
 RATE_LIMIT_WINDOW = 60
 
+# Сколько одинаковый GET ждёт ответ уже идущего запроса, прежде чем выполниться сам
+COALESCE_WAIT = float(os.environ.get('COALESCE_WAIT', 2))
+
 def hash_password(password: str) -> str:
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -49,8 +79,16 @@ def sanitize_string(value: str, max_length: int = 500) -> str:
     return str(value)[:max_length].strip()
 
 def check_rate_limit(ip: str) -> bool:
-    """Check if request is within rate limit"""
+    """Check the rate limit once per request (coalescing checks it before the handler does)"""
+    if 'rate_limit_ok' not in g:
+        g.rate_limit_ok = _consume_rate_limit(ip)
+    return g.rate_limit_ok
+
+def _consume_rate_limit(ip: str) -> bool:
+    """Check if request is within the tenant's rate limit"""
     current_time = time.time()
+    tenant = g.get('tenant', DEFAULT_TENANT)
+    ip = f'{tenant}:{ip}'
     
     expired_keys = [k for k, v in rate_limit_storage.items() 
                    if current_time - v['start_time'] > RATE_LIMIT_WINDOW]
@@ -67,19 +105,96 @@ def check_rate_limit(ip: str) -> bool:
         rate_limit_storage[ip] = {'count': 1, 'start_time': current_time}
         return True
     
-    if window_data['count'] >= RATE_LIMIT_REQUESTS:
+    if window_data['count'] >= tenant_config.rate_limit(tenant, RATE_LIMIT_REQUESTS):
         return False
     
     window_data['count'] += 1
     return True
 
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that reports query timings to instrumentation"""
+    def execute(self, query, vars=None):
+        with track_query(query, vars):
+            return super().execute(query, vars)
+
+def _connector(url: str, tenant: str):
+    # Соединение привязано к тенанту: политики RLS читают app.tenant_id
+    return lambda: psycopg2.connect(url, cursor_factory=TimedCursor, options=postgres_options(tenant))
+
+def _tenant_router(tenant: str) -> ReplicaRouter:
+    """Pools of a tenant on its shard; replicas serve the main shard"""
+    url = tenant_config.shard_url(tenant, DATABASE_URL)
+    replica_urls = DATABASE_REPLICA_URLS if tenant_config.shard(tenant) == DEFAULT_SHARD else []
+    prefix = '' if tenant == DEFAULT_TENANT else f'{tenant}/'
+    return ReplicaRouter(ConnectionPool(_connector(url, tenant), maxsize=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT), [
+        (f'{prefix}replica{i}', ConnectionPool(_connector(replica_url, tenant), maxsize=DB_REPLICA_POOL_SIZE,
+                                               timeout=DB_POOL_TIMEOUT))
+        for i, replica_url in enumerate(replica_urls, 1)
+    ], 'postgres')
+
+db_routers = PerTenant(_tenant_router)
+db_router = db_routers.get(DEFAULT_TENANT)
+db_pool = db_router.primary
+init_replicas(app, db_router)
+health = HealthChecker(db_pool, 'PostgreSQL', lambda: len(rate_limit_storage))
+# Периодические задачи (SCHEDULER_ENABLED=1): лидер выбирается блокировкой БД
+scheduler = start_scheduler('postgres', tenant_config)
+
 def get_db_connection():
-    """Create database connection"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    """Take a connection: a caught-up replica for GET, the primary otherwise"""
+    readonly = request.method == 'GET'
+    if not readonly:
+        # Момент до коммита: реплика, догнавшая его, уже видит эту запись
+        g.db_wrote_at = time.time()
+    wrote_at = parse_wrote_at(request.headers.get(WROTE_AT_HEADER) or request.cookies.get(WROTE_AT_COOKIE))
+    with track('db_connect'):
+        conn, g.db_pool = db_routers.get(g.tenant).acquire(readonly, wrote_at)
+    return conn
+
+def release_db_connection(conn):
+    """Return a connection to its pool (open transaction is rolled back)"""
+    g.pop('db_pool', db_pool).putconn(conn)
+
+def load_capabilities(claims):
+    """Capabilities for authz.py when its cache entry is missing or older than AUTHZ_CACHE_TTL"""
+    conn = get_db_connection()
+    try:
+        return resolve(conn.cursor(), claims.user_id, claims.tenant)
+    finally:
+        release_db_connection(conn)
+
+init_authz(app, load_capabilities)
+
+def coalesce_key():
+    """Shape shared by identical reads; None when the request has to run on its own"""
+    if request.method != 'GET' or not check_rate_limit(request.remote_addr):
+        return None
+    # Клиент, закреплённый за primary после записи, не ждёт чтение с реплики
+    if parse_wrote_at(request.headers.get(WROTE_AT_HEADER) or request.cookies.get(WROTE_AT_COOKIE)) is not None:
+        return None
+    return request_key(g.tenant)
+
+def coalesced(route: str):
+    """Opt a route into single-flight GETs"""
+    return single_flight_view(app, SingleFlight(route, COALESCE_WAIT), coalesce_key)
+
+def json_response(payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None):
+    """Build JSON response using the fast serializer"""
+    with track('serialize'):
+        body = dumps(payload)
+    return app.response_class(body, status=status, headers=headers, mimetype='application/json')
+
+def conditional_get(cur, resource: str, params=None):
+    """Compare If-None-Match with the resource ETag; returns (etag, 304 response or None)"""
+    etag = resource_etag(cur, resource, request.args if params is None else params, g.tenant)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return etag, app.response_class(status=304, headers=cache_headers(resource, etag))
+    return etag, None
 
 # ============= USERS ENDPOINTS =============
 
 @app.route('/api/users', methods=['GET', 'POST', 'PUT', 'OPTIONS'])
+@coalesced('users')
 def users_handler():
     if request.method == 'OPTIONS':
         return '', 200
@@ -88,14 +203,26 @@ def users_handler():
     if not check_rate_limit(client_ip):
         return jsonify({'error': 'Rate limit exceeded'}), 429
     
+    conn = None
+    cur = None
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         if request.method == 'GET':
+            position = sanitize_string(request.args.get('position', ''), 100)
+            etag, not_modified = conditional_get(cur, 'users')
+            if not_modified:
+                return not_modified
+            
+            if position:
+                cur.execute(HOLDERS_SQL, (position,))
+                return json_response({'users': cur.fetchall()}, headers=cache_headers('users', etag))
+            
             cur.execute("SELECT id, email, name, role, room, room_group as group, positions FROM users ORDER BY name")
             users = cur.fetchall()
-            return jsonify({'users': [dict(u) for u in users]})
+            return json_response({'users': users}, headers=cache_headers('users', etag))
         
         elif request.method == 'POST':
             data = request.get_json()
@@ -125,7 +252,7 @@ def users_handler():
                 if not user:
                     return jsonify({'error': 'Invalid credentials'}), 401
                 
-                return jsonify({'user': dict(user)})
+                return json_response({'user': user, 'token': issue_token(user['id'], g.tenant)})
             
             elif action == 'register':
                 email = sanitize_string(data.get('email', ''), 255)
@@ -160,9 +287,10 @@ def users_handler():
                     (user_id, email, password_hash, name, room if room else None, group if group else None)
                 )
                 user = cur.fetchone()
+                bump_versions(cur, 'users')
                 conn.commit()
                 
-                return jsonify({'user': dict(user)}), 201
+                return json_response({'user': user, 'token': issue_token(user_id, g.tenant)}, 201)
         
         elif request.method == 'PUT':
             data = request.get_json()
@@ -195,10 +323,14 @@ def users_handler():
                 updates.append('role = %s')
                 params.append(role)
             
+            positions = None
             if 'positions' in data:
-                positions = data['positions']
-                if not isinstance(positions, list):
+                if not isinstance(data['positions'], list):
                     return jsonify({'error': 'Positions must be array'}), 400
+                try:
+                    positions = normalize_positions(data['positions'])
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
                 updates.append('positions = %s::jsonb')
                 params.append(json.dumps(positions))
             
@@ -208,17 +340,28 @@ def users_handler():
             updates.append('updated_at = CURRENT_TIMESTAMP')
             params.append(user_id)
             
+            # Роль и должности - вход кэша прав
+            grants_changed = 'role' in data or positions is not None
+            
             query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s RETURNING id, email, name, role, room, room_group as group, positions"
             cur.execute(query, params)
             user = cur.fetchone()
+            if user and positions is not None:
+                replace_positions(cur, user_id, positions)
+            bump_versions(cur, 'users')
+            if grants_changed:
+                bump_versions(cur, VERSION_TABLE)
             conn.commit()
+            if grants_changed:
+                permission_cache.invalidate(user_id, g.tenant)
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
             
-            return jsonify({'user': dict(user)})
+            return json_response({'user': user})
     
     except Exception as e:
+        record_exception(e)
         if conn:
             conn.rollback()
         return jsonify({'error': str(e)}), 500
@@ -227,11 +370,21 @@ def users_handler():
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 # ============= ANNOUNCEMENTS ENDPOINTS =============
 
-@app.route('/api/announcements', methods=['GET', 'POST', 'OPTIONS'])
+ANNOUNCEMENT_RETURNING = ('id, title, content, category, priority, is_pinned as "isPinned", '
+                          'author_id as "authorId", created_at as "createdAt"')
+FEED_COLUMNS = feed_columns('"')
+feed_caches = PerTenant(lambda tenant: HotCache('announcements_feed'))
+
+def feed_cache() -> HotCache:
+    """First-page cache of the request's tenant"""
+    return feed_caches.get(g.tenant)
+
+@app.route('/api/announcements', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+@coalesced('announcements')
 def announcements_handler():
     if request.method == 'OPTIONS':
         return '', 200
@@ -240,11 +393,18 @@ def announcements_handler():
     if not check_rate_limit(client_ip):
         return jsonify({'error': 'Rate limit exceeded'}), 429
     
+    conn = None
+    cur = None
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         if request.method == 'GET':
+            etag, not_modified = conditional_get(cur, 'announcements')
+            if not_modified:
+                return not_modified
+            
             cur.execute("""
                 SELECT a.id, a.title, a.content, a.author_id as "authorId", 
                        a.created_at as "createdAt", u.name as "authorName"
@@ -253,7 +413,7 @@ def announcements_handler():
                 ORDER BY a.created_at DESC
             """)
             announcements = cur.fetchall()
-            return jsonify({'announcements': [dict(a) for a in announcements]})
+            return json_response({'announcements': announcements}, headers=cache_headers('announcements', etag))
         
         elif request.method == 'POST':
             data = request.get_json()
@@ -267,20 +427,78 @@ def announcements_handler():
             if not author_id or not validate_uuid(author_id):
                 return jsonify({'error': 'Valid Author ID required'}), 400
             
+            try:
+                fields = announcement_fields(data)
+            except FilterError as e:
+                return jsonify({'error': str(e)}), 400
+            
             announcement_id = str(uuid.uuid4())
             
             cur.execute(
-                """INSERT INTO announcements (id, title, content, author_id) 
-                   VALUES (%s, %s, %s, %s) 
-                   RETURNING id, title, content, author_id as "authorId", created_at as "createdAt" """,
-                (announcement_id, title, content, author_id)
+                f"""INSERT INTO announcements (id, title, content, author_id, category, priority, is_pinned) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s) 
+                   RETURNING {ANNOUNCEMENT_RETURNING}""",
+                (announcement_id, title, content, author_id, fields['category'], fields['priority'], fields['is_pinned'])
+            )
+            announcement = cur.fetchone()
+            bump_versions(cur, 'announcements')
+            conn.commit()
+            feed_cache().invalidate()
+            
+            return json_response({'announcement': announcement}, 201)
+        
+        elif request.method == 'PUT':
+            data = request.get_json()
+            announcement_id = data.get('announcementId', '')
+            
+            if not announcement_id or not validate_uuid(announcement_id):
+                return jsonify({'error': 'Valid Announcement ID required'}), 400
+            
+            try:
+                fields = announcement_fields(data, partial=True)
+            except FilterError as e:
+                return jsonify({'error': str(e)}), 400
+            if 'title' in data:
+                fields['title'] = sanitize_string(data['title'], 500)
+            if 'content' in data:
+                fields['content'] = sanitize_string(data['content'], 10000)
+            
+            if not fields:
+                return jsonify({'error': 'No fields to update'}), 400
+            if fields.get('title') == '' or fields.get('content') == '':
+                return jsonify({'error': 'Title and content required'}), 400
+            
+            assignments = ', '.join(f'{column} = %s' for column in fields)
+            cur.execute(
+                f"""UPDATE announcements SET {assignments}, updated_at = CURRENT_TIMESTAMP 
+                   WHERE id = %s 
+                   RETURNING {ANNOUNCEMENT_RETURNING}""",
+                (*fields.values(), announcement_id)
             )
             announcement = cur.fetchone()
+            if not announcement:
+                return jsonify({'error': 'Announcement not found'}), 404
+            bump_versions(cur, 'announcements')
             conn.commit()
+            feed_cache().invalidate()
             
-            return jsonify({'announcement': dict(announcement)}), 201
+            return json_response({'announcement': announcement})
+        
+        elif request.method == 'DELETE':
+            announcement_id = request.args.get('announcementId', '')
+            
+            if not announcement_id or not validate_uuid(announcement_id):
+                return jsonify({'error': 'Valid Announcement ID required'}), 400
+            
+            cur.execute("DELETE FROM announcements WHERE id = %s", (announcement_id,))
+            bump_versions(cur, 'announcements')
+            conn.commit()
+            feed_cache().invalidate()
+            
+            return json_response({'success': True})
     
     except Exception as e:
+        record_exception(e)
         if conn:
             conn.rollback()
         return jsonify({'error': str(e)}), 500
@@ -289,11 +507,71 @@ def announcements_handler():
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
+
+@app.route('/api/announcements/feed', methods=['GET', 'OPTIONS'])
+@coalesced('announcements_feed')
+def announcements_feed_handler():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    client_ip = request.remote_addr
+    if not check_rate_limit(client_ip):
+        return jsonify({'error': 'Rate limit exceeded'}), 429
+    
+    try:
+        feed = feed_query(request.args)
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = None
+    cur = None
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        etag, not_modified = conditional_get(cur, 'announcements', feed.etag_params)
+        if not_modified:
+            return not_modified
+        headers = cache_headers('announcements', etag)
+        
+        # Первая страница одинакова для всех дашбордов: отдаём готовое тело,
+        # пока ETag (версия таблицы) не изменился
+        if feed.first_page:
+            body = feed_cache().get(feed.cache_key, etag)
+            if body is not None:
+                return app.response_class(body, headers=headers, mimetype='application/json')
+        
+        pinned = []
+        if feed.first_page:
+            cur.execute(*feed.pinned(FEED_COLUMNS))
+            pinned = cur.fetchall()
+        cur.execute(*feed.recent(FEED_COLUMNS))
+        recent = cur.fetchall()
+        
+        with track('serialize'):
+            body = dumps(feed.payload(pinned, recent))
+        if feed.first_page:
+            feed_cache().put(feed.cache_key, etag, body)
+        return app.response_class(body, headers=headers, mimetype='application/json')
+    
+    except Exception as e:
+        record_exception(e)
+        if conn:
+            conn.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
 
 # ============= TASKS ENDPOINTS =============
 
 @app.route('/api/tasks', methods=['GET', 'POST', 'PUT', 'OPTIONS'])
+@coalesced('tasks')
 def tasks_handler():
     if request.method == 'OPTIONS':
         return '', 200
@@ -302,21 +580,34 @@ def tasks_handler():
     if not check_rate_limit(client_ip):
         return jsonify({'error': 'Rate limit exceeded'}), 429
     
+    conn = None
+    cur = None
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         if request.method == 'GET':
-            cur.execute("""
+            try:
+                query = task_query(request.args)
+            except FilterError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            etag, not_modified = conditional_get(cur, 'tasks', query.etag_params)
+            if not_modified:
+                return not_modified
+            
+            tail, params = query.tail()
+            cur.execute(f"""
                 SELECT t.id, t.title, t.description, t.status, t.priority,
                        t.assigned_to as "assignedTo", t.due_date as "dueDate",
                        t.created_at as "createdAt", u.name as "assigneeName"
                 FROM tasks t
                 LEFT JOIN users u ON t.assigned_to = u.id
-                ORDER BY t.created_at DESC
-            """)
+                {tail}
+            """, params)
             tasks = cur.fetchall()
-            return jsonify({'tasks': [dict(t) for t in tasks]})
+            return json_response({'tasks': tasks}, headers=cache_headers('tasks', etag))
         
         elif request.method == 'POST':
             data = request.get_json()
@@ -350,9 +641,10 @@ def tasks_handler():
                  assigned_to if assigned_to else None, due_date if due_date else None)
             )
             task = cur.fetchone()
+            bump_versions(cur, 'tasks')
             conn.commit()
             
-            return jsonify({'task': dict(task)}), 201
+            return json_response({'task': task}, 201)
         
         elif request.method == 'PUT':
             data = request.get_json()
@@ -410,14 +702,16 @@ def tasks_handler():
                                  created_at as "createdAt" """
             cur.execute(query, params)
             task = cur.fetchone()
+            bump_versions(cur, 'tasks')
             conn.commit()
             
             if not task:
                 return jsonify({'error': 'Task not found'}), 404
             
-            return jsonify({'task': dict(task)})
+            return json_response({'task': task})
     
     except Exception as e:
+        record_exception(e)
         if conn:
             conn.rollback()
         return jsonify({'error': str(e)}), 500
@@ -426,11 +720,12 @@ def tasks_handler():
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 # ============= DUTY SCHEDULE ENDPOINTS =============
 
 @app.route('/api/duty-schedule', methods=['GET', 'POST', 'PUT', 'OPTIONS'])
+@coalesced('duty_schedule')
 def duty_schedule_handler():
     if request.method == 'OPTIONS':
         return '', 200
@@ -439,20 +734,33 @@ def duty_schedule_handler():
     if not check_rate_limit(client_ip):
         return jsonify({'error': 'Rate limit exceeded'}), 429
     
+    conn = None
+    cur = None
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         if request.method == 'GET':
-            cur.execute("""
+            try:
+                where, params = duty_filters(request.args)
+            except FilterError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            etag, not_modified = conditional_get(cur, 'duty-schedule')
+            if not_modified:
+                return not_modified
+            
+            cur.execute(f"""
                 SELECT d.id, d.user_id as "userId", d.date, d.zone, d.status,
                        d.created_at as "createdAt", u.name as "userName"
                 FROM duty_schedule d
                 LEFT JOIN users u ON d.user_id = u.id
+                {where}
                 ORDER BY d.date DESC
-            """)
+            """, params)
             duties = cur.fetchall()
-            return jsonify({'duties': [dict(d) for d in duties]})
+            return json_response({'duties': duties}, headers=cache_headers('duty-schedule', etag))
         
         elif request.method == 'POST':
             data = request.get_json()
@@ -475,9 +783,10 @@ def duty_schedule_handler():
                 (duty_id, user_id, date, zone)
             )
             duty = cur.fetchone()
+            bump_versions(cur, 'duty_schedule')
             conn.commit()
             
-            return jsonify({'duty': dict(duty)}), 201
+            return json_response({'duty': duty}, 201)
         
         elif request.method == 'PUT':
             data = request.get_json()
@@ -496,14 +805,16 @@ def duty_schedule_handler():
                 (status, duty_id)
             )
             duty = cur.fetchone()
+            bump_versions(cur, 'duty_schedule')
             conn.commit()
             
             if not duty:
                 return jsonify({'error': 'Duty not found'}), 404
             
-            return jsonify({'duty': dict(duty)})
+            return json_response({'duty': duty})
     
     except Exception as e:
+        record_exception(e)
         if conn:
             conn.rollback()
         return jsonify({'error': str(e)}), 500
@@ -512,7 +823,194 @@ def duty_schedule_handler():
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
+
+@app.route('/api/duty-schedule/calendar', methods=['GET', 'OPTIONS'])
+@coalesced('duty_calendar')
+def duty_calendar_handler():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    client_ip = request.remote_addr
+    if not check_rate_limit(client_ip):
+        return jsonify({'error': 'Rate limit exceeded'}), 429
+    
+    try:
+        start, end = calendar_range(request.args)
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    zone = sanitize_string(request.args.get('zone', ''), 100)
+    
+    conn = None
+    cur = None
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        # Диапазон по умолчанию зависит от текущей даты - в ETag идут его границы
+        etag, not_modified = conditional_get(cur, 'duty-schedule', {**request.args, 'from': start.isoformat(), 'to': end.isoformat()})
+        if not_modified:
+            return not_modified
+        
+        # Один запрос по диапазону (индекс (date, zone)), сетка собирается в памяти
+        cur.execute(f"""
+            SELECT d.id, d.user_id as "userId", d.date, d.zone, d.status, u.name as "userName"
+            FROM duty_schedule d
+            LEFT JOIN users u ON d.user_id = u.id
+            WHERE d.date BETWEEN %s AND %s{' AND d.zone = %s' if zone else ''}
+            ORDER BY d.date, d.zone
+        """, (start, end, zone) if zone else (start, end))
+        duties = cur.fetchall()
+        
+        return json_response(calendar_grid(duties, start, end), headers=cache_headers('duty-schedule', etag))
+    
+    except Exception as e:
+        record_exception(e)
+        if conn:
+            conn.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
+
+@app.route('/api/duty-schedule/roster', methods=['POST', 'OPTIONS'])
+def duty_roster_handler():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    client_ip = request.remote_addr
+    if not check_rate_limit(client_ip):
+        return jsonify({'error': 'Rate limit exceeded'}), 429
+    
+    data = request.get_json() or {}
+    try:
+        spec = parse_roster_request(data)
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = None
+    cur = None
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        if data.get('async') and not spec.dry_run:
+            # Генерация уходит в worker.py; клиент опрашивает /api/jobs
+            job = enqueue(cur, 'duty_roster', data, dedup_key=spec.dedup_key)
+            conn.commit()
+            return json_response({'job': job_view(job)}, 202, headers={'Location': f"/api/jobs?jobId={job['id']}"})
+        
+        try:
+            residents, roster = plan_roster(cur, spec)
+        except FilterError as e:
+            return jsonify({'error': str(e)}), 400
+        rows = roster_rows(roster)
+        
+        if rows and not spec.dry_run:
+            from psycopg2.extras import execute_values
+            execute_values(
+                cur,
+                "INSERT INTO duty_schedule (id, user_id, date, zone, status) VALUES %s",
+                rows, template="(%s, %s, %s, %s, 'pending')", page_size=len(rows)
+            )
+            bump_versions(cur, 'duty_schedule')
+            conn.commit()
+        
+        duties = [{'id': duty_id, 'userId': user_id, 'date': day, 'zone': zone, 'status': 'pending'}
+                  for duty_id, user_id, day, zone in rows]
+        summary = roster_summary(roster, residents)
+        summary['created'] = 0 if spec.dry_run else len(rows)
+        return json_response({'roster': summary, 'duties': duties}, 200 if spec.dry_run else 201)
+    
+    except Exception as e:
+        record_exception(e)
+        if conn:
+            conn.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
+
+# ============= PERMISSIONS ENDPOINT =============
+
+@app.route('/api/permissions', methods=['GET', 'OPTIONS'])
+def permissions_handler():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    client_ip = request.remote_addr
+    if not check_rate_limit(client_ip):
+        return jsonify({'error': 'Rate limit exceeded'}), 429
+    
+    user_id = request.args.get('userId', '')
+    if not validate_uuid(user_id):
+        return jsonify({'error': 'Valid User ID required'}), 400
+    
+    conn = None
+    cur = None
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        capabilities = resolve(cur, user_id, g.tenant)
+        if capabilities is None:
+            return jsonify({'error': 'User not found'}), 404
+        return json_response({'permissions': capabilities.as_dict()}, headers={'Cache-Control': 'private, no-cache'})
+    
+    except Exception as e:
+        record_exception(e)
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
+
+# ============= JOBS ENDPOINT =============
+
+@app.route('/api/jobs', methods=['GET', 'OPTIONS'])
+def jobs_handler():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    client_ip = request.remote_addr
+    if not check_rate_limit(client_ip):
+        return jsonify({'error': 'Rate limit exceeded'}), 429
+    
+    job_id = parse_job_id(request.args.get('jobId'))
+    if job_id is None:
+        return jsonify({'error': 'jobId must be a positive integer'}), 400
+    
+    conn = None
+    cur = None
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(JOB_SQL, (job_id,))
+        job = cur.fetchone()
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return json_response({'job': job_view(job)})
+    
+    except Exception as e:
+        record_exception(e)
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
 
 # ============= HEALTH CHECK =============
 
@@ -520,5 +1018,18 @@ def duty_schedule_handler():
 def health_check():
     return jsonify({'status': 'ok', 'message': 'API is running'})
 
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify(health.liveness())
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    report, status = health.readiness()
+    replicas = [replica for _, router in db_routers.items() for replica in router.stats()]
+    if replicas:
+        # Реплики на готовность не влияют: без них чтения идут на primary
+        report['replicas'] = replicas
+    return jsonify(report), status
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,1405 @@
+"""
+Портал общежития - асинхронный Backend API (ASGI)
+Те же маршруты /api/*, что у app.py и облачной функции, но на asyncio: воркер
+не простаивает на каждом обращении к БД. Postgres - asyncpg с нативным пулом,
+MySQL (DB_BACKEND=mysql) - pymysql с выносом запросов в пул потоков.
+
+Запуск:
+    uvicorn app_async:app --host 0.0.0.0 --port 8000
+    DB_BACKEND=mysql uvicorn app_async:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import json
+import os
+import hashlib
+import uuid
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl
+
+from announcement_feed import FEED_PAGE_SIZE, FeedQuery, announcement_fields, feed_columns, feed_query
+from async_db import MySQLDatabase, PostgresDatabase
+from authz import AuthError, authorize_async, issue_token, resource_name
+from duty_calendar import FilterError, calendar_grid, calendar_range, duty_filters
+from duty_roster import (EXISTING_SQL, existing_duties, existing_range, generate_roster, parse_roster_request,
+                         resident_filters, roster_rows, roster_summary)
+from health import AsyncHealthChecker
+from hot_cache import HotCache
+from http_cache import (BUMP_SQL, RESOURCE_TABLES, cache_headers, compute_etag, etag_matches,
+                        versions_from_rows, versions_query)
+from instrumentation import (PROMETHEUS_CONTENT_TYPE, finish_request, record_exception, render_metrics,
+                             start_request, track)
+from jobs import ACTIVE_DUPLICATE_SQL, ENQUEUE_SQL, JOB_COLUMNS, JOB_SQL, enqueue_params, job_view, parse_job_id
+from permissions import (DELETE_POSITIONS_SQL, GRANTS_SQL, HOLDERS_SQL, INSERT_POSITION_SQL, VERSION_SQL,
+                         VERSION_TABLE, Capabilities, grants_from_rows, normalize_positions, permission_cache,
+                         position_rows, version_from_row)
+from reports import (FORMATS, REPORT_BATCH, Report, XlsxStream, filename, formatter_pool, parse_report_request,
+                     render_rows, shutdown_pool)
+from serialization import dumps_bytes, rows_to_camel
+from shift_rules import (UPSERT_SCORE_SQL, evaluate, notification_rows, parse_auto_request, parse_scores,
+                         plan_shifts, score_filters, shifts_summary)
+from task_filters import task_query
+from tenancy import DEFAULT_TENANT
+
+DB_BACKEND = os.environ.get('DB_BACKEND', 'postgres')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+
+if DB_BACKEND == 'mysql':
+    database = MySQLDatabase({
+        'host': os.environ.get('MYSQL_HOST', 'localhost'),
+        'port': int(os.environ.get('MYSQL_PORT', 3306)),
+        'user': os.environ.get('MYSQL_USER', 'root'),
+        'password': os.environ.get('MYSQL_PASSWORD', ''),
+        'database': os.environ.get('MYSQL_DATABASE', 'dormitory_portal'),
+        'charset': 'utf8mb4',
+    }, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+else:
+    database = PostgresDatabase(os.environ.get('DATABASE_URL'), max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+
+# Rate limiting storage
+rate_limit_storage = {}
+RATE_LIMIT_REQUESTS = 100
+RATE_LIMIT_WINDOW = 60
+
+health = AsyncHealthChecker(database, lambda: len(rate_limit_storage))
+
+USER_COLUMNS = 'id, email, name, role, room, room_group as "group", positions'
+ANNOUNCEMENT_COLUMNS = ('id, title, content, category, priority, is_pinned as "isPinned", '
+                        'author_id as "authorId", created_at as "createdAt"')
+FEED_COLUMNS = feed_columns('"')
+TASK_COLUMNS = ('id, title, description, status, priority, assigned_to as "assignedTo", '
+                'due_date as "dueDate", created_at as "createdAt"')
+DUTY_COLUMNS = 'id, user_id as "userId", date, zone, status, created_at as "createdAt"'
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'ETag, Server-Timing, Content-Disposition',
+}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-Id, X-Auth-Token, If-None-Match',
+    'Access-Control-Max-Age': '86400',
+}
+
+# Тело - bytes или асинхронный поток кусков (отчёты)
+Response = Tuple[int, Union[bytes, AsyncIterator[bytes]], Dict[str, str]]
+
+
+def hash_password(password: str) -> str:
+    """Hash password using SHA256"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def validate_email(email: str) -> bool:
+    """Validate email format"""
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return bool(re.match(pattern, email)) and len(email) <= 255
+
+def validate_uuid(value: str) -> bool:
+    """Validate UUID format"""
+    try:
+        uuid.UUID(value)
+        return True
+    except (ValueError, AttributeError):
+        return False
+
+def sanitize_string(value: str, max_length: int = 500) -> str:
+    """Sanitize string input"""
+    if not value:
+        return ""
+    return str(value)[:max_length].strip()
+
+def parse_date(value: Any) -> Optional[date]:
+    """Parse YYYY-MM-DD (or an ISO timestamp); asyncpg needs date objects, not strings"""
+    if not value:
+        return None
+    return date.fromisoformat(str(value)[:10])
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """Parse an ISO date or timestamp for TIMESTAMP columns"""
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value))
+
+def check_rate_limit(ip: str) -> bool:
+    """Check if request is within rate limit"""
+    current_time = time.time()
+
+    # Clean old entries
+    expired_keys = [k for k, v in rate_limit_storage.items()
+                   if current_time - v['start_time'] > RATE_LIMIT_WINDOW]
+    for key in expired_keys:
+        del rate_limit_storage[key]
+
+    if ip not in rate_limit_storage:
+        rate_limit_storage[ip] = {'count': 1, 'start_time': current_time}
+        return True
+
+    window_data = rate_limit_storage[ip]
+
+    if current_time - window_data['start_time'] > RATE_LIMIT_WINDOW:
+        rate_limit_storage[ip] = {'count': 1, 'start_time': current_time}
+        return True
+
+    if window_data['count'] >= RATE_LIMIT_REQUESTS:
+        return False
+
+    window_data['count'] += 1
+    return True
+
+
+class Request:
+    """Parsed HTTP request (only what the handlers use)"""
+
+    __slots__ = ('method', 'path', 'args', 'headers', 'body', 'client_ip')
+
+    def __init__(self, method: str, path: str, args: Dict[str, str], headers: Dict[str, str],
+                 body: bytes, client_ip: str):
+        self.method = method
+        self.path = path
+        self.args = args
+        self.headers = headers
+        self.body = body
+        self.client_ip = client_ip
+
+    def json(self) -> Dict[str, Any]:
+        return json.loads(self.body or b'{}')
+
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Build JSON response using the fast serializer"""
+    with track('serialize'):
+        body = dumps_bytes(payload)
+    return status, body, dict(headers or {})
+
+def error(message: str, status: int) -> Response:
+    return json_response({'error': message}, status)
+
+async def conditional_get(req: Request, db, resource: str, params: Optional[Dict[str, Any]] = None):
+    """Compare If-None-Match with the resource ETag; returns (etag, 304 response or None)"""
+    tables = RESOURCE_TABLES[resource]
+    rows = await db.fetch(versions_query(tables), tables)
+    etag = compute_etag(resource, versions_from_rows(rows, tables), req.args if params is None else params)
+    if etag_matches(req.headers.get('if-none-match'), etag):
+        return etag, (304, b'', cache_headers(resource, etag))
+    return etag, None
+
+async def bump_versions(db, *tables: str) -> None:
+    """Increment version counters inside the write transaction"""
+    sql = BUMP_SQL[db.dialect]
+    for table in tables:
+        await db.execute(sql, (table,))
+
+async def enqueue(db, kind: str, payload: Optional[Dict[str, Any]] = None, priority: int = 0,
+                  dedup_key: Optional[str] = None) -> Dict[str, Any]:
+    """Queue a background job (see jobs.py); an active job with the same dedup_key is returned instead"""
+    params = enqueue_params(kind, payload, priority, dedup_key)
+    while True:
+        job = await db.write_returning(ENQUEUE_SQL[db.dialect], params, JOB_COLUMNS, 'jobs')
+        if job is None:
+            job = await db.fetchrow(ACTIVE_DUPLICATE_SQL, (dedup_key,))
+        if job is not None:
+            return job
+
+async def user_capabilities(db, user_id: str) -> Optional[Capabilities]:
+    """Cached capabilities of a user (see permissions.py); None for an unknown user"""
+    version = version_from_row(await db.fetchrow(VERSION_SQL, (VERSION_TABLE,)))
+    capabilities = permission_cache.get(user_id, version)
+    if capabilities is None:
+        capabilities = grants_from_rows(await db.fetch(GRANTS_SQL, (user_id,)))
+        if capabilities is not None:
+            permission_cache.put(user_id, version, capabilities)
+    return capabilities
+
+def job_accepted(job: Dict[str, Any], **payload: Any) -> Response:
+    """202 with the queued job and where to poll it"""
+    return json_response(dict(payload, job=job_view(job)), 202, headers={'Location': f"/api/jobs?jobId={job['id']}"})
+
+def decode_positions(user: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # MySQL отдаёт JSON-колонку строкой, asyncpg - уже списком
+    if user is not None and isinstance(user.get('positions'), (str, bytes)):
+        user['positions'] = json.loads(user['positions'])
+    elif user is not None and user.get('positions') is None:
+        user['positions'] = []
+    return user
+
+
+# ============= ROUTING =============
+
+Handler = Callable[..., Awaitable[Response]]
+ROUTES: Dict[str, Tuple[Handler, FrozenSet[str], bool]] = {}
+
+def route(path: str, methods: Tuple[str, ...], uses_db: bool = True):
+    """Register a handler; DB handlers are called as handler(req, db) inside a pooled session"""
+    def decorator(fn: Handler) -> Handler:
+        ROUTES[path] = (fn, frozenset(methods), uses_db)
+        return fn
+    return decorator
+
+
+# ============= USERS ENDPOINTS =============
+
+@route('/api/users', ('GET', 'POST', 'PUT', 'DELETE'))
+async def users_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        position = sanitize_string(req.args.get('position', ''), 100)
+
+        etag, not_modified = await conditional_get(req, db, 'users')
+        if not_modified:
+            return not_modified
+
+        if position:
+            holders = await db.fetch(HOLDERS_SQL, (position,))
+            return json_response({'users': holders}, headers=cache_headers('users', etag))
+
+        users = await db.fetch(f"SELECT {USER_COLUMNS} FROM users ORDER BY name")
+        for user in users:
+            decode_positions(user)
+        return json_response({'users': users}, headers=cache_headers('users', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+        action = data.get('action')
+
+        if action == 'login':
+            email = sanitize_string(data.get('email', ''), 255)
+            password = data.get('password', '')
+
+            if not email or not password:
+                return error('Email and password required', 400)
+
+            if not validate_email(email):
+                return error('Invalid email format', 400)
+
+            if len(password) > 32:
+                return error('Password must be 32 characters or less', 400)
+
+            user = await db.fetchrow(
+                f"SELECT {USER_COLUMNS} FROM users WHERE email = %s AND password_hash = %s",
+                (email, hash_password(password))
+            )
+
+            if not user:
+                return error('Invalid credentials', 401)
+
+            return json_response({'user': decode_positions(user), 'token': issue_token(user['id'])})
+
+        elif action == 'register':
+            email = sanitize_string(data.get('email', ''), 255)
+            password = data.get('password', '')
+            name = sanitize_string(data.get('name', ''), 255)
+            room = sanitize_string(data.get('room', ''), 50)
+            group = sanitize_string(data.get('group', ''), 50)
+
+            if not email or not password or not name:
+                return error('Email, password and name required', 400)
+
+            if not validate_email(email):
+                return error('Invalid email format', 400)
+
+            if len(password) < 6:
+                return error('Password must be at least 6 characters', 400)
+
+            if len(password) > 32:
+                return error('Password must be 32 characters or less', 400)
+
+            if await db.fetchrow("SELECT id FROM users WHERE email = %s", (email,)):
+                return error('Email already exists', 400)
+
+            user_id = str(uuid.uuid4())
+            async with db.transaction():
+                user = await db.write_returning(
+                    """INSERT INTO users (id, email, password_hash, name, role, room, room_group, positions)
+                       VALUES (%s, %s, %s, %s, 'member', %s, %s, '[]'::jsonb)""",
+                    (user_id, email, hash_password(password), name, room if room else None, group if group else None),
+                    USER_COLUMNS, 'users', user_id
+                )
+                await bump_versions(db, 'users')
+
+            return json_response({'user': decode_positions(user), 'token': issue_token(user_id)}, 201)
+
+        return error('Unknown action', 400)
+
+    elif req.method == 'PUT':
+        data = req.json()
+        user_id = data.get('userId', '')
+
+        if not user_id or not validate_uuid(user_id):
+            return error('Valid User ID required', 400)
+
+        updates = []
+        params = []
+
+        if 'name' in data:
+            updates.append('name = %s')
+            params.append(sanitize_string(data['name'], 255))
+
+        if 'room' in data:
+            room = sanitize_string(data['room'], 50)
+            updates.append('room = %s')
+            params.append(room if room else None)
+
+        if 'group' in data:
+            group = sanitize_string(data['group'], 50)
+            updates.append('room_group = %s')
+            params.append(group if group else None)
+
+        if 'role' in data:
+            role = data['role']
+            if role not in ['manager', 'admin', 'moderator', 'member']:
+                return error('Invalid role', 400)
+            updates.append('role = %s')
+            params.append(role)
+
+        positions = None
+        if 'positions' in data:
+            if not isinstance(data['positions'], list):
+                return error('Positions must be array', 400)
+            try:
+                positions = normalize_positions(data['positions'])
+            except ValueError as e:
+                return error(str(e), 400)
+            updates.append('positions = %s::jsonb')
+            params.append(json.dumps(positions))
+
+        if 'password' in data:
+            password = data['password']
+            if len(password) < 6:
+                return error('Password must be at least 6 characters', 400)
+            if len(password) > 32:
+                return error('Password must be 32 characters or less', 400)
+            updates.append('password_hash = %s')
+            params.append(hash_password(password))
+
+        if not updates:
+            return error('No fields to update', 400)
+
+        updates.append('updated_at = CURRENT_TIMESTAMP')
+        params.append(user_id)
+        # Роль и должности - вход кэша прав
+        grants_changed = 'role' in data or positions is not None
+
+        async with db.transaction():
+            user = await db.write_returning(
+                f"UPDATE users SET {', '.join(updates)} WHERE id = %s", params, USER_COLUMNS, 'users', user_id
+            )
+            if user and positions is not None:
+                await db.execute(DELETE_POSITIONS_SQL, (user_id,))
+                if positions:
+                    await db.executemany(INSERT_POSITION_SQL, position_rows(user_id, positions))
+            await bump_versions(db, 'users')
+            if grants_changed:
+                await bump_versions(db, VERSION_TABLE)
+        if grants_changed:
+            permission_cache.invalidate(user_id)
+
+        if not user:
+            return error('User not found', 404)
+
+        return json_response({'success': True, 'user': decode_positions(user)})
+
+    elif req.method == 'DELETE':
+        user_id = req.args.get('userId', '')
+
+        if not user_id or not validate_uuid(user_id):
+            return error('Valid User ID required', 400)
+
+        async with db.transaction():
+            await db.execute(DELETE_POSITIONS_SQL, (user_id,))
+            await db.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            await bump_versions(db, 'users', VERSION_TABLE)
+        permission_cache.invalidate(user_id)
+
+        return json_response({'success': True})
+
+@route('/api/permissions', ('GET',))
+async def permissions_handler(req: Request, db) -> Response:
+    user_id = req.args.get('userId', '')
+    if not validate_uuid(user_id):
+        return error('Valid User ID required', 400)
+
+    capabilities = await user_capabilities(db, user_id)
+    if capabilities is None:
+        return error('User not found', 404)
+    return json_response({'permissions': capabilities.as_dict()}, headers={'Cache-Control': 'private, no-cache'})
+
+# ============= ANNOUNCEMENTS ENDPOINTS =============
+
+feed_cache = HotCache('announcements_feed')
+
+@route('/api/announcements', ('GET', 'POST', 'PUT', 'DELETE'))
+async def announcements_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        etag, not_modified = await conditional_get(req, db, 'announcements')
+        if not_modified:
+            return not_modified
+
+        announcements = await db.fetch("""
+            SELECT a.id, a.title, a.content, a.author_id as "authorId",
+                   a.created_at as "createdAt", u.name as "authorName"
+            FROM announcements a
+            LEFT JOIN users u ON a.author_id = u.id
+            ORDER BY a.created_at DESC
+        """)
+        return json_response({'announcements': announcements}, headers=cache_headers('announcements', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+        title = sanitize_string(data.get('title', ''), 500)
+        content = sanitize_string(data.get('content', ''), 10000)
+        author_id = data.get('authorId', '')
+
+        if not title or not content:
+            return error('Title and content required', 400)
+
+        if not author_id or not validate_uuid(author_id):
+            return error('Valid Author ID required', 400)
+
+        try:
+            fields = announcement_fields(data)
+        except FilterError as e:
+            return error(str(e), 400)
+
+        announcement_id = str(uuid.uuid4())
+        async with db.transaction():
+            # created_at задаётся явно: в старых MySQL-установках у колонки нет DEFAULT
+            announcement = await db.write_returning(
+                """INSERT INTO announcements (id, title, content, author_id, category, priority, is_pinned, created_at)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)""",
+                (announcement_id, title, content, author_id, fields['category'], fields['priority'],
+                 fields['is_pinned']),
+                ANNOUNCEMENT_COLUMNS, 'announcements', announcement_id
+            )
+            await bump_versions(db, 'announcements')
+        feed_cache.invalidate()
+
+        return json_response({'announcement': announcement}, 201)
+
+    elif req.method == 'PUT':
+        data = req.json()
+        announcement_id = data.get('announcementId', '')
+
+        if not announcement_id or not validate_uuid(announcement_id):
+            return error('Valid Announcement ID required', 400)
+
+        try:
+            fields = announcement_fields(data, partial=True)
+        except FilterError as e:
+            return error(str(e), 400)
+        if 'title' in data:
+            fields['title'] = sanitize_string(data['title'], 500)
+        if 'content' in data:
+            fields['content'] = sanitize_string(data['content'], 10000)
+
+        if not fields:
+            return error('No fields to update', 400)
+        if fields.get('title') == '' or fields.get('content') == '':
+            return error('Title and content required', 400)
+
+        updates = [f'{column} = %s' for column in fields] + ['updated_at = CURRENT_TIMESTAMP']
+        async with db.transaction():
+            announcement = await db.write_returning(
+                f"UPDATE announcements SET {', '.join(updates)} WHERE id = %s", (*fields.values(), announcement_id),
+                ANNOUNCEMENT_COLUMNS, 'announcements', announcement_id
+            )
+            await bump_versions(db, 'announcements')
+        feed_cache.invalidate()
+
+        if not announcement:
+            return error('Announcement not found', 404)
+
+        return json_response({'announcement': announcement})
+
+    elif req.method == 'DELETE':
+        announcement_id = req.args.get('announcementId', '')
+
+        if not announcement_id or not validate_uuid(announcement_id):
+            return error('Valid Announcement ID required', 400)
+
+        async with db.transaction():
+            await db.execute("DELETE FROM announcements WHERE id = %s", (announcement_id,))
+            await bump_versions(db, 'announcements')
+        feed_cache.invalidate()
+
+        return json_response({'success': True})
+
+@route('/api/announcements/feed', ('GET',))
+async def announcements_feed_handler(req: Request, db) -> Response:
+    try:
+        feed = feed_query(req.args)
+    except FilterError as e:
+        return error(str(e), 400)
+
+    etag, not_modified = await conditional_get(req, db, 'announcements', feed.etag_params)
+    if not_modified:
+        return not_modified
+    headers = cache_headers('announcements', etag)
+
+    # Первая страница одинакова для всех дашбордов: отдаём готовое тело,
+    # пока ETag (версия таблицы) не изменился
+    if feed.first_page:
+        body = feed_cache.get(feed.cache_key, etag)
+        if body is not None:
+            return 200, body, dict(headers)
+
+    pinned = await db.fetch(*feed.pinned(FEED_COLUMNS)) if feed.first_page else []
+    recent = await db.fetch(*feed.recent(FEED_COLUMNS))
+
+    with track('serialize'):
+        body = dumps_bytes(feed.payload(pinned, recent))
+    if feed.first_page:
+        feed_cache.put(feed.cache_key, etag, body)
+    return 200, body, dict(headers)
+
+# ============= TASKS ENDPOINTS =============
+
+@route('/api/tasks', ('GET', 'POST', 'PUT'))
+async def tasks_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        try:
+            query = task_query(req.args)
+        except FilterError as e:
+            return error(str(e), 400)
+
+        etag, not_modified = await conditional_get(req, db, 'tasks', query.etag_params)
+        if not_modified:
+            return not_modified
+
+        tail, params = query.tail()
+        tasks = await db.fetch(f"""
+            SELECT t.id, t.title, t.description, t.status, t.priority,
+                   t.assigned_to as "assignedTo", t.due_date as "dueDate",
+                   t.created_at as "createdAt", u.name as "assigneeName"
+            FROM tasks t
+            LEFT JOIN users u ON t.assigned_to = u.id
+            {tail}
+        """, params)
+        return json_response({'tasks': tasks}, headers=cache_headers('tasks', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+        title = sanitize_string(data.get('title', ''), 500)
+        description = sanitize_string(data.get('description', ''), 10000)
+        status = data.get('status', 'pending')
+        priority = data.get('priority', 'medium')
+        assigned_to = data.get('assignedTo')
+
+        if not title:
+            return error('Title required', 400)
+
+        if status not in ['pending', 'in_progress', 'completed', 'cancelled']:
+            return error('Invalid status', 400)
+
+        if priority not in ['low', 'medium', 'high', 'urgent']:
+            return error('Invalid priority', 400)
+
+        if assigned_to and not validate_uuid(assigned_to):
+            return error('Invalid Assigned To ID', 400)
+
+        try:
+            due_date = parse_datetime(data.get('dueDate'))
+        except ValueError:
+            return error('Invalid due date', 400)
+
+        task_id = str(uuid.uuid4())
+        async with db.transaction():
+            task = await db.write_returning(
+                """INSERT INTO tasks (id, title, description, status, priority, assigned_to, due_date)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                (task_id, title, description if description else None, status, priority,
+                 assigned_to if assigned_to else None, due_date),
+                TASK_COLUMNS, 'tasks', task_id
+            )
+            await bump_versions(db, 'tasks')
+
+        return json_response({'task': task}, 201)
+
+    elif req.method == 'PUT':
+        data = req.json()
+        task_id = data.get('taskId', '')
+
+        if not task_id or not validate_uuid(task_id):
+            return error('Valid Task ID required', 400)
+
+        updates = []
+        params = []
+
+        if 'title' in data:
+            updates.append('title = %s')
+            params.append(sanitize_string(data['title'], 500))
+
+        if 'description' in data:
+            desc = sanitize_string(data['description'], 10000)
+            updates.append('description = %s')
+            params.append(desc if desc else None)
+
+        if 'status' in data:
+            status = data['status']
+            if status not in ['pending', 'in_progress', 'completed', 'cancelled']:
+                return error('Invalid status', 400)
+            updates.append('status = %s')
+            params.append(status)
+
+        if 'priority' in data:
+            priority = data['priority']
+            if priority not in ['low', 'medium', 'high', 'urgent']:
+                return error('Invalid priority', 400)
+            updates.append('priority = %s')
+            params.append(priority)
+
+        if 'assignedTo' in data:
+            assigned_to = data['assignedTo']
+            if assigned_to and not validate_uuid(assigned_to):
+                return error('Invalid Assigned To ID', 400)
+            updates.append('assigned_to = %s')
+            params.append(assigned_to if assigned_to else None)
+
+        if 'dueDate' in data:
+            try:
+                params.append(parse_datetime(data['dueDate']))
+            except ValueError:
+                return error('Invalid due date', 400)
+            updates.append('due_date = %s')
+
+        if not updates:
+            return error('No fields to update', 400)
+
+        updates.append('updated_at = CURRENT_TIMESTAMP')
+        params.append(task_id)
+
+        async with db.transaction():
+            task = await db.write_returning(
+                f"UPDATE tasks SET {', '.join(updates)} WHERE id = %s", params, TASK_COLUMNS, 'tasks', task_id
+            )
+            await bump_versions(db, 'tasks')
+
+        if not task:
+            return error('Task not found', 404)
+
+        return json_response({'task': task})
+
+# ============= DUTY SCHEDULE ENDPOINTS =============
+
+@route('/api/duty-schedule', ('GET', 'POST', 'PUT'))
+async def duty_schedule_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        try:
+            where, params = duty_filters(req.args)
+        except FilterError as e:
+            return error(str(e), 400)
+
+        etag, not_modified = await conditional_get(req, db, 'duty-schedule')
+        if not_modified:
+            return not_modified
+
+        duties = await db.fetch(f"""
+            SELECT d.id, d.user_id as "userId", d.date, d.zone, d.status,
+                   d.created_at as "createdAt", u.name as "userName"
+            FROM duty_schedule d
+            LEFT JOIN users u ON d.user_id = u.id
+            {where}
+            ORDER BY d.date DESC
+        """, tuple(params))
+        return json_response({'duties': duties}, headers=cache_headers('duty-schedule', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+        user_id = data.get('userId', '')
+        zone = sanitize_string(data.get('zone', ''), 100)
+
+        if not user_id or not validate_uuid(user_id):
+            return error('Valid User ID required', 400)
+
+        try:
+            duty_date = parse_date(data.get('date'))
+        except ValueError:
+            return error('Invalid date', 400)
+
+        if not duty_date or not zone:
+            return error('Date and zone required', 400)
+
+        duty_id = str(uuid.uuid4())
+        async with db.transaction():
+            duty = await db.write_returning(
+                "INSERT INTO duty_schedule (id, user_id, date, zone, status) VALUES (%s, %s, %s, %s, 'pending')",
+                (duty_id, user_id, duty_date, zone), DUTY_COLUMNS, 'duty_schedule', duty_id
+            )
+            await bump_versions(db, 'duty_schedule')
+
+        return json_response({'duty': duty}, 201)
+
+    elif req.method == 'PUT':
+        data = req.json()
+        duty_id = data.get('dutyId', '')
+        status = data.get('status', '')
+
+        if not duty_id or not validate_uuid(duty_id):
+            return error('Valid Duty ID required', 400)
+
+        if status not in ['pending', 'completed', 'missed']:
+            return error('Invalid status', 400)
+
+        async with db.transaction():
+            duty = await db.write_returning(
+                "UPDATE duty_schedule SET status = %s WHERE id = %s",
+                (status, duty_id), DUTY_COLUMNS, 'duty_schedule', duty_id
+            )
+            await bump_versions(db, 'duty_schedule')
+
+        if not duty:
+            return error('Duty not found', 404)
+
+        return json_response({'duty': duty})
+
+@route('/api/duty-schedule/calendar', ('GET',))
+async def duty_calendar_handler(req: Request, db) -> Response:
+    try:
+        start, end = calendar_range(req.args)
+    except FilterError as e:
+        return error(str(e), 400)
+    zone = sanitize_string(req.args.get('zone', ''), 100)
+
+    # Диапазон по умолчанию зависит от текущей даты - в ETag идут его границы
+    etag, not_modified = await conditional_get(req, db, 'duty-schedule',
+                                               {**req.args, 'from': start.isoformat(), 'to': end.isoformat()})
+    if not_modified:
+        return not_modified
+
+    duties = await db.fetch(f"""
+        SELECT d.id, d.user_id as "userId", d.date, d.zone, d.status, u.name as "userName"
+        FROM duty_schedule d
+        LEFT JOIN users u ON d.user_id = u.id
+        WHERE d.date BETWEEN %s AND %s{' AND d.zone = %s' if zone else ''}
+        ORDER BY d.date, d.zone
+    """, (start, end, zone) if zone else (start, end))
+    return json_response(calendar_grid(duties, start, end), headers=cache_headers('duty-schedule', etag))
+
+@route('/api/duty-schedule/roster', ('POST',))
+async def duty_roster_handler(req: Request, db) -> Response:
+    data = req.json()
+    try:
+        spec = parse_roster_request(data)
+    except FilterError as e:
+        return error(str(e), 400)
+
+    if data.get('async') and not spec.dry_run:
+        async with db.transaction():
+            job = await enqueue(db, 'duty_roster', data, dedup_key=spec.dedup_key)
+        return job_accepted(job)
+
+    where, params = resident_filters(spec)
+    residents = [row['id'] for row in await db.fetch(f"SELECT id FROM users {where} ORDER BY room, name", params)]
+    if not residents:
+        return error('No residents match the filters', 400)
+
+    existing = existing_duties(await db.fetch(EXISTING_SQL, existing_range(spec)))
+
+    with track('roster'):
+        roster = generate_roster(residents, spec.zones, spec.working_days(), spec.per_zone, spec.min_gap, existing)
+    rows = roster_rows(roster)
+
+    if rows and not spec.dry_run:
+        async with db.transaction():
+            await db.executemany(
+                "INSERT INTO duty_schedule (id, user_id, date, zone, status) VALUES (%s, %s, %s, %s, 'pending')",
+                rows
+            )
+            await bump_versions(db, 'duty_schedule')
+
+    duties = [{'id': duty_id, 'userId': user_id, 'date': day, 'zone': zone, 'status': 'pending'}
+              for duty_id, user_id, day, zone in rows]
+    summary = roster_summary(roster, residents)
+    summary['created'] = 0 if spec.dry_run else len(rows)
+    return json_response({'roster': summary, 'duties': duties}, 200 if spec.dry_run else 201)
+
+# ============= WORK SHIFTS ENDPOINTS =============
+
+@route('/api/work-shifts', ('GET', 'POST', 'PUT'))
+async def work_shifts_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        user_id = req.args.get('userId')
+        include_archived = req.args.get('archived') == 'true'
+
+        if user_id and not validate_uuid(user_id):
+            return error('Invalid user ID', 400)
+
+        etag, not_modified = await conditional_get(req, db, 'work-shifts')
+        if not_modified:
+            return not_modified
+
+        if include_archived:
+            # Без userId - весь архив (только MANAGE_WORK_SHIFTS, см. authz.POLICY)
+            if user_id:
+                shifts = await db.fetch(
+                    "SELECT * FROM archived_work_shifts WHERE user_id = %s ORDER BY archived_at DESC", (user_id,)
+                )
+            else:
+                shifts = await db.fetch("SELECT * FROM archived_work_shifts ORDER BY archived_at DESC")
+            return json_response({'archivedShifts': rows_to_camel(None, shifts)}, headers=cache_headers('work-shifts', etag))
+
+        if user_id:
+            shifts = await db.fetch(
+                "SELECT * FROM work_shifts WHERE is_archived = FALSE AND user_id = %s ORDER BY assigned_at DESC", (user_id,)
+            )
+        else:
+            shifts = await db.fetch("SELECT * FROM work_shifts WHERE is_archived = FALSE ORDER BY assigned_at DESC")
+        return json_response({'workShifts': rows_to_camel(None, shifts)}, headers=cache_headers('work-shifts', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+
+        user_id = data.get('userId', '')
+        if not validate_uuid(user_id):
+            return error('Invalid user ID', 400)
+
+        user_name = sanitize_string(data.get('userName', ''), 255)
+        days = data.get('days')
+        assigned_by = data.get('assignedBy', '')
+        assigned_by_name = sanitize_string(data.get('assignedByName', ''), 255)
+        reason = sanitize_string(data.get('reason', ''), 500)
+
+        if not isinstance(days, int) or days <= 0 or days > 365:
+            return error('Invalid days value', 400)
+
+        if not validate_uuid(assigned_by):
+            return error('Invalid assigned_by ID', 400)
+
+        async with db.transaction():
+            shift = await db.write_returning(
+                """INSERT INTO work_shifts (user_id, user_name, days, assigned_by, assigned_by_name, reason)
+                   VALUES (%s, %s, %s, %s, %s, %s)""",
+                (user_id, user_name, days, assigned_by, assigned_by_name, reason), '*', 'work_shifts'
+            )
+            await bump_versions(db, 'work_shifts')
+
+        return json_response({'workShift': rows_to_camel(None, [shift])[0]}, 201)
+
+    elif req.method == 'PUT':
+        data = req.json()
+        shift_id = data.get('shiftId')
+        action = data.get('action')
+
+        if not isinstance(shift_id, int):
+            return error('Invalid shift ID', 400)
+
+        if action == 'complete':
+            days_to_complete = data.get('daysToComplete')
+            completed_by = data.get('completedBy', '')
+            completed_by_name = sanitize_string(data.get('completedByName', ''), 255)
+
+            if not isinstance(days_to_complete, int) or days_to_complete <= 0:
+                return error('Invalid days value', 400)
+
+            if not validate_uuid(completed_by):
+                return error('Invalid completed_by ID', 400)
+
+            async with db.transaction():
+                shift = await db.write_returning(
+                    """UPDATE work_shifts
+                       SET completed_days = completed_days + %s,
+                           completed_by = %s,
+                           completed_by_name = %s,
+                           completed_at = CURRENT_TIMESTAMP
+                       WHERE id = %s""",
+                    (days_to_complete, completed_by, completed_by_name, shift_id), '*', 'work_shifts', shift_id
+                )
+                await bump_versions(db, 'work_shifts')
+
+            if not shift:
+                return error('Shift not found', 404)
+
+            return json_response({'workShift': rows_to_camel(None, [shift])[0]})
+
+        elif action == 'archive':
+            async with db.transaction():
+                shift = await db.fetchrow("SELECT * FROM work_shifts WHERE id = %s", (shift_id,))
+
+                if shift:
+                    await db.execute(
+                        """INSERT INTO archived_work_shifts
+                           (user_id, user_name, days, reason, assigned_by, assigned_by_name, assigned_at)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                        (shift['user_id'], shift['user_name'], shift['days'], shift['reason'],
+                         shift['assigned_by'], shift['assigned_by_name'], shift['assigned_at'])
+                    )
+                    await db.execute("UPDATE work_shifts SET is_archived = TRUE WHERE id = %s", (shift_id,))
+                    await bump_versions(db, 'work_shifts', 'archived_work_shifts')
+
+            return json_response({'success': True})
+
+        return error('Unknown action', 400)
+
+@route('/api/work-shifts/auto', ('POST',))
+async def work_shifts_auto_handler(req: Request, db) -> Response:
+    data = req.json()
+    try:
+        spec = parse_auto_request(data)
+    except FilterError as e:
+        return error(str(e), 400)
+
+    if not spec.dry_run and not validate_uuid(spec.assigned_by):
+        return error('Invalid assigned_by ID', 400)
+
+    where, params = score_filters(spec)
+    async with db.transaction():
+        scores = [(row['room'], row['date'], row['score'])
+                  for row in await db.fetch(f"SELECT room, date, score FROM cleanliness_scores {where}", params)]
+        with track('shift_rules'):
+            hits = evaluate(scores, spec.rules, spec.start, spec.end)
+
+        residents, taken = [], set()
+        if hits:
+            rooms = sorted({hit.room for hit in hits})
+            keys = sorted({hit.rule_key for hit in hits})
+            residents = await db.fetch(
+                f"""SELECT id, name, room FROM users
+                    WHERE room IN ({', '.join(['%s'] * len(rooms))}) AND role NOT IN ('manager', 'admin')
+                    ORDER BY room, name""",
+                rooms
+            )
+            taken = {(row['user_id'], row['rule_key']) for row in await db.fetch(
+                f"SELECT user_id, rule_key FROM work_shifts WHERE rule_key IN ({', '.join(['%s'] * len(keys))})", keys
+            )}
+        rows, skipped = plan_shifts(hits, residents, taken)
+
+        if rows and not spec.dry_run:
+            await db.executemany(
+                """INSERT INTO work_shifts (user_id, user_name, days, assigned_by, assigned_by_name, reason, rule_key)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                [(user_id, name, days, spec.assigned_by, spec.assigned_by_name, reason, key)
+                 for user_id, name, days, reason, key in rows]
+            )
+            await db.executemany(
+                "INSERT INTO notifications (user_id, type, title, message) VALUES (%s, %s, %s, %s)",
+                notification_rows(rows)
+            )
+            await bump_versions(db, 'work_shifts', 'notifications')
+
+    summary = shifts_summary(len(scores), hits, rows, skipped)
+    summary['created'] = 0 if spec.dry_run else len(rows)
+    shifts = [{'userId': user_id, 'userName': name, 'days': days, 'reason': reason, 'ruleKey': key}
+              for user_id, name, days, reason, key in rows]
+    return json_response({'summary': summary, 'rules': [rule.as_dict() for rule in spec.rules], 'workShifts': shifts},
+                         200 if spec.dry_run else 201)
+
+@route('/api/cleanliness-scores', ('GET', 'POST'))
+async def cleanliness_scores_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        try:
+            start, end = calendar_range(req.args)
+        except FilterError as e:
+            return error(str(e), 400)
+        room = sanitize_string(req.args.get('room', ''), 50)
+
+        etag, not_modified = await conditional_get(req, db, 'cleanliness-scores')
+        if not_modified:
+            return not_modified
+
+        scores = await db.fetch(f"""
+            SELECT room, date, score, inspector FROM cleanliness_scores
+            WHERE date BETWEEN %s AND %s{' AND room = %s' if room else ''}
+            ORDER BY date, room
+        """, (start, end, room) if room else (start, end))
+        return json_response({'scores': scores}, headers=cache_headers('cleanliness-scores', etag))
+
+    data = req.json()
+    try:
+        rows = parse_scores(data.get('scores'))
+    except FilterError as e:
+        return error(str(e), 400)
+
+    async with db.transaction():
+        await db.executemany(UPSERT_SCORE_SQL[db.dialect], rows)
+        await bump_versions(db, 'cleanliness_scores')
+
+    return json_response({'saved': len(rows)})
+
+# ============= NOTIFICATIONS ENDPOINTS =============
+
+@route('/api/notifications', ('GET', 'POST', 'PUT'))
+async def notifications_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        user_id = req.args.get('userId', '')
+
+        if not validate_uuid(user_id):
+            return error('Invalid user ID', 400)
+
+        etag, not_modified = await conditional_get(req, db, 'notifications')
+        if not_modified:
+            return not_modified
+
+        notifications = await db.fetch(
+            "SELECT * FROM notifications WHERE user_id = %s ORDER BY created_at DESC", (user_id,)
+        )
+        return json_response({'notifications': notifications}, headers=cache_headers('notifications', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+
+        user_id = data.get('userId', '')
+        if not validate_uuid(user_id):
+            return error('Invalid user ID', 400)
+
+        notif_type = sanitize_string(data.get('type', ''), 50)
+        title = sanitize_string(data.get('title', ''), 255)
+        message = sanitize_string(data.get('message', ''), 1000)
+
+        async with db.transaction():
+            notification = await db.write_returning(
+                "INSERT INTO notifications (user_id, type, title, message) VALUES (%s, %s, %s, %s)",
+                (user_id, notif_type, title, message), '*', 'notifications'
+            )
+            await bump_versions(db, 'notifications')
+
+        return json_response({'notification': notification}, 201)
+
+    elif req.method == 'PUT':
+        data = req.json()
+        notification_id = data.get('notificationId')
+        is_read = data.get('isRead', False)
+
+        if not isinstance(notification_id, int):
+            return error('Invalid notification ID', 400)
+        user_id = data.get('userId')
+        if user_id is not None and not validate_uuid(user_id):
+            return error('Invalid user ID', 400)
+
+        async with db.transaction():
+            # С userId - только своё уведомление (правило owner в authz.POLICY)
+            owner = await db.fetchrow("SELECT user_id FROM notifications WHERE id = %s", (notification_id,))
+            if owner is None or (user_id is not None and str(owner['user_id']) != user_id):
+                return error('Notification not found', 404)
+            notification = await db.write_returning(
+                "UPDATE notifications SET is_read = %s WHERE id = %s",
+                (bool(is_read), notification_id), '*', 'notifications', notification_id
+            )
+            await bump_versions(db, 'notifications')
+
+        return json_response({'notification': notification})
+
+# ============= LOGS ENDPOINTS =============
+
+@route('/api/logs', ('GET', 'POST', 'DELETE'))
+async def logs_handler(req: Request, db) -> Response:
+    if req.method == 'GET':
+        try:
+            limit = int(req.args.get('limit', '100'))
+            if limit <= 0 or limit > 1000:
+                limit = 100
+        except ValueError:
+            limit = 100
+
+        etag, not_modified = await conditional_get(req, db, 'logs')
+        if not_modified:
+            return not_modified
+
+        logs = await db.fetch("SELECT * FROM action_logs ORDER BY created_at DESC LIMIT %s", (limit,))
+        return json_response({'logs': logs}, headers=cache_headers('logs', etag))
+
+    elif req.method == 'POST':
+        data = req.json()
+
+        action = sanitize_string(data.get('action', ''), 100)
+        user_id = data.get('userId', '')
+        user_name = sanitize_string(data.get('userName', ''), 255)
+        details = sanitize_string(data.get('details', ''), 1000)
+        target_user_id = data.get('targetUserId')
+        target_user_name = sanitize_string(data.get('targetUserName', ''), 255) if data.get('targetUserName') else None
+
+        if not validate_uuid(user_id):
+            return error('Invalid user ID', 400)
+
+        if target_user_id and not validate_uuid(target_user_id):
+            return error('Invalid target user ID', 400)
+
+        async with db.transaction():
+            log = await db.write_returning(
+                """INSERT INTO action_logs (action, user_id, user_name, details, target_user_id, target_user_name)
+                   VALUES (%s, %s, %s, %s, %s, %s)""",
+                (action, user_id, user_name, details, target_user_id, target_user_name), '*', 'action_logs'
+            )
+            await bump_versions(db, 'action_logs')
+
+        return json_response({'log': log}, 201)
+
+    elif req.method == 'DELETE':
+        # Очистка журнала идёт пачками в worker.py, не держа соединение запроса
+        async with db.transaction():
+            job = await enqueue(db, 'cleanup_action_logs', dedup_key='cleanup_action_logs')
+        return job_accepted(job, success=True)
+
+# ============= JOBS ENDPOINT =============
+
+@route('/api/jobs', ('GET',))
+async def jobs_handler(req: Request, db) -> Response:
+    job_id = parse_job_id(req.args.get('jobId'))
+    if job_id is None:
+        return error('jobId must be a positive integer', 400)
+
+    job = await db.fetchrow(JOB_SQL, (job_id,))
+    if job is None:
+        return error('Job not found', 404)
+    return json_response({'job': job_view(job)})
+
+# ============= REPORTS =============
+
+async def report_chunks(report: Report, fmt: str, start: date, end: date) -> AsyncIterator[bytes]:
+    """Header, then one formatted batch per server-side cursor fetch; the session lives as long as the stream"""
+    loop = asyncio.get_running_loop()
+    pool = formatter_pool()
+    xlsx = XlsxStream(report.title) if fmt == 'xlsx' else None
+
+    async def pack(data: bytes) -> bytes:
+        # Сжатие zip (zlib отпускает GIL) - в потоке, не в event loop
+        return await loop.run_in_executor(None, xlsx.write, data) if xlsx else data
+
+    # BOM: Excel открывает CSV в UTF-8 только с ним
+    head = (b'' if xlsx else b'\xef\xbb\xbf') + render_rows(fmt, [report.header()])
+    async with database.session() as db:
+        async for batch in db.stream(report.sql, report.params(start, end), REPORT_BATCH):
+            data = await loop.run_in_executor(pool, render_rows, fmt, [report.row(r) for r in batch])
+            yield await pack(head + data)
+            head = b''
+    if head:
+        yield await pack(head)
+    if xlsx:
+        yield await loop.run_in_executor(None, xlsx.close)
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    try:
+        yield first
+        async for chunk in rest:
+            yield chunk
+    finally:
+        await rest.aclose()
+
+@route('/api/reports', ('GET',), uses_db=False)
+async def reports_handler(req: Request) -> Response:
+    """Semester report streamed as CSV or XLSX (?report=work-shifts|archive|duty-compliance&format=&from=&to=)"""
+    if not check_rate_limit(req.client_ip):
+        return error('Rate limit exceeded', 429)
+    try:
+        report, fmt, start, end = parse_report_request(req.args)
+    except FilterError as e:
+        return error(str(e), 400)
+
+    chunks = report_chunks(report, fmt, start, end)
+    try:
+        # Первая пачка читается до заголовков: ошибка БД ещё может стать ответом 500
+        first = await chunks.__anext__()
+    except Exception as e:
+        await chunks.aclose()
+        record_exception(e)
+        return error(str(e), 500)
+    return 200, _prepend(first, chunks), {
+        'Content-Type': FORMATS[fmt],
+        'Content-Disposition': f'attachment; filename="{filename(report, fmt, start, end)}"',
+        'Cache-Control': 'no-store',
+    }
+
+# ============= DASHBOARD BOOTSTRAP =============
+
+BOOTSTRAP_DUTY_DAYS = int(os.environ.get('BOOTSTRAP_DUTY_DAYS', 14))
+
+# Счётчик непрочитанных считается в том же запросе, что и профиль
+BOOTSTRAP_USER_SQL = f"""
+    SELECT {USER_COLUMNS},
+           (SELECT COUNT(*) FROM notifications n WHERE n.user_id = users.id AND n.is_read = FALSE) as "unreadNotifications"
+    FROM users WHERE id = %s
+"""
+BOOTSTRAP_SHIFTS_SQL = """
+    SELECT id, days, completed_days as "completedDays", reason, assigned_by_name as "assignedByName",
+           assigned_at as "assignedAt"
+    FROM work_shifts
+    WHERE user_id = %s AND is_archived = FALSE AND COALESCE(completed_days, 0) < days
+    ORDER BY assigned_at DESC
+"""
+BOOTSTRAP_DUTIES_SQL = """
+    SELECT id, date, zone, status FROM duty_schedule
+    WHERE user_id = %s AND date BETWEEN %s AND %s
+    ORDER BY date, zone
+"""
+BOOTSTRAP_PINNED = FeedQuery(None, FEED_PAGE_SIZE, None).pinned(FEED_COLUMNS)
+
+@route('/api/dashboard/bootstrap', ('GET',))
+async def dashboard_bootstrap_handler(req: Request, db) -> Response:
+    """Everything the dashboard needs on first render, read over one pooled connection"""
+    user_id = req.args.get('userId', '')
+
+    if not validate_uuid(user_id):
+        return error('Invalid user ID', 400)
+
+    today = date.today()
+    etag, not_modified = await conditional_get(req, db, 'bootstrap', {'userId': user_id, 'asOf': today.isoformat()})
+    if not_modified:
+        return not_modified
+
+    user = decode_positions(await db.fetchrow(BOOTSTRAP_USER_SQL, (user_id,)))
+    if not user:
+        return error('User not found', 404)
+    unread = user.pop('unreadNotifications')
+
+    shifts = await db.fetch(BOOTSTRAP_SHIFTS_SQL, (user_id,))
+    duties = await db.fetch(BOOTSTRAP_DUTIES_SQL, (user_id, today, today + timedelta(days=BOOTSTRAP_DUTY_DAYS)))
+    pinned = await db.fetch(*BOOTSTRAP_PINNED)
+
+    return json_response({
+        'user': user,
+        'unreadNotifications': int(unread or 0),
+        'workShifts': shifts,
+        'upcomingDuties': duties,
+        'pinnedAnnouncements': pinned,
+    }, headers=cache_headers('bootstrap', etag))
+
+# ============= HEALTH CHECK / METRICS =============
+
+@route('/api/health', ('GET',), uses_db=False)
+async def health_check(req: Request) -> Response:
+    return json_response({'status': 'ok', 'message': 'API is running', 'database': database.name})
+
+@route('/api/health/live', ('GET',), uses_db=False)
+async def liveness_check(req: Request) -> Response:
+    return json_response(health.liveness())
+
+@route('/api/health/ready', ('GET',), uses_db=False)
+async def readiness_check(req: Request) -> Response:
+    report, status = await health.readiness()
+    return json_response(report, status)
+
+async def metrics_endpoint(req: Request) -> Response:
+    return 200, render_metrics().encode(), {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+route('/metrics', ('GET',), uses_db=False)(metrics_endpoint)
+route('/api/metrics', ('GET',), uses_db=False)(metrics_endpoint)
+
+
+# ============= ASGI =============
+
+async def load_capabilities(claims) -> Optional[Capabilities]:
+    """Capabilities for authz.py when its cache entry is missing or older than AUTHZ_CACHE_TTL"""
+    async with database.session() as db:
+        return await user_capabilities(db, claims.user_id)
+
+async def authorize_request(req: Request) -> Optional[Response]:
+    """Check the request against the policy in authz.py; an error response or None"""
+    fields: Dict[str, Any] = dict(req.args)
+    if req.method in ('POST', 'PUT') and req.body:
+        try:
+            body = req.json()
+        except ValueError:
+            # Битый JSON отклонит сам обработчик
+            body = None
+        if isinstance(body, dict):
+            fields.update(body)
+    try:
+        await authorize_async(resource_name(req.path), req.method, req.headers, DEFAULT_TENANT, fields,
+                              load_capabilities)
+    except AuthError as e:
+        return error(e.message, e.status)
+    return None
+
+async def dispatch(req: Request) -> Response:
+    entry = ROUTES.get(req.path)
+    if entry is None:
+        return error('Resource not found', 404)
+    handler, methods, uses_db = entry
+
+    if req.method == 'OPTIONS':
+        return 200, b'', dict(PREFLIGHT_HEADERS)
+
+    if req.method not in methods:
+        return error('Method not allowed', 405)
+
+    denied = await authorize_request(req)
+    if denied is not None:
+        return denied
+
+    if not uses_db:
+        return await handler(req)
+
+    if not check_rate_limit(req.client_ip):
+        return error('Rate limit exceeded', 429)
+
+    try:
+        async with database.session() as db:
+            return await handler(req, db)
+    except json.JSONDecodeError:
+        return error('Invalid JSON in request body', 400)
+    except Exception as e:
+        record_exception(e)
+        return error(str(e), 500)
+
+async def read_request(scope, receive) -> Request:
+    chunks: List[bytes] = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', ())}
+    client = scope.get('client')
+    return Request(
+        method=scope['method'],
+        path=scope['path'].rstrip('/') or '/',
+        args=dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'))),
+        headers=headers,
+        body=b''.join(chunks),
+        client_ip=client[0] if client else 'unknown',
+    )
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await database.open()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await database.close()
+            shutdown_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send) -> None:
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    req = await read_request(scope, receive)
+    start_request(req.path if req.path in ROUTES else 'unmatched', req.method)
+    status, body, headers = await dispatch(req)
+    streaming = not isinstance(body, bytes)
+
+    headers.setdefault('Content-Type', 'application/json')
+    if not streaming:
+        headers['Content-Length'] = str(len(body))
+    headers.update(CORS_HEADERS)
+    stats = finish_request(status)
+    if stats is not None:
+        headers['Server-Timing'] = stats.server_timing()
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()],
+    })
+    if not streaming:
+        await send({'type': 'http.response.body', 'body': body})
+        return
+    try:
+        async for chunk in body:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    except Exception as e:
+        # Заголовки уже ушли: обрываем ответ, клиент видит незавершённую загрузку
+        record_exception(e)
+        raise
+    finally:
+        await body.aclose()
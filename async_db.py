@@ -0,0 +1,323 @@
+"""
+Асинхронный доступ к БД для app_async.py
+Postgres - asyncpg с собственным пулом соединений; MySQL - pymysql в пуле
+потоков поверх db_pool.ConnectionPool (блокирующие вызовы не занимают event loop).
+SQL в обработчиках пишется как для psycopg2 (%s, "alias", ::jsonb) и один раз
+на текст запроса приводится к диалекту драйвера.
+"""
+import asyncio
+import itertools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - depends on the environment
+    asyncpg = None
+
+from db_pool import ConnectionPool, PoolExhausted
+from instrumentation import track, track_query
+
+_PLACEHOLDER = re.compile(r'%s|%%')
+
+_MYSQL_RULES = (
+    (re.compile(r'::\s*\w+(\[\])?'), ''),
+    (re.compile(r'"(\w+)"'), r'`\1`'),
+)
+
+
+@lru_cache(maxsize=1024)
+def to_numbered(sql: str) -> str:
+    """psycopg2-style %s placeholders -> asyncpg $1, $2, ..."""
+    counter = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda m: f'${next(counter)}' if m.group() == '%s' else '%', sql)
+
+
+@lru_cache(maxsize=1024)
+def to_mysql(sql: str) -> str:
+    """Drop Postgres casts and quote aliases with backticks"""
+    for pattern, replacement in _MYSQL_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _pool_stats(size: int, idle: int, maxsize: int, waiting: int, acquired: int, exhausted: int) -> Dict[str, Any]:
+    # Те же ключи, что у ConnectionPool.stats(), чтобы readiness не зависел от драйвера
+    in_use = size - idle
+    return {
+        'size': size,
+        'max': maxsize,
+        'in_use': in_use,
+        'idle': idle,
+        'waiting': waiting,
+        'utilization': round(in_use / maxsize, 3) if maxsize else 0.0,
+        'acquired_total': acquired,
+        'exhausted_total': exhausted,
+    }
+
+
+# ============= POSTGRES (asyncpg) =============
+
+def _encode_json(value: Any) -> str:
+    # Обработчики передают уже сериализованный JSON (как для psycopg2)
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+class PostgresSession:
+    """One pooled asyncpg connection for the duration of a request"""
+
+    dialect = 'postgres'
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetch(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        with track_query(sql, params):
+            rows = await self.conn.fetch(to_numbered(sql), *params)
+        return [dict(row) for row in rows]
+
+    async def fetchrow(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        with track_query(sql, params):
+            row = await self.conn.fetchrow(to_numbered(sql), *params)
+        return dict(row) if row is not None else None
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run a statement and return the affected row count"""
+        with track_query(sql, params):
+            status = await self.conn.execute(to_numbered(sql), *params)
+        count = status.rsplit(' ', 1)[-1]
+        return int(count) if count.isdigit() else 0
+
+    async def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+        """Run a statement for every params row in one pipelined batch"""
+        with track_query(sql, rows[:1]):
+            await self.conn.executemany(to_numbered(sql), rows)
+
+    async def write_returning(self, sql: str, params: Sequence[Any], returning: str, table: str,
+                              key: Any = None) -> Optional[Dict[str, Any]]:
+        """INSERT/UPDATE and return the written row (RETURNING in one round trip)"""
+        return await self.fetchrow(f'{sql} RETURNING {returning}', params)
+
+    async def stream(self, sql: str, params: Sequence[Any] = (), batch: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Rows in batches from a server-side cursor (read-only transaction for its lifetime)"""
+        async with self.conn.transaction(readonly=True):
+            with track_query(sql, params):
+                cursor = await self.conn.cursor(to_numbered(sql), *params)
+            while True:
+                rows = await cursor.fetch(batch)
+                if not rows:
+                    return
+                yield [dict(row) for row in rows]
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        async with self.conn.transaction():
+            yield
+
+
+class PostgresDatabase:
+    """asyncpg pool; connections are created lazily up to max_size"""
+
+    dialect = 'postgres'
+    name = 'PostgreSQL'
+
+    def __init__(self, dsn: Optional[str], max_size: int = 10, timeout: float = 5.0):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pool = None
+        self._waiting = 0
+        self._acquired = 0
+        self._exhausted = 0
+
+    @staticmethod
+    async def _init_connection(conn) -> None:
+        for name in ('json', 'jsonb'):
+            await conn.set_type_codec(name, encoder=_encode_json, decoder=json.loads, schema='pg_catalog')
+
+    async def open(self) -> None:
+        if self.pool is not None:
+            return
+        if asyncpg is None:
+            raise RuntimeError('asyncpg is not installed: pip install -r requirements_async.txt')
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=0, max_size=self.max_size,
+                                              init=self._init_connection)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[PostgresSession]:
+        await self.open()
+        self._waiting += 1
+        try:
+            with track('db_connect'):
+                conn = await self.pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._exhausted += 1
+            raise PoolExhausted(f'No free database connection (pool size {self.max_size})') from None
+        finally:
+            self._waiting -= 1
+        self._acquired += 1
+        try:
+            yield PostgresSession(conn)
+        finally:
+            await self.pool.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return _pool_stats(size, idle, self.max_size, self._waiting, self._acquired, self._exhausted)
+
+
+# ============= MYSQL (pymysql in threads) =============
+
+class MySQLSession:
+    """Pooled pymysql connection; every statement runs in the executor"""
+
+    dialect = 'mysql'
+
+    def __init__(self, database: 'MySQLDatabase', conn):
+        self.database = database
+        self.conn = conn
+
+    def _run(self, sql: str, params: Sequence[Any], fetch: str):
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, tuple(params))
+            if fetch == 'all':
+                rows = cur.fetchall()
+            elif fetch == 'one':
+                rows = cur.fetchone()
+            else:
+                rows = None
+            return rows, cur.rowcount, cur.lastrowid
+        finally:
+            cur.close()
+
+    async def _call(self, sql: str, params: Sequence[Any], fetch: str):
+        with track_query(sql, params):
+            return await self.database.offload(self._run, to_mysql(sql), params, fetch)
+
+    async def fetch(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        rows, _, _ = await self._call(sql, params, 'all')
+        return list(rows)
+
+    async def fetchrow(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        row, _, _ = await self._call(sql, params, 'one')
+        return row
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run a statement and return the affected row count"""
+        _, rowcount, _ = await self._call(sql, params, None)
+        return rowcount
+
+    def _run_many(self, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+        cur = self.conn.cursor()
+        try:
+            cur.executemany(sql, rows)
+        finally:
+            cur.close()
+
+    async def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+        """Run a statement for every params row (pymysql folds INSERT ... VALUES into one query)"""
+        with track_query(sql, rows[:1]):
+            await self.database.offload(self._run_many, to_mysql(sql), rows)
+
+    async def write_returning(self, sql: str, params: Sequence[Any], returning: str, table: str,
+                              key: Any = None) -> Optional[Dict[str, Any]]:
+        """INSERT/UPDATE, then read the row back by key (or the AUTO_INCREMENT id)"""
+        _, _, lastrowid = await self._call(sql, params, None)
+        return await self.fetchrow(f'SELECT {returning} FROM {table} WHERE id = %s',
+                                   (key if key is not None else lastrowid,))
+
+    async def stream(self, sql: str, params: Sequence[Any] = (), batch: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Rows in batches from an unbuffered cursor (SSDictCursor: the result is not loaded whole)"""
+        from pymysql.cursors import SSDictCursor
+        cur = self.conn.cursor(SSDictCursor)
+        try:
+            with track_query(sql, params):
+                await self.database.offload(cur.execute, to_mysql(sql), tuple(params))
+            while True:
+                rows = await self.database.offload(cur.fetchmany, batch)
+                if not rows:
+                    return
+                yield list(rows)
+        finally:
+            # Закрытие дочитывает результат: соединение возвращается в пул чистым
+            await self.database.offload(cur.close)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        try:
+            yield
+        except BaseException:
+            await self.database.offload(self.conn.rollback)
+            raise
+        await self.database.offload(self.conn.commit)
+
+
+class MySQLDatabase:
+    """Blocking pymysql driver behind a thread pool sized like the connection pool"""
+
+    dialect = 'mysql'
+    name = 'MySQL'
+
+    def __init__(self, connect_kwargs: Dict[str, Any], max_size: int = 10, timeout: float = 5.0):
+        import pymysql
+        from pymysql.cursors import DictCursor
+
+        kwargs = dict(connect_kwargs, cursorclass=DictCursor)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pool = ConnectionPool(lambda: pymysql.connect(**kwargs), maxsize=max_size, timeout=timeout)
+        self.executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix='mysql')
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._exhausted = 0
+
+    async def offload(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def open(self) -> None:
+        # Семафор ограничивает сессии размером пула: поток исполнителя
+        # никогда не блокируется в getconn, пока другие ждут поток для запроса
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+
+    async def close(self) -> None:
+        self.pool.closeall()
+        self.executor.shutdown(wait=False)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[MySQLSession]:
+        await self.open()
+        self._waiting += 1
+        try:
+            with track('db_connect'):
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._exhausted += 1
+            raise PoolExhausted(f'No free database connection (pool size {self.max_size})') from None
+        finally:
+            self._waiting -= 1
+        try:
+            with track('db_connect'):
+                conn = await self.offload(self.pool.getconn)
+            try:
+                yield MySQLSession(self, conn)
+            finally:
+                await self.offload(self.pool.putconn, conn)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.pool.stats()
+        return _pool_stats(pool['size'], pool['idle'], self.max_size, self._waiting,
+                           pool['acquired_total'], self._exhausted)
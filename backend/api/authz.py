@@ -0,0 +1,341 @@
+"""
+Авторизация запросов: декларативная политика на ресурс и метод
+При входе клиент получает подписанный токен (HS256 на SECRET_KEY) с id
+пользователя и тенантом и шлёт его в Authorization: Bearer (или X-Auth-Token).
+Правило политики бывает трёх видов:
+  - PUBLIC - токен не нужен (вход, регистрация, health);
+  - AUTHENTICATED - достаточно действительного токена;
+  - require(...) - нужна одна из возможностей permissions.py; с owner запрос
+    разрешён и без неё, если поле owner совпадает с id из токена.
+Горячие чтения (списки, свои отработки и уведомления) решаются по одному
+токену: проверенные токены лежат в памяти, подпись и JSON разбираются один
+раз на токен. Возможности берутся из permission_cache без обращения к БД,
+пока запись моложе AUTHZ_CACHE_TTL, потом версия сверяется одним запросом.
+Смена роли или должностей действует сразу в своём процессе и не позже
+AUTHZ_CACHE_TTL в остальных.
+
+AUTHZ_MODE: enforce - отказывать, report - только писать отказ в лог,
+off - не проверять (только явно; без SECRET_KEY в остальных режимах модуль не
+импортируется).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from instrumentation import registry
+from permissions import (COMPLETE_WORK_SHIFTS, COUNCIL_ACCESS, CREATE_ANNOUNCEMENTS, EDIT_ANY_FLOOR, FLOOR_MANAGER,
+                         MANAGE_COUNCIL, MANAGE_USERS, MANAGE_WORK_SHIFTS, VIEW_LOGS, Capabilities, permission_cache)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', '')
+AUTHZ_MODE = os.environ.get('AUTHZ_MODE', 'enforce')
+# Как сессия «Запомнить меня» во фронтенде (месяц); на 401 клиент просит войти заново
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 30 * 24 * 3600))
+AUTHZ_CACHE_TTL = float(os.environ.get('AUTHZ_CACHE_TTL', 30))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+
+if AUTHZ_MODE not in ('enforce', 'report', 'off'):
+    raise RuntimeError(f'Unknown AUTHZ_MODE {AUTHZ_MODE!r}')
+# Без ключа не стартуем: выключить проверку можно только явным AUTHZ_MODE=off
+if AUTHZ_MODE != 'off' and not SECRET_KEY:
+    raise RuntimeError('SECRET_KEY is not set: set it, or set AUTHZ_MODE=off to run without authorization')
+
+logger = logging.getLogger('dormitory.authz')
+if AUTHZ_MODE == 'off':
+    logger.warning('Authorization is off (AUTHZ_MODE=off)')
+
+AUTHZ_DENIED = registry.counter('authz_denied_total', 'Requests denied by the authorization policy',
+                                ('resource', 'status'))
+
+
+class AuthError(Exception):
+    """Rejected request; status is 401 (no valid token) or 403 (not allowed)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ============= TOKENS =============
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+_HEADER = _b64encode(b'{"alg":"HS256","typ":"JWT"}')
+
+
+def _sign(signing_input: str) -> str:
+    return _b64encode(hmac.new(SECRET_KEY.encode(), signing_input.encode('ascii'), hashlib.sha256).digest())
+
+
+class Claims:
+    """Verified token payload"""
+
+    __slots__ = ('user_id', 'tenant', 'expires')
+
+    def __init__(self, user_id: str, tenant: str, expires: float):
+        self.user_id = user_id
+        self.tenant = tenant
+        self.expires = expires
+
+
+def issue_token(user_id: str, tenant: str = 'default', now: Optional[float] = None) -> Optional[str]:
+    """Signed bearer token for a logged-in user; None without SECRET_KEY"""
+    if not SECRET_KEY:
+        return None
+    issued = int(time.time() if now is None else now)
+    payload = {'sub': user_id, 'ten': tenant, 'iat': issued, 'exp': issued + AUTH_TOKEN_TTL}
+    signing_input = f"{_HEADER}.{_b64encode(json.dumps(payload, separators=(',', ':')).encode())}"
+    return f'{signing_input}.{_sign(signing_input)}'
+
+
+def verify_token(token: str) -> Claims:
+    """Check the signature and decode the payload (expiry is checked by the caller)"""
+    header, _, rest = token.partition('.')
+    payload, _, signature = rest.partition('.')
+    if header != _HEADER or not hmac.compare_digest(signature, _sign(f'{header}.{payload}')):
+        raise AuthError(401, 'Invalid token')
+    try:
+        data = json.loads(_b64decode(payload))
+        return Claims(str(data['sub']), str(data['ten']), float(data['exp']))
+    except (ValueError, KeyError, TypeError):
+        raise AuthError(401, 'Invalid token')
+
+
+class TokenCache:
+    """Verified tokens -> claims; the oldest entry goes first when full"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: Dict[str, Claims] = {}
+        self._lock = Lock()
+
+    def claims(self, token: str, now: float) -> Claims:
+        # Без блокировки на попадании: чтение словаря атомарно
+        claims = self._entries.get(token)
+        if claims is None:
+            claims = verify_token(token)
+            with self._lock:
+                self._entries[token] = claims
+                while len(self._entries) > self.max_size:
+                    del self._entries[next(iter(self._entries))]
+        if claims.expires <= now:
+            raise AuthError(401, 'Token expired')
+        return claims
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+def bearer_token(headers: Mapping[str, str]) -> Optional[str]:
+    """Token from Authorization: Bearer or X-Auth-Token (any header case)"""
+    value = headers.get('authorization') or headers.get('Authorization')
+    if value and value[:7].lower() == 'bearer ':
+        return value[7:].strip()
+    return headers.get('x-auth-token') or headers.get('X-Auth-Token')
+
+
+# ============= POLICY =============
+
+class Rule:
+    """Who may call one resource method"""
+
+    __slots__ = ('public', 'capabilities', 'owner', 'guarded')
+
+    def __init__(self, public: bool = False, capabilities: Tuple[str, ...] = (), owner: Optional[str] = None,
+                 guarded: Tuple[str, ...] = ()):
+        self.public = public
+        self.capabilities = frozenset(capabilities)
+        self.owner = owner
+        self.guarded = guarded
+
+    def needs_capabilities(self, claims: Claims, fields: Mapping[str, Any]) -> bool:
+        """False when the token alone decides"""
+        if not self.capabilities:
+            return False
+        if self.owner is not None and str(fields.get(self.owner) or '') == claims.user_id:
+            return any(field in fields for field in self.guarded)
+        return True
+
+    def allows(self, capabilities: Optional[Capabilities]) -> bool:
+        return capabilities is not None and not self.capabilities.isdisjoint(capabilities.capabilities)
+
+
+PUBLIC = Rule(public=True)
+AUTHENTICATED = Rule()
+
+
+def require(*capabilities: str, owner: Optional[str] = None, guarded: Tuple[str, ...] = ()) -> Rule:
+    """Any of the capabilities; owner == caller is enough unless a guarded field is sent"""
+    return Rule(capabilities=capabilities, owner=owner, guarded=guarded)
+
+
+# (ресурс, метод, действие) -> правило; действие None подходит к любому.
+# Ресурс - путь после /api/ (или resource облачной функции). Чего нет в
+# политике, то запрещено.
+POLICY: Dict[Tuple[str, str, Optional[str]], Rule] = {
+    ('health', 'GET', None): PUBLIC,
+    ('health/live', 'GET', None): PUBLIC,
+    ('health/ready', 'GET', None): PUBLIC,
+    ('metrics', 'GET', None): PUBLIC,
+
+    ('users', 'GET', None): AUTHENTICATED,
+    ('users', 'POST', 'login'): PUBLIC,
+    ('users', 'POST', 'register'): PUBLIC,
+    ('users', 'PUT', None): require(MANAGE_USERS, owner='userId', guarded=('role', 'positions', 'email')),
+    ('users', 'DELETE', None): require(MANAGE_USERS),
+    ('permissions', 'GET', None): require(MANAGE_USERS, owner='userId'),
+    ('dashboard/bootstrap', 'GET', None): require(MANAGE_USERS, owner='userId'),
+
+    ('announcements', 'GET', None): AUTHENTICATED,
+    ('announcements/feed', 'GET', None): AUTHENTICATED,
+    ('announcements', 'POST', None): require(CREATE_ANNOUNCEMENTS),
+    ('announcements', 'PUT', None): require(CREATE_ANNOUNCEMENTS),
+    ('announcements', 'DELETE', None): require(CREATE_ANNOUNCEMENTS),
+
+    ('tasks', 'GET', None): AUTHENTICATED,
+    ('tasks', 'POST', None): require(MANAGE_COUNCIL),
+    ('tasks', 'PUT', None): require(COUNCIL_ACCESS),
+
+    ('duty-schedule', 'GET', None): AUTHENTICATED,
+    ('duty-schedule/calendar', 'GET', None): AUTHENTICATED,
+    ('duty-schedule', 'POST', None): require(MANAGE_COUNCIL),
+    ('duty-schedule', 'PUT', None): require(COUNCIL_ACCESS),
+    ('duty-schedule/roster', 'POST', None): require(MANAGE_COUNCIL),
+
+    ('work-shifts', 'GET', None): require(MANAGE_WORK_SHIFTS, owner='userId'),
+    ('work-shifts', 'POST', None): require(MANAGE_WORK_SHIFTS),
+    ('work-shifts', 'PUT', 'complete'): require(COMPLETE_WORK_SHIFTS),
+    ('work-shifts', 'PUT', None): require(MANAGE_WORK_SHIFTS),
+    ('work-shifts/auto', 'POST', None): require(MANAGE_WORK_SHIFTS),
+    ('cleanliness-scores', 'GET', None): AUTHENTICATED,
+    ('cleanliness-scores', 'POST', None): require(EDIT_ANY_FLOOR, FLOOR_MANAGER),
+
+    ('notifications', 'GET', None): require(MANAGE_USERS, owner='userId'),
+    ('notifications', 'POST', None): require(COUNCIL_ACCESS),
+    # Своё уведомление - по userId, которым обработчик ограничивает UPDATE
+    ('notifications', 'PUT', None): require(MANAGE_USERS, owner='userId'),
+
+    ('logs', 'GET', None): require(VIEW_LOGS),
+    ('logs', 'POST', None): require(MANAGE_USERS, owner='userId'),
+    ('logs', 'DELETE', None): require(MANAGE_USERS),
+
+    ('complaints', 'GET', None): require(MANAGE_COUNCIL, owner='authorId'),
+    ('complaints', 'POST', None): require(MANAGE_COUNCIL, owner='userId'),
+    ('complaints', 'PUT', None): require(MANAGE_COUNCIL),
+
+    ('jobs', 'GET', None): require(MANAGE_COUNCIL),
+    ('reports', 'GET', None): require(MANAGE_COUNCIL),
+    # Операции пакета проверяются по отдельности
+    ('batch', 'POST', None): AUTHENTICATED,
+}
+
+
+def resource_name(path: str) -> str:
+    """Policy resource of a URL path: /api/work-shifts/auto -> work-shifts/auto"""
+    return path[5:] if path.startswith('/api/') else path.lstrip('/')
+
+
+def policy_rule(resource: str, method: str, fields: Mapping[str, Any]) -> Rule:
+    action = fields.get('action')
+    rule = POLICY.get((resource, method, action if isinstance(action, str) else None)) \
+        or POLICY.get((resource, method, None))
+    if rule is None:
+        raise AuthError(403, 'Access denied')
+    return rule
+
+
+def authenticate(rule: Rule, headers: Mapping[str, str], tenant: str) -> Optional[Claims]:
+    """Claims of the caller; None for a public rule"""
+    if rule.public:
+        return None
+    token = bearer_token(headers)
+    if not token:
+        raise AuthError(401, 'Authentication required')
+    claims = token_cache.claims(token, time.time())
+    if claims.tenant != tenant:
+        raise AuthError(403, 'Token belongs to another tenant')
+    return claims
+
+
+def cached_capabilities(claims: Claims) -> Optional[Capabilities]:
+    """Capabilities checked against the version less than AUTHZ_CACHE_TTL ago"""
+    return permission_cache.recent(claims.user_id, AUTHZ_CACHE_TTL, claims.tenant)
+
+
+def _denied(e: AuthError, resource: str, method: str) -> None:
+    AUTHZ_DENIED.inc(resource, str(e.status))
+    if AUTHZ_MODE == 'enforce':
+        raise e
+    logger.warning('authz would deny %s %s: %d %s', method, resource, e.status, e.message)
+
+
+def authorize(resource: str, method: str, headers: Mapping[str, str], tenant: str, fields: Mapping[str, Any],
+              load: Callable[[Claims], Optional[Capabilities]]) -> Optional[Claims]:
+    """Check a request against POLICY; raises AuthError. load(claims) reads capabilities on a cache miss"""
+    if AUTHZ_MODE == 'off' or method == 'OPTIONS':
+        return None
+    try:
+        rule = policy_rule(resource, method, fields)
+        claims = authenticate(rule, headers, tenant)
+        if claims is not None and rule.needs_capabilities(claims, fields):
+            if not rule.allows(cached_capabilities(claims) or load(claims)):
+                raise AuthError(403, 'Access denied')
+        return claims
+    except AuthError as e:
+        _denied(e, resource, method)
+        return None
+
+
+async def authorize_async(resource: str, method: str, headers: Mapping[str, str], tenant: str,
+                          fields: Mapping[str, Any],
+                          load: Callable[[Claims], Awaitable[Optional[Capabilities]]]) -> Optional[Claims]:
+    """authorize() for asyncio handlers: load is a coroutine function"""
+    if AUTHZ_MODE == 'off' or method == 'OPTIONS':
+        return None
+    try:
+        rule = policy_rule(resource, method, fields)
+        claims = authenticate(rule, headers, tenant)
+        if claims is not None and rule.needs_capabilities(claims, fields):
+            if not rule.allows(cached_capabilities(claims) or await load(claims)):
+                raise AuthError(403, 'Access denied')
+        return claims
+    except AuthError as e:
+        _denied(e, resource, method)
+        return None
+
+
+# ============= FLASK =============
+
+def init_flask(app, load: Callable[[Claims], Optional[Capabilities]]) -> None:
+    """Authorize every request after g.tenant is resolved; g.claims holds the caller"""
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def _authorize():
+        if request.url_rule is None:
+            return None
+        fields = dict(request.args.items())
+        if request.method in ('POST', 'PUT'):
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                fields.update(body)
+        try:
+            g.claims = authorize(resource_name(request.url_rule.rule), request.method, request.headers,
+                                 g.tenant, fields, load)
+        except AuthError as e:
+            return jsonify({'error': e.message}), e.status
@@ -0,0 +1,110 @@
+"""
+Фильтры графика дежурств и календарная сетка
+Общая часть Flask-приложений и app_async: разбор from/to/userId/zone в
+условие WHERE под составные индексы (date, zone) и (user_id, date) и
+сборка компактной сетки «день × зона» из строк одного запроса.
+"""
+import os
+import uuid
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Максимальный диапазон календаря (чуть больше квартала)
+MAX_RANGE_DAYS = int(os.environ.get('DUTY_MAX_RANGE_DAYS', 93))
+
+
+class FilterError(ValueError):
+    """Invalid filter value; str(error) is the client-facing message"""
+
+
+def parse_day(value: Optional[str], field: str) -> Optional[date]:
+    """Parse YYYY-MM-DD (an ISO timestamp is cut to its date)"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise FilterError(f'Invalid {field} date')
+
+
+def _check_range(start: Optional[date], end: Optional[date]) -> None:
+    if start and end:
+        if end < start:
+            raise FilterError("'to' must not be earlier than 'from'")
+        if (end - start).days + 1 > MAX_RANGE_DAYS:
+            raise FilterError(f'Date range must not exceed {MAX_RANGE_DAYS} days')
+
+
+def duty_filters(args: Mapping[str, str]) -> Tuple[str, List[Any]]:
+    """WHERE clause (alias d) and params for the from/to/userId/zone query args"""
+    start = parse_day(args.get('from'), 'from')
+    end = parse_day(args.get('to'), 'to')
+    _check_range(start, end)
+
+    conditions, params = [], []
+    user_id = args.get('userId')
+    if user_id:
+        try:
+            uuid.UUID(user_id)
+        except ValueError:
+            raise FilterError('Invalid user ID')
+        conditions.append('d.user_id = %s')
+        params.append(user_id)
+    if start:
+        conditions.append('d.date >= %s')
+        params.append(start)
+    if end:
+        conditions.append('d.date <= %s')
+        params.append(end)
+    zone = (args.get('zone') or '').strip()[:100]
+    if zone:
+        conditions.append('d.zone = %s')
+        params.append(zone)
+
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ''), params
+
+
+def calendar_range(args: Mapping[str, str], today: Optional[date] = None) -> Tuple[date, date]:
+    """Calendar bounds from from/to; defaults to the current month"""
+    today = today or date.today()
+    start = parse_day(args.get('from'), 'from')
+    end = parse_day(args.get('to'), 'to')
+    if start is None and end is None:
+        start = today.replace(day=1)
+        end = today.replace(day=monthrange(today.year, today.month)[1])
+    elif start is None:
+        start = end.replace(day=1)
+    elif end is None:
+        end = start.replace(day=monthrange(start.year, start.month)[1])
+    _check_range(start, end)
+    return start, end
+
+
+def _day_key(value: Any) -> str:
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)[:10]
+
+
+def calendar_grid(rows: Iterable[Mapping[str, Any]], start: date, end: date) -> Dict[str, Any]:
+    """Compact day × zone grid: cells hold [dutyId, userId, status], names go to users once"""
+    rows = list(rows)
+    zones = sorted({row['zone'] for row in rows})
+    column = {zone: i for i, zone in enumerate(zones)}
+    days = (end - start).days + 1
+    cells: List[List[List[List[Any]]]] = [[[] for _ in zones] for _ in range(days)]
+    users: Dict[str, Optional[str]] = {}
+
+    for row in rows:
+        offset = (date.fromisoformat(_day_key(row['date'])) - start).days
+        if not 0 <= offset < days:
+            continue
+        cells[offset][column[row['zone']]].append([row['id'], row['userId'], row['status']])
+        users.setdefault(row['userId'], row['userName'])
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'zones': zones,
+        'days': [{'date': (start + timedelta(days=i)).isoformat(), 'cells': cells[i]} for i in range(days)],
+        'users': users,
+    }
@@ -4,24 +4,60 @@ Args: event - dict с httpMethod, body, queryStringParameters, pathParams
       context - объект с атрибутами request_id, function_name
 Returns: HTTP response dict
 """
+import time
+
+_import_started = time.perf_counter()  # профиль холодного старта: импорт модуля целиком
+
+import base64
 import json
+import logging
 import os
 import hashlib
 import uuid
 import re
-import time
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from authz import AuthError, authorize, issue_token
+from cold_start import WarmConnections, is_warmup, startup
+from http_cache import bump_versions, cache_headers, etag_matches, resource_etag
+from instrumentation import (finish_request, profiling_requested, record_exception, registry, start_profiler,
+                             start_request, track, track_query)
+from permissions import HOLDERS_SQL, VERSION_TABLE, normalize_positions, permission_cache, replace_positions, resolve
+from projection import ARCHIVED_SHIFT_FIELDS, LOG_FIELDS, NOTIFICATION_FIELDS, WORK_SHIFT_FIELDS
+from serialization import dumps as _dumps, row_to_camel, rows_to_camel
+from tenancy import DEFAULT_TENANT, TENANT_HEADER, TenantConfig, postgres_options
+from validation import Schema, array, boolean, email, integer, max_length, min_length, one_of, required, uuid_field
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger('dormitory.api')
+
+RESOURCE_METHODS = {
+    'users': ('GET', 'POST', 'PUT', 'DELETE'),
+    'work-shifts': ('GET', 'POST', 'PUT'),
+    'work-shifts/auto': ('POST',),
+    'cleanliness-scores': ('GET', 'POST'),
+    'notifications': ('GET', 'POST', 'PUT'),
+    'logs': ('GET', 'POST', 'DELETE'),
+    'complaints': ('GET', 'POST', 'PUT'),
+    'permissions': ('GET',),
+    'batch': ('POST',),
+}
+KNOWN_RESOURCES = tuple(RESOURCE_METHODS)
+
+CONNECTIONS_AVOIDED = registry.counter('db_connections_avoided_total',
+                                       'Requests answered without opening a DB connection', ('resource', 'stage'))
+
 # Rate limiting storage (in-memory, per function instance)
 rate_limit_storage = {}
 RATE_LIMIT_REQUESTS = 100  # requests
 RATE_LIMIT_WINDOW = 60  # seconds
 
+tenant_config = TenantConfig.from_env()
+
 def hash_password(password: str) -> str:
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -45,18 +81,10 @@ def sanitize_string(value: str, max_length: int = 500) -> str:
         return ""
     return str(value)[:max_length].strip()
 
-def snake_to_camel(snake_str: str) -> str:
-    """Convert snake_case to camelCase"""
-    components = snake_str.split('_')
-    return components[0] + ''.join(x.title() for x in components[1:])
-
-def convert_dict_keys_to_camel(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert all dictionary keys from snake_case to camelCase"""
-    return {snake_to_camel(key): value for key, value in data.items()}
-
-def check_rate_limit(ip: str) -> bool:
-    """Check if request is within rate limit"""
+def check_rate_limit(ip: str, tenant: str = DEFAULT_TENANT) -> bool:
+    """Check if request is within the tenant's rate limit"""
     current_time = time.time()
+    ip = f'{tenant}:{ip}'
     
     # Clean old entries
     expired_keys = [k for k, v in rate_limit_storage.items() 
@@ -74,7 +102,7 @@ def check_rate_limit(ip: str) -> bool:
         rate_limit_storage[ip] = {'count': 1, 'start_time': current_time}
         return True
     
-    if window_data['count'] >= RATE_LIMIT_REQUESTS:
+    if window_data['count'] >= tenant_config.rate_limit(tenant, RATE_LIMIT_REQUESTS):
         return False
     
     window_data['count'] += 1
@@ -86,391 +114,1095 @@ def get_client_ip(event: Dict[str, Any]) -> str:
     identity = request_context.get('identity', {})
     return identity.get('sourceIp', 'unknown')
 
-def get_db_connection():
-    conn = psycopg2.connect(DATABASE_URL)
+# psycopg2 импортируется при первом соединении: запросы, отвергнутые до БД, и
+# импорт модуля на холодном старте его не ждут
+@lru_cache(maxsize=None)
+def driver():
+    """psycopg2 and the cursor class, imported once per instance"""
+    with startup.phase('import_driver'):
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+
+        class TimedCursor(RealDictCursor):
+            """RealDictCursor that reports query timings to instrumentation"""
+            def execute(self, query, vars=None):
+                with track_query(query, vars):
+                    return super().execute(query, vars)
+
+    return psycopg2, TimedCursor
+
+
+def get_db_connection(tenant: str = DEFAULT_TENANT):
+    """Connect to the tenant's shard; RLS policies read app.tenant_id of the session"""
+    psycopg2, _ = driver()
+    with track('db_connect'), startup.phase('db_connect'):
+        conn = psycopg2.connect(tenant_config.shard_url(tenant, DATABASE_URL), options=postgres_options(tenant))
     return conn
 
-def handle_users(method: str, event: Dict[str, Any], conn, cur) -> Dict[str, Any]:
+# Соединение переживает вызов и достаётся следующему вызову того же экземпляра
+warm_connections = WarmConnections(get_db_connection)
+
+def resolve_tenant(event: Dict[str, Any]) -> Optional[str]:
+    """Tenant of the event by Host or X-Tenant-Id; None for an unknown tenant"""
+    headers = event.get('headers') or {}
+    return tenant_config.resolve(headers.get('Host') or headers.get('host'),
+                                 headers.get(TENANT_HEADER) or headers.get(TENANT_HEADER.lower()))
+
+class LazyConnection:
+    """DB connection opened on the first query; requests that never query never connect"""
+    def __init__(self, tenant: str = DEFAULT_TENANT):
+        self.tenant = tenant
+        self._conn = None
+        self._after_commit: List[Callable[[], None]] = []
+
+    @property
+    def opened(self) -> bool:
+        return self._conn is not None
+
+    def connect(self):
+        if self._conn is None:
+            self._conn = warm_connections.take(self.tenant)
+        return self._conn
+
+    def cursor(self) -> 'LazyCursor':
+        return LazyCursor(self)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Run callback once the transaction commits; a rollback drops it"""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+        # Транзакционный пакет откладывает commit - кэши сбрасываются только после настоящего
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._after_commit = []
+        if self._conn is not None:
+            self._conn.rollback()
+
+    def close(self):
+        """Hand the connection back for the next invocation"""
+        self._after_commit = []
+        if self._conn is not None:
+            warm_connections.put(self.tenant, self._conn)
+            self._conn = None
+
+class LazyCursor:
+    """Cursor proxy that connects on the first execute"""
+    def __init__(self, conn: LazyConnection):
+        self._conn = conn
+        self._cur = None
+
+    def _cursor(self):
+        if self._cur is None:
+            self._cur = self._conn.connect().cursor(cursor_factory=driver()[1])
+        return self._cur
+
+    def execute(self, query, vars=None):
+        return self._cursor().execute(query, vars)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor(), name)
+
+    def close(self):
+        if self._cur is not None:
+            self._cur.close()
+
+def dumps(payload: Any) -> str:
+    """Serialize a response body, timed as the serialize phase"""
+    with track('serialize'):
+        return _dumps(payload)
+
+def error_response(status: int, message: str) -> Dict[str, Any]:
+    return {'statusCode': status, 'body': json.dumps({'error': message})}
+
+# ============= REQUEST PIPELINE =============
+# parse -> validate -> handler; соединение открывается только при первом запросе к БД
+
+class Request:
+    """Parsed event passed to handle_* after validation"""
+    __slots__ = ('method', 'resource', 'params', 'headers', 'body', 'tenant')
+
+    def __init__(self, method: str, resource: str, params: Dict[str, str], headers: Dict[str, str], body: Dict[str, Any],
+                 tenant: str = DEFAULT_TENANT):
+        self.method = method
+        self.resource = resource
+        self.params = params
+        self.headers = headers
+        self.body = body
+        self.tenant = tenant
+
+def parse_request(event: Dict[str, Any], method: str, resource: str, tenant: str = DEFAULT_TENANT) -> Request:
+    """Decode the event once; raises ValueError on a malformed JSON body"""
+    body = {}
+    if method in ('POST', 'PUT') and event.get('body'):
+        body = json.loads(event['body'])
+        if not isinstance(body, dict):
+            raise ValueError('JSON body must be an object')
+    return Request(method, resource, event.get('queryStringParameters') or {}, event.get('headers') or {}, body, tenant)
+
+ROLES = ('manager', 'admin', 'moderator', 'member')
+
+COMPLAINT_CATEGORIES = ('repair', 'noise', 'cleanliness', 'security', 'other')
+COMPLAINT_STATUSES = ('open', 'in_progress', 'resolved', 'rejected')
+# Допустимые переходы статуса жалобы
+COMPLAINT_TRANSITIONS = {
+    'open': ('in_progress', 'resolved', 'rejected'),
+    'in_progress': ('open', 'resolved', 'rejected'),
+    'resolved': ('open',),
+    'rejected': ('open',),
+}
+
+# Действия, различающиеся схемой проверки
+ACTIONS = {
+    ('users', 'POST'): ('login', 'register'),
+    ('work-shifts', 'PUT'): ('complete', 'archive'),
+    ('complaints', 'PUT'): ('claim', 'respond', 'status'),
+}
+
+SCHEMAS = {
+    ('users', 'POST', 'login'): Schema(
+        'body',
+        required('email', 'password', error='Email and password required'),
+        email('email', 'Invalid email format'),
+        max_length('password', 32, 'Password must be 32 characters or less'),
+    ),
+    ('users', 'POST', 'register'): Schema(
+        'body',
+        required('email', 'password', 'name', error='Email, password and name required'),
+        email('email', 'Invalid email format'),
+        min_length('password', 6, 'Password must be at least 6 characters'),
+        max_length('password', 32, 'Password must be 32 characters or less'),
+    ),
+    ('users', 'PUT', None): Schema(
+        'body',
+        uuid_field('userId', 'Valid User ID required'),
+        one_of('role', ROLES, 'Invalid role', optional=True),
+        array('positions', 'Positions must be array', optional=True),
+        min_length('password', 6, 'Password must be at least 6 characters', optional=True),
+        max_length('password', 32, 'Password must be 32 characters or less', optional=True),
+    ),
+    ('users', 'DELETE', None): Schema('query', uuid_field('userId', 'Valid User ID required')),
+    ('permissions', 'GET', None): Schema('query', uuid_field('userId', 'Valid User ID required')),
+    ('work-shifts', 'GET', None): Schema('query', uuid_field('userId', 'Invalid user ID', optional=True)),
+    ('work-shifts', 'POST', None): Schema(
+        'body',
+        uuid_field('userId', 'Invalid user ID'),
+        integer('days', 'Invalid days value', min_value=1, max_value=365),
+        uuid_field('assignedBy', 'Invalid assigned_by ID'),
+    ),
+    ('work-shifts', 'PUT', 'complete'): Schema(
+        'body',
+        integer('shiftId', 'Invalid shift ID'),
+        integer('daysToComplete', 'Invalid days value', min_value=1),
+        uuid_field('completedBy', 'Invalid completed_by ID'),
+    ),
+    ('work-shifts', 'PUT', 'archive'): Schema('body', integer('shiftId', 'Invalid shift ID')),
+    ('notifications', 'GET', None): Schema('query', uuid_field('userId', 'Invalid user ID')),
+    ('notifications', 'POST', None): Schema('body', uuid_field('userId', 'Invalid user ID')),
+    ('notifications', 'PUT', None): Schema(
+        'body',
+        integer('notificationId', 'Invalid notification ID'),
+        uuid_field('userId', 'Invalid user ID', optional=True),
+    ),
+    ('logs', 'POST', None): Schema(
+        'body',
+        uuid_field('userId', 'Invalid user ID'),
+        uuid_field('targetUserId', 'Invalid target user ID', optional=True),
+    ),
+    ('complaints', 'GET', None): Schema(
+        'query',
+        uuid_field('authorId', 'Invalid author ID', optional=True),
+        uuid_field('assignedTo', 'Invalid moderator ID', optional=True),
+        one_of('status', COMPLAINT_STATUSES, 'Invalid status', optional=True),
+        one_of('view', ('counts',), 'Invalid view', optional=True),
+    ),
+    ('complaints', 'POST', None): Schema(
+        'body',
+        uuid_field('userId', 'Invalid user ID'),
+        required('title', 'description', 'category', error='Title, description and category required'),
+        one_of('category', COMPLAINT_CATEGORIES, 'Invalid category'),
+        max_length('title', 500, 'Title must be 500 characters or less'),
+    ),
+    ('complaints', 'PUT', 'claim'): Schema(
+        'body',
+        uuid_field('moderatorId', 'Invalid moderator ID'),
+        integer('limit', 'Invalid limit', min_value=1, max_value=10, optional=True),
+    ),
+    ('complaints', 'PUT', 'respond'): Schema(
+        'body',
+        integer('complaintId', 'Invalid complaint ID'),
+        uuid_field('moderatorId', 'Invalid moderator ID'),
+        required('response', error='Response required'),
+        one_of('status', ('resolved', 'rejected'), 'Invalid status'),
+    ),
+    ('complaints', 'PUT', 'status'): Schema(
+        'body',
+        integer('complaintId', 'Invalid complaint ID'),
+        one_of('status', COMPLAINT_STATUSES, 'Invalid status'),
+    ),
+    ('batch', 'POST', None): Schema(
+        'body',
+        array('operations', 'Operations must be array'),
+        boolean('transaction', 'transaction must be a boolean', optional=True),
+    ),
+}
+
+def request_schema(req: Request):
+    """Resolve the action and its schema; returns (known, schema)"""
+    action = None
+    actions = ACTIONS.get((req.resource, req.method))
+    if actions is not None:
+        action = req.body.get('action')
+        if action not in actions:
+            return False, None
+    return True, SCHEMAS.get((req.resource, req.method, action))
+
+def authorization_error(req: Request, cur, headers: Optional[Dict[str, str]] = None) -> Optional[AuthError]:
+    """Policy check of authz.py; capabilities are read through cur only on a cache miss"""
+    try:
+        authorize(req.resource, req.method, req.headers if headers is None else headers, req.tenant,
+                  {**req.params, **req.body}, lambda claims: resolve(cur, claims.user_id, claims.tenant))
+    except AuthError as e:
+        return e
+    return None
+
+def validate_request(req: Request):
+    """Action and schema checks; returns (stage, status, message) or None"""
+    known, schema = request_schema(req)
+    if not known:
+        return 'method', 405, 'Method not allowed'
+    error = schema.validate(req.params, req.body) if schema else None
+    if error:
+        return 'validation', 400, error
+    return None
+
+def conditional_get(req: Request, cur, resource: str):
+    """Compare If-None-Match with the resource ETag; returns (etag, 304 response or None)"""
+    etag = resource_etag(cur, resource, req.params, req.tenant)
+    if etag_matches(req.headers.get('If-None-Match') or req.headers.get('if-none-match'), etag):
+        return etag, {'statusCode': 304, 'headers': cache_headers(resource, etag), 'body': ''}
+    return etag, None
+
+# ============= HANDLERS =============
+# Тело и параметры уже проверены схемами из SCHEMAS
+
+def handle_users(req: Request, conn, cur) -> Dict[str, Any]:
+    method, body = req.method, req.body
+
     if method == 'GET':
-        cur.execute("SELECT id, email, name, role, room, room_group as group, positions FROM users ORDER BY name")
+        etag, not_modified = conditional_get(req, cur, 'users')
+        if not_modified:
+            return not_modified
+
+        position = sanitize_string(req.params.get('position', ''), 100)
+        if position:
+            cur.execute(HOLDERS_SQL, (position,))
+        else:
+            cur.execute("SELECT id, email, name, role, room, room_group as group, positions FROM users ORDER BY name")
         users = cur.fetchall()
-        
+
         return {
             'statusCode': 200,
-            'body': json.dumps({'users': [dict(u) for u in users]}, default=str)
+            'headers': cache_headers('users', etag),
+            'body': dumps({'users': users})
         }
-    
+
     elif method == 'POST':
-        body = json.loads(event.get('body', '{}'))
         action = body.get('action')
-        
+
         if action == 'login':
             email = sanitize_string(body.get('email', ''), 255)
-            password = body.get('password', '')
-            
-            if not email or not password:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Email and password required'})}
-            
-            if not validate_email(email):
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid email format'})}
-            
-            if len(password) > 32:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Password must be 32 characters or less'})}
-            
-            password_hash = hash_password(password)
-            print(f"DEBUG: email={email}, password_hash={password_hash}")
-            
-            cur.execute(
-                "SELECT id, email, name, role, room, room_group as group, positions, password_hash FROM users WHERE email = %s",
-                (email,)
-            )
-            user_with_hash = cur.fetchone()
-            print(f"DEBUG: db_hash={user_with_hash['password_hash'] if user_with_hash else 'USER_NOT_FOUND'}")
-            
+            password_hash = hash_password(body['password'])
+
             cur.execute(
                 "SELECT id, email, name, role, room, room_group as group, positions FROM users WHERE email = %s AND password_hash = %s",
                 (email, password_hash)
             )
             user = cur.fetchone()
-            
+
             if not user:
-                return {'statusCode': 401, 'body': json.dumps({'error': 'Invalid credentials'})}
-            
+                return error_response(401, 'Invalid credentials')
+
             return {
                 'statusCode': 200,
-                'body': json.dumps({'user': dict(user)}, default=str)
+                'body': dumps({'user': user, 'token': issue_token(user['id'], req.tenant)})
             }
-        
+
         elif action == 'register':
             email = sanitize_string(body.get('email', ''), 255)
-            password = body.get('password', '')
             name = sanitize_string(body.get('name', ''), 255)
             room = sanitize_string(body.get('room', ''), 50)
             group = sanitize_string(body.get('group', ''), 50)
-            
-            if not email or not password or not name:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Email, password and name required'})}
-            
-            if not validate_email(email):
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid email format'})}
-            
-            if len(password) < 6:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Password must be at least 6 characters'})}
-            
-            if len(password) > 32:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Password must be 32 characters or less'})}
-            
+
             cur.execute("SELECT id FROM users WHERE email = %s", (email,))
             if cur.fetchone():
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Email already exists'})}
-            
+                return error_response(400, 'Email already exists')
+
             user_id = str(uuid.uuid4())
-            password_hash = hash_password(password)
-            
+            password_hash = hash_password(body['password'])
+
             cur.execute(
-                """INSERT INTO users (id, email, password_hash, name, role, room, room_group, positions) 
-                   VALUES (%s, %s, %s, %s, 'member', %s, %s, '[]'::jsonb) 
+                """INSERT INTO users (id, email, password_hash, name, role, room, room_group, positions)
+                   VALUES (%s, %s, %s, %s, 'member', %s, %s, '[]'::jsonb)
                    RETURNING id, email, name, role, room, room_group as group, positions""",
                 (user_id, email, password_hash, name, room if room else None, group if group else None)
             )
             user = cur.fetchone()
+            bump_versions(cur, 'users')
             conn.commit()
-            
+
             return {
                 'statusCode': 201,
-                'body': json.dumps({'user': dict(user)}, default=str)
+                'body': dumps({'user': user, 'token': issue_token(user_id, req.tenant)})
             }
-    
+
     elif method == 'PUT':
-        body = json.loads(event.get('body', '{}'))
-        user_id = body.get('userId', '')
-        
-        if not user_id or not validate_uuid(user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Valid User ID required'})}
-        
+        user_id = body['userId']
+
         updates = []
         params = []
-        
+
         if 'name' in body:
-            name = sanitize_string(body['name'], 255)
             updates.append('name = %s')
-            params.append(name)
-        
+            params.append(sanitize_string(body['name'], 255))
+
         if 'room' in body:
             room = sanitize_string(body['room'], 50)
             updates.append('room = %s')
             params.append(room if room else None)
-        
+
         if 'group' in body:
             group = sanitize_string(body['group'], 50)
             updates.append('room_group = %s')
             params.append(group if group else None)
-        
+
         if 'role' in body:
-            role = body['role']
-            if role not in ['manager', 'admin', 'moderator', 'member']:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid role'})}
             updates.append('role = %s')
-            params.append(role)
-        
+            params.append(body['role'])
+
+        positions = None
         if 'positions' in body:
-            positions = body['positions']
-            if not isinstance(positions, list):
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Positions must be array'})}
-            positions_json = json.dumps(positions)
+            try:
+                positions = normalize_positions(body['positions'])
+            except ValueError as e:
+                return error_response(400, str(e))
             updates.append('positions = %s::jsonb')
-            params.append(positions_json)
-        
+            params.append(json.dumps(positions))
+
         if 'password' in body:
-            password = body['password']
-            if len(password) < 6:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Password must be at least 6 characters'})}
-            if len(password) > 32:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Password must be 32 characters or less'})}
-            password_hash = hash_password(password)
             updates.append('password_hash = %s')
-            params.append(password_hash)
-        
+            params.append(hash_password(body['password']))
+
         if updates:
             updates.append('updated_at = CURRENT_TIMESTAMP')
             params.append(user_id)
+            # Роль и должности - вход кэша прав
+            grants_changed = 'role' in body or positions is not None
             query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s"
             cur.execute(query, params)
+            if cur.rowcount and positions is not None:
+                replace_positions(cur, user_id, positions)
+            bump_versions(cur, 'users')
+            if grants_changed:
+                bump_versions(cur, VERSION_TABLE)
+                conn.after_commit(lambda: permission_cache.invalidate(user_id, req.tenant))
             conn.commit()
-        
+
         return {'statusCode': 200, 'body': json.dumps({'success': True})}
-    
+
     elif method == 'DELETE':
-        params = event.get('queryStringParameters', {})
-        user_id = params.get('userId', '')
-        
-        if not user_id or not validate_uuid(user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Valid User ID required'})}
-        
-        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        # Строки user_positions удаляет ON DELETE CASCADE
+        cur.execute("DELETE FROM users WHERE id = %s", (req.params['userId'],))
+        bump_versions(cur, 'users', VERSION_TABLE)
+        conn.after_commit(lambda: permission_cache.invalidate(req.params['userId'], req.tenant))
         conn.commit()
-        
+
         return {'statusCode': 200, 'body': json.dumps({'success': True})}
-    
-    return {'statusCode': 405, 'body': json.dumps({'error': 'Method not allowed'})}
 
-def handle_work_shifts(method: str, event: Dict[str, Any], conn, cur) -> Dict[str, Any]:
+    return error_response(405, 'Method not allowed')
+
+def handle_work_shifts(req: Request, conn, cur) -> Dict[str, Any]:
+    method, body = req.method, req.body
+
     if method == 'GET':
-        params = event.get('queryStringParameters') or {}
-        user_id = params.get('userId')
-        include_archived = params.get('archived') == 'true'
-        
+        user_id = req.params.get('userId')
+        include_archived = req.params.get('archived') == 'true'
+
+        try:
+            columns = (ARCHIVED_SHIFT_FIELDS if include_archived else WORK_SHIFT_FIELDS).select(req.params.get('fields'))
+        except ValueError as e:
+            return error_response(400, str(e))
+
+        etag, not_modified = conditional_get(req, cur, 'work-shifts')
+        if not_modified:
+            return not_modified
+
         if include_archived:
-            cur.execute("SELECT * FROM archived_work_shifts ORDER BY archived_at DESC")
+            # Без userId - весь архив (только MANAGE_WORK_SHIFTS, см. authz.POLICY)
+            if user_id:
+                cur.execute(f"SELECT {columns} FROM archived_work_shifts WHERE user_id = %s ORDER BY archived_at DESC", (user_id,))
+            else:
+                cur.execute(f"SELECT {columns} FROM archived_work_shifts ORDER BY archived_at DESC")
             shifts = cur.fetchall()
-            return {'statusCode': 200, 'body': json.dumps({'archivedShifts': [convert_dict_keys_to_camel(dict(s)) for s in shifts]}, default=str)}
-        
+            return {'statusCode': 200, 'headers': cache_headers('work-shifts', etag), 'body': dumps({'archivedShifts': rows_to_camel(cur, shifts)})}
+
         if user_id:
-            if not validate_uuid(user_id):
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid user ID'})}
-            cur.execute("SELECT * FROM work_shifts WHERE is_archived = FALSE AND user_id = %s ORDER BY assigned_at DESC", (user_id,))
+            cur.execute(f"SELECT {columns} FROM work_shifts WHERE is_archived = FALSE AND user_id = %s ORDER BY assigned_at DESC", (user_id,))
         else:
-            cur.execute("SELECT * FROM work_shifts WHERE is_archived = FALSE ORDER BY assigned_at DESC")
-        
+            cur.execute(f"SELECT {columns} FROM work_shifts WHERE is_archived = FALSE ORDER BY assigned_at DESC")
+
         shifts = cur.fetchall()
-        return {'statusCode': 200, 'body': json.dumps({'workShifts': [convert_dict_keys_to_camel(dict(s)) for s in shifts]}, default=str)}
-    
+        return {'statusCode': 200, 'headers': cache_headers('work-shifts', etag), 'body': dumps({'workShifts': rows_to_camel(cur, shifts)})}
+
     elif method == 'POST':
-        body = json.loads(event.get('body', '{}'))
-        
-        user_id = body.get('userId', '')
-        if not validate_uuid(user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid user ID'})}
-        
         user_name = sanitize_string(body.get('userName', ''), 255)
-        days = body.get('days')
-        assigned_by = body.get('assignedBy', '')
         assigned_by_name = sanitize_string(body.get('assignedByName', ''), 255)
         reason = sanitize_string(body.get('reason', ''), 500)
-        
-        if not isinstance(days, int) or days <= 0 or days > 365:
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid days value'})}
-        
-        if not validate_uuid(assigned_by):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid assigned_by ID'})}
-        
+
         cur.execute(
-            """INSERT INTO work_shifts (user_id, user_name, days, assigned_by, assigned_by_name, reason) 
+            """INSERT INTO work_shifts (user_id, user_name, days, assigned_by, assigned_by_name, reason)
                VALUES (%s, %s, %s, %s, %s, %s) RETURNING *""",
-            (user_id, user_name, days, assigned_by, assigned_by_name, reason)
+            (body['userId'], user_name, body['days'], body['assignedBy'], assigned_by_name, reason)
         )
         shift = cur.fetchone()
+        bump_versions(cur, 'work_shifts')
         conn.commit()
-        
-        return {'statusCode': 201, 'body': json.dumps({'workShift': convert_dict_keys_to_camel(dict(shift))}, default=str)}
-    
+
+        return {'statusCode': 201, 'body': dumps({'workShift': row_to_camel(cur, shift)})}
+
     elif method == 'PUT':
-        body = json.loads(event.get('body', '{}'))
-        shift_id = body.get('shiftId')
-        action = body.get('action')
-        
-        if not isinstance(shift_id, int):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid shift ID'})}
-        
+        shift_id = body['shiftId']
+        action = body['action']
+
         if action == 'complete':
-            days_to_complete = body.get('daysToComplete')
-            completed_by = body.get('completedBy', '')
             completed_by_name = sanitize_string(body.get('completedByName', ''), 255)
-            
-            if not isinstance(days_to_complete, int) or days_to_complete <= 0:
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid days value'})}
-            
-            if not validate_uuid(completed_by):
-                return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid completed_by ID'})}
-            
+
             cur.execute(
-                """UPDATE work_shifts 
-                   SET completed_days = completed_days + %s, 
-                       completed_by = %s, 
-                       completed_by_name = %s, 
-                       completed_at = CURRENT_TIMESTAMP 
+                """UPDATE work_shifts
+                   SET completed_days = completed_days + %s,
+                       completed_by = %s,
+                       completed_by_name = %s,
+                       completed_at = CURRENT_TIMESTAMP
                    WHERE id = %s
                    RETURNING *""",
-                (days_to_complete, completed_by, completed_by_name, shift_id)
+                (body['daysToComplete'], body['completedBy'], completed_by_name, shift_id)
             )
             shift = cur.fetchone()
+            bump_versions(cur, 'work_shifts')
             conn.commit()
-            
-            return {'statusCode': 200, 'body': json.dumps({'workShift': convert_dict_keys_to_camel(dict(shift))}, default=str)}
-        
+
+            return {'statusCode': 200, 'body': dumps({'workShift': row_to_camel(cur, shift)})}
+
         elif action == 'archive':
             cur.execute("SELECT * FROM work_shifts WHERE id = %s", (shift_id,))
             shift = cur.fetchone()
-            
+
             if shift:
                 cur.execute(
-                    """INSERT INTO archived_work_shifts 
-                       (user_id, user_name, days, reason, assigned_by, assigned_by_name, assigned_at) 
+                    """INSERT INTO archived_work_shifts
+                       (user_id, user_name, days, reason, assigned_by, assigned_by_name, assigned_at)
                        VALUES (%s, %s, %s, %s, %s, %s, %s)""",
                     (shift['user_id'], shift['user_name'], shift['days'], shift['reason'],
                      shift['assigned_by'], shift['assigned_by_name'], shift['assigned_at'])
                 )
-                
+
                 cur.execute("UPDATE work_shifts SET is_archived = TRUE WHERE id = %s", (shift_id,))
+                bump_versions(cur, 'work_shifts', 'archived_work_shifts')
                 conn.commit()
-            
+
             return {'statusCode': 200, 'body': json.dumps({'success': True})}
-    
-    return {'statusCode': 405, 'body': json.dumps({'error': 'Method not allowed'})}
 
-def handle_notifications(method: str, event: Dict[str, Any], conn, cur) -> Dict[str, Any]:
+    return error_response(405, 'Method not allowed')
+
+def handle_notifications(req: Request, conn, cur) -> Dict[str, Any]:
+    method, body = req.method, req.body
+
     if method == 'GET':
-        params = event.get('queryStringParameters', {})
-        user_id = params.get('userId', '')
-        
-        if not validate_uuid(user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid user ID'})}
-        
+        try:
+            columns = NOTIFICATION_FIELDS.select(req.params.get('fields'))
+        except ValueError as e:
+            return error_response(400, str(e))
+
+        etag, not_modified = conditional_get(req, cur, 'notifications')
+        if not_modified:
+            return not_modified
+
         cur.execute(
-            "SELECT * FROM notifications WHERE user_id = %s ORDER BY created_at DESC",
-            (user_id,)
+            f"SELECT {columns} FROM notifications WHERE user_id = %s ORDER BY created_at DESC",
+            (req.params['userId'],)
         )
         notifications = cur.fetchall()
-        
-        return {'statusCode': 200, 'body': json.dumps({'notifications': [dict(n) for n in notifications]}, default=str)}
-    
+
+        return {'statusCode': 200, 'headers': cache_headers('notifications', etag), 'body': dumps({'notifications': notifications})}
+
     elif method == 'POST':
-        body = json.loads(event.get('body', '{}'))
-        
-        user_id = body.get('userId', '')
-        if not validate_uuid(user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid user ID'})}
-        
         notif_type = sanitize_string(body.get('type', ''), 50)
         title = sanitize_string(body.get('title', ''), 255)
         message = sanitize_string(body.get('message', ''), 1000)
-        
+
         cur.execute(
-            """INSERT INTO notifications (user_id, type, title, message) 
+            """INSERT INTO notifications (user_id, type, title, message)
                VALUES (%s, %s, %s, %s) RETURNING *""",
-            (user_id, notif_type, title, message)
+            (body['userId'], notif_type, title, message)
         )
         notification = cur.fetchone()
+        bump_versions(cur, 'notifications')
         conn.commit()
-        
-        return {'statusCode': 201, 'body': json.dumps({'notification': dict(notification)}, default=str)}
-    
+
+        return {'statusCode': 201, 'body': dumps({'notification': notification})}
+
     elif method == 'PUT':
-        body = json.loads(event.get('body', '{}'))
-        notification_id = body.get('notificationId')
-        is_read = body.get('isRead', False)
-        
-        if not isinstance(notification_id, int):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid notification ID'})}
-        
-        cur.execute(
-            "UPDATE notifications SET is_read = %s WHERE id = %s RETURNING *",
-            (is_read, notification_id)
-        )
+        # С userId обновляется только уведомление этого пользователя (правило owner в authz.POLICY)
+        if body.get('userId'):
+            cur.execute(
+                "UPDATE notifications SET is_read = %s WHERE id = %s AND user_id = %s RETURNING *",
+                (body.get('isRead', False), body['notificationId'], body['userId'])
+            )
+        else:
+            cur.execute(
+                "UPDATE notifications SET is_read = %s WHERE id = %s RETURNING *",
+                (body.get('isRead', False), body['notificationId'])
+            )
         notification = cur.fetchone()
+        if notification is None:
+            return error_response(404, 'Notification not found')
+        bump_versions(cur, 'notifications')
         conn.commit()
-        
-        return {'statusCode': 200, 'body': json.dumps({'notification': dict(notification)}, default=str)}
-    
-    return {'statusCode': 405, 'body': json.dumps({'error': 'Method not allowed'})}
 
-def handle_logs(method: str, event: Dict[str, Any], conn, cur) -> Dict[str, Any]:
+        return {'statusCode': 200, 'body': dumps({'notification': notification})}
+
+    return error_response(405, 'Method not allowed')
+
+def handle_logs(req: Request, conn, cur) -> Dict[str, Any]:
+    method, body = req.method, req.body
+
     if method == 'GET':
-        params = event.get('queryStringParameters', {})
-        limit = params.get('limit', '100')
-        
+        limit = req.params.get('limit', '100')
+
         try:
             limit = int(limit)
             if limit <= 0 or limit > 1000:
                 limit = 100
         except ValueError:
             limit = 100
-        
-        cur.execute("SELECT * FROM action_logs ORDER BY created_at DESC LIMIT %s", (limit,))
+
+        try:
+            columns = LOG_FIELDS.select(req.params.get('fields'))
+        except ValueError as e:
+            return error_response(400, str(e))
+
+        etag, not_modified = conditional_get(req, cur, 'logs')
+        if not_modified:
+            return not_modified
+
+        cur.execute(f"SELECT {columns} FROM action_logs ORDER BY created_at DESC LIMIT %s", (limit,))
         logs = cur.fetchall()
-        
-        return {'statusCode': 200, 'body': json.dumps({'logs': [dict(l) for l in logs]}, default=str)}
-    
+
+        return {'statusCode': 200, 'headers': cache_headers('logs', etag), 'body': dumps({'logs': logs})}
+
     elif method == 'POST':
-        body = json.loads(event.get('body', '{}'))
-        
         action = sanitize_string(body.get('action', ''), 100)
-        user_id = body.get('userId', '')
         user_name = sanitize_string(body.get('userName', ''), 255)
         details = sanitize_string(body.get('details', ''), 1000)
         target_user_id = body.get('targetUserId')
         target_user_name = sanitize_string(body.get('targetUserName', ''), 255) if body.get('targetUserName') else None
-        
-        if not validate_uuid(user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid user ID'})}
-        
-        if target_user_id and not validate_uuid(target_user_id):
-            return {'statusCode': 400, 'body': json.dumps({'error': 'Invalid target user ID'})}
-        
+
         cur.execute(
-            """INSERT INTO action_logs (action, user_id, user_name, details, target_user_id, target_user_name) 
+            """INSERT INTO action_logs (action, user_id, user_name, details, target_user_id, target_user_name)
                VALUES (%s, %s, %s, %s, %s, %s) RETURNING *""",
-            (action, user_id, user_name, details, target_user_id, target_user_name)
+            (action, body['userId'], user_name, details, target_user_id, target_user_name)
         )
         log = cur.fetchone()
+        bump_versions(cur, 'action_logs')
         conn.commit()
-        
-        return {'statusCode': 201, 'body': json.dumps({'log': dict(log)}, default=str)}
-    
+
+        return {'statusCode': 201, 'body': dumps({'log': log})}
+
     elif method == 'DELETE':
         cur.execute("DELETE FROM action_logs")
+        bump_versions(cur, 'action_logs')
         conn.commit()
         return {'statusCode': 200, 'body': json.dumps({'success': True})}
-    
-    return {'statusCode': 405, 'body': json.dumps({'error': 'Method not allowed'})}
+
+    return error_response(405, 'Method not allowed')
+
+def adjust_complaint_counts(cur, category: str, old_status: Optional[str], new_status: Optional[str], amount: int = 1):
+    """Move amount complaints between (category, status) counters in the current transaction"""
+    if old_status:
+        cur.execute(
+            "UPDATE complaint_counts SET total = total - %s WHERE category = %s AND status = %s",
+            (amount, category, old_status)
+        )
+    if new_status:
+        cur.execute(
+            """INSERT INTO complaint_counts (category, status, total) VALUES (%s, %s, %s)
+               ON CONFLICT ON CONSTRAINT complaint_counts_pkey DO UPDATE SET total = complaint_counts.total + EXCLUDED.total""",
+            (category, new_status, amount)
+        )
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    created = row['created_at']
+    created = created.isoformat() if hasattr(created, 'isoformat') else str(created)
+    return base64.urlsafe_b64encode(f"{created}|{row['id']}".encode()).decode()
+
+def decode_cursor(value: str):
+    """Keyset position (created_at, id) from an opaque cursor; None if malformed"""
+    try:
+        created, row_id = base64.urlsafe_b64decode(value.encode()).decode().rsplit('|', 1)
+        datetime.fromisoformat(created)
+        return created, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def handle_complaints(req: Request, conn, cur) -> Dict[str, Any]:
+    method, body = req.method, req.body
+
+    if method == 'GET':
+        params = req.params
+
+        if params.get('view') == 'counts':
+            etag, not_modified = conditional_get(req, cur, 'complaints')
+            if not_modified:
+                return not_modified
+
+            cur.execute("SELECT category, status, total FROM complaint_counts WHERE total > 0 ORDER BY category, status")
+            counts: Dict[str, Dict[str, int]] = {}
+            for row in cur.fetchall():
+                counts.setdefault(row['category'], {})[row['status']] = row['total']
+            return {'statusCode': 200, 'headers': cache_headers('complaints', etag), 'body': dumps({'counts': counts})}
+
+        author_id = params.get('authorId')
+        assigned_to = params.get('assignedTo')
+        if not author_id and not assigned_to:
+            return error_response(400, 'authorId or assignedTo required')
+
+        try:
+            limit = int(params.get('limit', '20'))
+            if limit <= 0 or limit > 100:
+                limit = 20
+        except ValueError:
+            limit = 20
+
+        conditions = ['created_by = %s' if author_id else 'assigned_to = %s']
+        values: List[Any] = [author_id or assigned_to]
+        if params.get('status'):
+            conditions.append('status = %s')
+            values.append(params['status'])
+        if params.get('cursor'):
+            position = decode_cursor(params['cursor'])
+            if position is None:
+                return error_response(400, 'Invalid cursor')
+            # Keyset: продолжаем строго после последней строки предыдущей страницы
+            conditions.append('(created_at, id) < (%s::timestamp, %s)')
+            values.extend(position)
+
+        etag, not_modified = conditional_get(req, cur, 'complaints')
+        if not_modified:
+            return not_modified
+
+        cur.execute(
+            f"""SELECT * FROM complaints WHERE {' AND '.join(conditions)}
+                ORDER BY created_at DESC, id DESC LIMIT %s""",
+            values + [limit + 1]
+        )
+        rows = cur.fetchall()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+
+        return {
+            'statusCode': 200,
+            'headers': cache_headers('complaints', etag),
+            'body': dumps({'complaints': rows_to_camel(cur, rows), 'nextCursor': next_cursor})
+        }
+
+    elif method == 'POST':
+        title = sanitize_string(body.get('title', ''), 500)
+        description = sanitize_string(body.get('description', ''), 5000)
+        user_name = sanitize_string(body.get('userName', ''), 255)
+        category = body['category']
+
+        if not title or not description:
+            return error_response(400, 'Title, description and category required')
+
+        cur.execute(
+            """INSERT INTO complaints (title, description, category, status, created_by, created_by_name)
+               VALUES (%s, %s, %s, 'open', %s, %s) RETURNING *""",
+            (title, description, category, body['userId'], user_name)
+        )
+        complaint = cur.fetchone()
+        adjust_complaint_counts(cur, category, None, 'open')
+        bump_versions(cur, 'complaints')
+        conn.commit()
+
+        return {'statusCode': 201, 'body': dumps({'complaint': row_to_camel(cur, complaint)})}
+
+    elif method == 'PUT':
+        action = body['action']
+
+        if action == 'claim':
+            # Очередь модераторов: SKIP LOCKED пропускает строки, которые прямо сейчас
+            # забирает другая транзакция, поэтому одну жалобу не получат двое
+            cur.execute(
+                """UPDATE complaints
+                   SET status = 'in_progress', assigned_to = %s, assigned_to_name = %s,
+                       assigned_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                   WHERE id IN (
+                       SELECT id FROM complaints WHERE status = 'open'
+                       ORDER BY created_at, id
+                       LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING *""",
+                (body['moderatorId'], sanitize_string(body.get('moderatorName', ''), 255), body.get('limit', 1))
+            )
+            claimed = cur.fetchall()
+            if claimed:
+                per_category: Dict[str, int] = {}
+                for row in claimed:
+                    per_category[row['category']] = per_category.get(row['category'], 0) + 1
+                for category, amount in sorted(per_category.items()):
+                    adjust_complaint_counts(cur, category, 'open', 'in_progress', amount)
+                bump_versions(cur, 'complaints')
+            conn.commit()
+
+            claimed.sort(key=lambda row: (row['created_at'], row['id']))
+            return {'statusCode': 200, 'body': dumps({'complaints': rows_to_camel(cur, claimed)})}
+
+        new_status = body['status']
+        cur.execute("SELECT status, category FROM complaints WHERE id = %s FOR UPDATE", (body['complaintId'],))
+        current = cur.fetchone()
+        if not current:
+            return error_response(404, 'Complaint not found')
+        if new_status not in COMPLAINT_TRANSITIONS[current['status']]:
+            return error_response(409, f"Cannot change status from {current['status']} to {new_status}")
+
+        if action == 'respond':
+            response = sanitize_string(body.get('response', ''), 5000)
+            if not response:
+                return error_response(400, 'Response required')
+            cur.execute(
+                """UPDATE complaints
+                   SET status = %s, response = %s, responded_by = %s, responded_by_name = %s,
+                       responded_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = %s RETURNING *""",
+                (new_status, response, body['moderatorId'], sanitize_string(body.get('moderatorName', ''), 255),
+                 body['complaintId'])
+            )
+        elif new_status == 'open':
+            # Возврат в очередь снимает назначение
+            cur.execute(
+                """UPDATE complaints
+                   SET status = 'open', assigned_to = NULL, assigned_to_name = NULL, assigned_at = NULL,
+                       updated_at = CURRENT_TIMESTAMP
+                   WHERE id = %s RETURNING *""",
+                (body['complaintId'],)
+            )
+        else:
+            cur.execute(
+                "UPDATE complaints SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s RETURNING *",
+                (new_status, body['complaintId'])
+            )
+        complaint = cur.fetchone()
+        adjust_complaint_counts(cur, current['category'], current['status'], new_status)
+        bump_versions(cur, 'complaints')
+        conn.commit()
+
+        return {'statusCode': 200, 'body': dumps({'complaint': row_to_camel(cur, complaint)})}
+
+    return error_response(405, 'Method not allowed')
+
+# ============= BATCH =============
+# Несколько операций за один вызов: одно соединение и, по желанию, одна транзакция
+
+BATCH_RESOURCES = ('users', 'work-shifts', 'notifications', 'logs')
+MAX_BATCH_OPERATIONS = int(os.environ.get('MAX_BATCH_OPERATIONS', 20))
+
+class DeferredCommitConnection:
+    """Connection proxy for a transactional batch: handler commits wait for the whole batch"""
+    def __init__(self, conn: LazyConnection):
+        self._conn = conn
+
+    def commit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def batch_operation(op: Any, tenant: str):
+    """Sub-request of a batch validated like a standalone call; returns (request, error message)"""
+    if not isinstance(op, dict):
+        return None, 'Operation must be an object'
+    resource = op.get('resource')
+    method = str(op.get('method') or 'GET').upper()
+    if resource not in BATCH_RESOURCES:
+        return None, 'Resource not allowed in batch'
+    if method not in RESOURCE_METHODS[resource]:
+        return None, 'Method not allowed'
+    params, body = op.get('params') or {}, op.get('body') or {}
+    if not isinstance(params, dict) or not isinstance(body, dict):
+        return None, 'params and body must be objects'
+
+    # Параметры приходят строками, как queryStringParameters
+    params = {key: str(value) for key, value in params.items()}
+    req = Request(method, resource, params, {}, body if method in ('POST', 'PUT') else {}, tenant)
+    invalid = validate_request(req)
+    if invalid:
+        return None, invalid[2]
+    return req, None
+
+def handle_batch(req: Request, conn, cur) -> Dict[str, Any]:
+    operations = req.body['operations']
+    if not 1 <= len(operations) <= MAX_BATCH_OPERATIONS:
+        return error_response(400, f'Batch must contain 1 to {MAX_BATCH_OPERATIONS} operations')
+
+    # Все операции проверяются до первого запроса к БД (права - по токену пакета)
+    requests = []
+    for index, op in enumerate(operations):
+        sub, message = batch_operation(op, req.tenant)
+        if message:
+            return {'statusCode': 400, 'body': json.dumps({'error': message, 'operation': index})}
+        denied = authorization_error(sub, cur, req.headers)
+        if denied is not None:
+            return {'statusCode': denied.status, 'body': json.dumps({'error': denied.message, 'operation': index})}
+        requests.append(sub)
+
+    atomic = req.body.get('transaction', False)
+    target = DeferredCommitConnection(conn) if atomic else conn
+    results: List[str] = []
+    failed = False
+
+    for sub in requests:
+        if failed and atomic:
+            results.append('{"status":424,"body":{"error":"Skipped after a failed operation"}}')
+            continue
+        try:
+            result = HANDLERS[sub.resource](sub, target, cur)
+        except Exception as e:
+            record_exception(e)
+            result = error_response(500, 'Internal server error')
+        status = result['statusCode']
+        if status >= 400:
+            failed = True
+            # Без транзакции откатывается только незакоммиченное этой операцией
+            conn.rollback()
+        results.append(f'{{"status":{status},"body":{result.get("body") or "null"}}}')
+
+    body = f'{{"results":[{",".join(results)}]'
+    if atomic:
+        if failed:
+            conn.rollback()
+        else:
+            conn.commit()
+        body += f',"committed":{"false" if failed else "true"}'
+    return {'statusCode': 200, 'body': body + '}'}
+
+def handle_work_shifts_auto(req: Request, conn, cur) -> Dict[str, Any]:
+    """Assign work shifts from cleanliness scores (shift_rules.py), like POST /api/work-shifts/auto of app_async"""
+    # Движок правил нужен двум ресурсам - импортируется в них, а не на холодном старте
+    from duty_calendar import FilterError
+    from shift_rules import evaluate, notification_rows, parse_auto_request, plan_shifts, score_filters, shifts_summary
+
+    try:
+        spec = parse_auto_request(req.body)
+    except FilterError as e:
+        return error_response(400, str(e))
+
+    if not spec.dry_run and not validate_uuid(spec.assigned_by):
+        return error_response(400, 'Invalid assigned_by ID')
+
+    where, params = score_filters(spec)
+    cur.execute(f"SELECT room, date, score FROM cleanliness_scores {where}", params)
+    scores = [(row['room'], row['date'], row['score']) for row in cur.fetchall()]
+    with track('shift_rules'):
+        hits = evaluate(scores, spec.rules, spec.start, spec.end)
+
+    residents, taken = [], set()
+    if hits:
+        rooms = sorted({hit.room for hit in hits})
+        keys = sorted({hit.rule_key for hit in hits})
+        cur.execute(
+            f"""SELECT id, name, room FROM users
+                WHERE room IN ({', '.join(['%s'] * len(rooms))}) AND role NOT IN ('manager', 'admin')
+                ORDER BY room, name""",
+            rooms
+        )
+        residents = cur.fetchall()
+        cur.execute(f"SELECT user_id, rule_key FROM work_shifts WHERE rule_key IN ({', '.join(['%s'] * len(keys))})", keys)
+        taken = {(row['user_id'], row['rule_key']) for row in cur.fetchall()}
+    rows, skipped = plan_shifts(hits, residents, taken)
+
+    if rows and not spec.dry_run:
+        cur.executemany(
+            """INSERT INTO work_shifts (user_id, user_name, days, assigned_by, assigned_by_name, reason, rule_key)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            [(user_id, name, days, spec.assigned_by, spec.assigned_by_name, reason, key)
+             for user_id, name, days, reason, key in rows]
+        )
+        cur.executemany(
+            "INSERT INTO notifications (user_id, type, title, message) VALUES (%s, %s, %s, %s)",
+            notification_rows(rows)
+        )
+        bump_versions(cur, 'work_shifts', 'notifications')
+        conn.commit()
+
+    summary = shifts_summary(len(scores), hits, rows, skipped)
+    summary['created'] = 0 if spec.dry_run else len(rows)
+    shifts = [{'userId': user_id, 'userName': name, 'days': days, 'reason': reason, 'ruleKey': key}
+              for user_id, name, days, reason, key in rows]
+    return {
+        'statusCode': 200 if spec.dry_run else 201,
+        'body': dumps({'summary': summary, 'rules': [rule.as_dict() for rule in spec.rules], 'workShifts': shifts})
+    }
+
+def handle_cleanliness_scores(req: Request, conn, cur) -> Dict[str, Any]:
+    from duty_calendar import FilterError, calendar_range
+    from shift_rules import UPSERT_SCORE_SQL, parse_scores
+
+    if req.method == 'GET':
+        try:
+            start, end = calendar_range(req.params)
+        except FilterError as e:
+            return error_response(400, str(e))
+        room = sanitize_string(req.params.get('room', ''), 50)
+
+        # Диапазон по умолчанию - текущий месяц: он входит в ETag, чтобы смена месяца не давала 304
+        etag = resource_etag(cur, 'cleanliness-scores', {**req.params, 'from': start.isoformat(), 'to': end.isoformat()},
+                             req.tenant)
+        if etag_matches(req.headers.get('If-None-Match') or req.headers.get('if-none-match'), etag):
+            return {'statusCode': 304, 'headers': cache_headers('cleanliness-scores', etag), 'body': ''}
+
+        cur.execute(f"""
+            SELECT room, date, score, inspector FROM cleanliness_scores
+            WHERE date BETWEEN %s AND %s{' AND room = %s' if room else ''}
+            ORDER BY date, room
+        """, (start, end, room) if room else (start, end))
+        scores = cur.fetchall()
+        return {'statusCode': 200, 'headers': cache_headers('cleanliness-scores', etag),
+                'body': dumps({'scores': rows_to_camel(cur, scores)})}
+
+    try:
+        rows = parse_scores(req.body.get('scores'))
+    except FilterError as e:
+        return error_response(400, str(e))
+
+    cur.executemany(UPSERT_SCORE_SQL['postgres'], rows)
+    bump_versions(cur, 'cleanliness_scores')
+    conn.commit()
+    return {'statusCode': 200, 'body': json.dumps({'saved': len(rows)})}
+
+def handle_permissions(req: Request, conn, cur) -> Dict[str, Any]:
+    capabilities = resolve(cur, req.params['userId'], req.tenant)
+    if capabilities is None:
+        return error_response(404, 'User not found')
+    return {
+        'statusCode': 200,
+        'headers': {'Cache-Control': 'private, no-cache'},
+        'body': dumps({'permissions': capabilities.as_dict()})
+    }
+
+HANDLERS = {
+    'users': handle_users,
+    'work-shifts': handle_work_shifts,
+    'work-shifts/auto': handle_work_shifts_auto,
+    'cleanliness-scores': handle_cleanliness_scores,
+    'notifications': handle_notifications,
+    'logs': handle_logs,
+    'complaints': handle_complaints,
+    'permissions': handle_permissions,
+    'batch': handle_batch,
+}
+
+def warmup() -> int:
+    """Warmup event: import the driver and park a checked connection per tenant before traffic arrives"""
+    tenants = [tenant for tenant in os.environ.get('WARMUP_TENANTS', DEFAULT_TENANT).split(',') if tenant]
+    status = 200
+    for tenant in tenants:
+        conn = LazyConnection(tenant)
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+        except Exception as e:
+            record_exception(e)
+            status = 503
+        finally:
+            conn.close()
+    return status
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    started = time.perf_counter()
+    if is_warmup(event):
+        status = warmup()
+        if startup.first_invocation(started):
+            logger.info('cold start (warmup) %s', startup.as_dict())
+        return {'statusCode': status, 'body': json.dumps({'warm': status == 200, 'startup': startup.as_dict()})}
+
     method = event.get('httpMethod', 'GET')
-    resource = event.get('queryStringParameters', {}).get('resource', '')
-    
+    resource = (event.get('queryStringParameters') or {}).get('resource', '')
+
+    start_request(resource if resource in KNOWN_RESOURCES else 'unknown', method)
+    headers = event.get('headers') or {}
+    if profiling_requested(headers.get('X-Profile') or headers.get('x-profile')):
+        start_profiler()
+
+    result = process_request(event, method, resource)
+
+    stats = finish_request(result['statusCode'])
+    if stats is not None:
+        server_timing = stats.server_timing()
+        result.setdefault('headers', {})['Server-Timing'] = server_timing
+        if stats.profiler is not None:
+            result['headers']['X-Profile-Id'] = stats.profiler.profile_id
+        logger.info('%s %s -> %d queries=%d %s', method, resource, result['statusCode'], stats.queries, server_timing)
+    if startup.first_invocation(started):
+        logger.info('cold start %s', startup.as_dict())
+    return result
+
+def with_default_headers(result: Dict[str, Any]) -> Dict[str, Any]:
+    if 'headers' not in result:
+        result['headers'] = {}
+    result['headers']['Access-Control-Allow-Origin'] = '*'
+    result['headers']['Access-Control-Expose-Headers'] = 'ETag, Server-Timing'
+    result['headers']['Content-Type'] = 'application/json'
+    result['headers']['X-Content-Type-Options'] = 'nosniff'
+    result['headers']['X-Frame-Options'] = 'DENY'
+    result['headers']['X-XSS-Protection'] = '1; mode=block'
+    result['isBase64Encoded'] = False
+    return result
+
+def reject_request(event: Dict[str, Any], method: str, resource: str, tenant: str):
+    """Pipeline stages that need no database; returns (stage, response, request)"""
+    if resource not in RESOURCE_METHODS:
+        return 'not_found', error_response(404, 'Resource not found'), None
+    if method not in RESOURCE_METHODS[resource]:
+        return 'method', error_response(405, 'Method not allowed'), None
+    try:
+        req = parse_request(event, method, resource, tenant)
+    except ValueError:  # json.JSONDecodeError тоже ValueError
+        return 'invalid_json', error_response(400, 'Invalid JSON in request body'), None
+    invalid = validate_request(req)
+    if invalid:
+        stage, status, message = invalid
+        return stage, error_response(status, message), None
+    return None, None, req
+
+def process_request(event: Dict[str, Any], method: str, resource: str) -> Dict[str, Any]:
+    label = resource if resource in KNOWN_RESOURCES else 'unknown'
+
+    tenant = resolve_tenant(event)
+    if tenant is None:
+        CONNECTIONS_AVOIDED.inc(label, 'tenant')
+        return with_default_headers(error_response(404, 'Unknown tenant'))
+
     # Rate limiting check
     client_ip = get_client_ip(event)
-    if not check_rate_limit(client_ip):
+    if not check_rate_limit(client_ip, tenant):
+        CONNECTIONS_AVOIDED.inc(label, 'rate_limit')
         return {
             'statusCode': 429,
             'headers': {
@@ -480,67 +1212,48 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Too many requests. Please try again later.'}),
             'isBase64Encoded': False
         }
-    
+
     # Handle CORS OPTIONS
     if method == 'OPTIONS':
+        CONNECTIONS_AVOIDED.inc(label, 'options')
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-Id, X-Auth-Token, If-None-Match, X-Profile, X-Tenant-Id',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
-    
-    conn = None
+
+    stage, rejected, req = reject_request(event, method, resource, tenant)
+    if rejected is not None:
+        CONNECTIONS_AVOIDED.inc(label, stage)
+        return with_default_headers(rejected)
+
+    conn = LazyConnection(tenant)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if resource == 'users':
-            result = handle_users(method, event, conn, cur)
-        elif resource == 'work-shifts':
-            result = handle_work_shifts(method, event, conn, cur)
-        elif resource == 'notifications':
-            result = handle_notifications(method, event, conn, cur)
-        elif resource == 'logs':
-            result = handle_logs(method, event, conn, cur)
-        else:
-            result = {'statusCode': 404, 'body': json.dumps({'error': 'Resource not found'})}
-        
+        cur = conn.cursor()
+        denied = authorization_error(req, cur)
+        if denied is not None:
+            if not conn.opened:
+                CONNECTIONS_AVOIDED.inc(label, 'auth')
+            return with_default_headers(error_response(denied.status, denied.message))
+        result = HANDLERS[resource](req, conn, cur)
         cur.close()
-        
-        if 'headers' not in result:
-            result['headers'] = {}
-        result['headers']['Access-Control-Allow-Origin'] = '*'
-        result['headers']['Content-Type'] = 'application/json'
-        result['headers']['X-Content-Type-Options'] = 'nosniff'
-        result['headers']['X-Frame-Options'] = 'DENY'
-        result['headers']['X-XSS-Protection'] = '1; mode=block'
-        result['isBase64Encoded'] = False
-        
-        return result
-        
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Invalid JSON in request body'}),
-            'isBase64Encoded': False
-        }
+        if not conn.opened:
+            CONNECTIONS_AVOIDED.inc(label, 'handler')
+        return with_default_headers(result)
+
     except Exception as e:
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-        
+        record_exception(e)
+        try:
+            conn.rollback()
+        except:
+            pass
+
         return {
             'statusCode': 500,
             'headers': {
@@ -551,8 +1264,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
\ No newline at end of file
+        try:
+            conn.close()
+        except:
+            pass
+
+startup.record('import', _import_started)
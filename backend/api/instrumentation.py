@@ -0,0 +1,392 @@
+"""
+Инструментирование запросов
+Тайминги по фазам (подключение к БД, запросы, сериализация, итог),
+журнал медленных запросов, счётчики и гистограммы в формате Prometheus
+и семплирующий профайлер, включаемый на отдельный запрос
+"""
+import bisect
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+logger = logging.getLogger('dormitory.instrumentation')
+slow_query_logger = logging.getLogger('dormitory.slow_query')
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/dormitory-profiles')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASES = ('db_connect', 'db_query', 'serialize')
+
+
+# ============= METRICS =============
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value:g}')
+        return '\n'.join(lines)
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    def set(self, *label_values: str, value: float) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> str:
+        return super().render().replace(f'# TYPE {self.name} counter', f'# TYPE {self.name} gauge', 1)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [счётчики по бакетам..., +Inf, сумма]
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += hits
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                labels = _format_labels(self.labels, label_values, 'le="%s"' % le)
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}')
+        return '\n'.join(lines)
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(m.render() for m in metrics) + '\n'
+
+
+registry = Registry()
+
+REQUESTS_TOTAL = registry.counter('http_requests_total', 'HTTP requests handled', ('route', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram('http_request_duration_seconds', 'Total request time', ('route', 'method'))
+PHASE_SECONDS = registry.histogram('http_request_phase_seconds', 'Request time by phase', ('route', 'phase'))
+QUERIES_TOTAL = registry.counter('db_queries_total', 'SQL statements executed', ('route',))
+SLOW_QUERIES_TOTAL = registry.counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS', ('fingerprint',))
+ERRORS_TOTAL = registry.counter('http_request_errors_total', 'Unhandled exceptions', ('route', 'exception'))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def render_metrics() -> str:
+    """Render all metrics in Prometheus text exposition format"""
+    return registry.render()
+
+
+# ============= PER-REQUEST TIMING =============
+
+class RequestStats:
+    """Timings accumulated while a single request is served"""
+
+    __slots__ = ('route', 'method', 'started', 'phases', 'queries', 'profiler')
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.profiler: Optional['SamplingProfiler'] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        parts = [f"{name.replace('_', '-')};dur={value * 1000:.2f}" for name, value in self.phases.items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar('request_stats', default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def start_request(route: str, method: str) -> RequestStats:
+    """Begin collecting timings for the current request"""
+    stats = RequestStats(route, method)
+    _current.set(stats)
+    return stats
+
+
+def finish_request(status: int) -> Optional[RequestStats]:
+    """Record the collected timings into metrics and reset the context"""
+    stats = _current.get()
+    if stats is None:
+        return None
+    _current.set(None)
+    if stats.profiler is not None:
+        stats.profiler.stop()
+    total = stats.elapsed()
+    REQUESTS_TOTAL.inc(stats.route, stats.method, str(status))
+    REQUEST_SECONDS.observe(total, stats.route, stats.method)
+    for phase, value in stats.phases.items():
+        if value:
+            PHASE_SECONDS.observe(value, stats.route, phase)
+    if stats.queries:
+        QUERIES_TOTAL.inc(stats.route, amount=stats.queries)
+    return stats
+
+
+def record_exception(exc: BaseException) -> None:
+    """Count and log an unhandled exception with its traceback"""
+    stats = _current.get()
+    route = stats.route if stats else 'unknown'
+    ERRORS_TOTAL.inc(route, type(exc).__name__)
+    logger.error('Unhandled exception in %s', route, exc_info=exc)
+
+
+@contextmanager
+def track(phase: str) -> Iterator[None]:
+    """Add the time spent in the block to a phase of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.phases[phase] = stats.phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+# ============= SLOW QUERY LOG =============
+
+# Компилируются при первом медленном запросе, а не при импорте (холодный старт функций)
+@lru_cache(maxsize=None)
+def _fingerprint_rules():
+    return (
+        (re.compile(r"'(?:[^']|'')*'"), '?'),
+        (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+        (re.compile(r'%s|%\(\w+\)s'), '?'),
+        (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?+)'),
+        (re.compile(r'\s+'), ' '),
+    )
+
+
+def fingerprint(sql: Any) -> str:
+    """Normalize SQL so statements differing only in literals group together"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    text = str(sql)
+    for pattern, replacement in _fingerprint_rules():
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def _param_count(params: Any) -> int:
+    if params is None:
+        return 0
+    if isinstance(params, dict):
+        return len(params)
+    try:
+        return len(params)
+    except TypeError:
+        return 1
+
+
+@contextmanager
+def track_query(sql: Any, params: Any = None) -> Iterator[None]:
+    """Time a SQL statement and log it if slower than SLOW_QUERY_MS"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats = _current.get()
+        if stats is not None:
+            stats.phases['db_query'] += elapsed
+            stats.queries += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            fp = fingerprint(sql)
+            SLOW_QUERIES_TOTAL.inc(fp[:200])
+            slow_query_logger.warning(
+                'slow query %.1f ms route=%s params=%d sql=%s',
+                elapsed * 1000, stats.route if stats else '-', _param_count(params), fp,
+            )
+
+
+# ============= SAMPLING PROFILER =============
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and writes folded stacks"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: _Tally = _Tally()
+        self.profile_id = uuid.uuid4().hex[:12]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'profiler-{self.profile_id}', daemon=True)
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> Optional[str]:
+        """Stop sampling and write the profile; returns the file path"""
+        self._stop.set()
+        self._thread.join(timeout=1)
+        if not self.samples:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f'{self.profile_id}.folded')
+        with open(path, 'w') as fh:
+            for stack, hits in self.samples.most_common():
+                fh.write(f'{stack} {hits}\n')
+        logger.info('profile %s written to %s (%d samples)', self.profile_id, path, sum(self.samples.values()))
+        return path
+
+
+def profiling_requested(header_value: Optional[str]) -> bool:
+    """Profiling is opt-in per request and only when PROFILER_TOKEN is configured"""
+    return bool(PROFILER_TOKEN) and header_value == PROFILER_TOKEN
+
+
+def start_profiler() -> Optional[SamplingProfiler]:
+    """Attach a sampling profiler to the current request"""
+    stats = _current.get()
+    if stats is None:
+        return None
+    stats.profiler = SamplingProfiler(threading.get_ident()).start()
+    return stats.profiler
+
+
+# ============= FLASK =============
+
+def init_flask(app) -> None:
+    """Register request hooks and the /metrics endpoint on a Flask app"""
+    from flask import request
+
+    @app.before_request
+    def _start_timing():
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        start_request(rule, request.method)
+        if profiling_requested(request.headers.get('X-Profile')):
+            start_profiler()
+
+    @app.after_request
+    def _finish_timing(response):
+        stats = finish_request(response.status_code)
+        if stats is not None:
+            response.headers['Server-Timing'] = stats.server_timing()
+            if stats.profiler is not None:
+                response.headers['X-Profile-Id'] = stats.profiler.profile_id
+        return response
+
+    @app.teardown_request
+    def _log_exception(exc):
+        if exc is not None:
+            record_exception(exc)
+            finish_request(500)
+
+    def metrics_endpoint():
+        return app.response_class(render_metrics(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+    app.add_url_rule('/api/metrics', 'api_metrics', metrics_endpoint, methods=['GET'])
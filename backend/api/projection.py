@@ -0,0 +1,72 @@
+"""
+Разреженные наборы полей для списков облачной функции
+Параметр fields= сопоставляется с белым списком колонок ресурса, поэтому
+из БД читаются и сериализуются только запрошенные колонки. Без fields
+отдаётся узкая проекция списка, которую покрывают индексы с INCLUDE
+(index-only scan); fields=* возвращает все колонки из белого списка.
+"""
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+
+from serialization import snake_to_camel
+
+
+class Projection:
+    """Column whitelist of a list resource and its slim default"""
+
+    __slots__ = ('columns', '_lookup', 'default', 'full')
+
+    def __init__(self, columns: Sequence[str], default: Sequence[str]):
+        self.columns = tuple(columns)
+        # Имя поля принимается как в ответе (camelCase) и как колонка (snake_case)
+        self._lookup: Dict[str, str] = {}
+        for column in self.columns:
+            self._lookup[column] = column
+            self._lookup[snake_to_camel(column)] = column
+        self.default = self._join(default)
+        self.full = self._join(self.columns)
+
+    def _join(self, chosen) -> str:
+        # id нужен клиенту всегда; порядок колонок фиксирован, чтобы запрос не плодил вариантов
+        chosen = set(chosen) | {'id'}
+        return ', '.join(column for column in self.columns if column in chosen)
+
+    @lru_cache(maxsize=256)
+    def select(self, fields: Optional[str]) -> str:
+        """SELECT list for a fields= value; raises ValueError on an unknown field"""
+        if not fields:
+            return self.default
+        if fields.strip() == '*':
+            return self.full
+        chosen = set()
+        for name in fields.split(','):
+            name = name.strip()
+            if not name:
+                continue
+            column = self._lookup.get(name)
+            if column is None:
+                raise ValueError(f'Unknown field: {name[:50]}')
+            chosen.add(column)
+        return self._join(chosen)
+
+
+WORK_SHIFT_FIELDS = Projection(
+    ('id', 'user_id', 'user_name', 'days', 'completed_days', 'assigned_by', 'assigned_by_name',
+     'completed_by', 'completed_by_name', 'reason', 'assigned_at', 'completed_at', 'is_archived', 'archived_at'),
+    default=('user_id', 'user_name', 'days', 'completed_days', 'assigned_at'),
+)
+
+ARCHIVED_SHIFT_FIELDS = Projection(
+    ('id', 'user_id', 'user_name', 'days', 'reason', 'assigned_by', 'assigned_by_name', 'assigned_at', 'archived_at'),
+    default=('user_id', 'user_name', 'days', 'assigned_at', 'archived_at'),
+)
+
+NOTIFICATION_FIELDS = Projection(
+    ('id', 'user_id', 'type', 'title', 'message', 'is_read', 'created_at'),
+    default=('type', 'title', 'is_read', 'created_at'),
+)
+
+LOG_FIELDS = Projection(
+    ('id', 'action', 'user_id', 'user_name', 'details', 'target_user_id', 'target_user_name', 'created_at'),
+    default=('action', 'user_name', 'target_user_name', 'created_at'),
+)
@@ -0,0 +1,127 @@
+"""
+Декларативная проверка запросов облачной функции
+Схема - список правил; правила компилируются один раз при импорте в кортеж
+замыканий (регулярки и множества допустимых значений готовы заранее), поэтому
+некорректный запрос отклоняется до открытия соединения с БД.
+"""
+import re
+import uuid
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+Check = Callable[[Mapping[str, Any]], Optional[str]]
+
+_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+def _is_uuid(value: Any) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except (ValueError, AttributeError, TypeError):
+        return False
+
+
+def required(*names: str, error: str) -> Check:
+    """All fields must be present and non-empty"""
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        for name in names:
+            if not data.get(name):
+                return error
+        return None
+    return check
+
+
+def uuid_field(name: str, error: str, optional: bool = False) -> Check:
+    """UUID string; optional fields may be missing or empty"""
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        value = data.get(name)
+        if optional and not value:
+            return None
+        return None if _is_uuid(value) else error
+    return check
+
+
+def integer(name: str, error: str, min_value: Optional[int] = None, max_value: Optional[int] = None,
+            optional: bool = False) -> Check:
+    """JSON integer within [min_value, max_value]"""
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        if optional and name not in data:
+            return None
+        value = data.get(name)
+        if not isinstance(value, int):
+            return error
+        if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+            return error
+        return None
+    return check
+
+
+def email(name: str, error: str, max_length: int = 255) -> Check:
+    """Email format after the same trimming the handlers apply"""
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        value = str(data.get(name) or '')[:max_length].strip()
+        return None if _EMAIL.match(value) else error
+    return check
+
+
+def min_length(name: str, length: int, error: str, optional: bool = False) -> Check:
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        if optional and name not in data:
+            return None
+        return error if len(str(data.get(name) or '')) < length else None
+    return check
+
+
+def max_length(name: str, length: int, error: str, optional: bool = False) -> Check:
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        if optional and name not in data:
+            return None
+        return error if len(str(data.get(name) or '')) > length else None
+    return check
+
+
+def one_of(name: str, choices: Iterable[str], error: str, optional: bool = False) -> Check:
+    allowed = frozenset(choices)
+
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        if optional and name not in data:
+            return None
+        return None if data.get(name) in allowed else error
+    return check
+
+
+def boolean(name: str, error: str, optional: bool = False) -> Check:
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        if optional and name not in data:
+            return None
+        return None if isinstance(data.get(name), bool) else error
+    return check
+
+
+def array(name: str, error: str, optional: bool = False) -> Check:
+    def check(data: Mapping[str, Any]) -> Optional[str]:
+        if optional and name not in data:
+            return None
+        return None if isinstance(data.get(name), list) else error
+    return check
+
+
+class Schema:
+    """Compiled rule list for one (resource, method[, action])"""
+
+    __slots__ = ('source', 'checks')
+
+    def __init__(self, source: str, *checks: Check):
+        if source not in ('body', 'query'):
+            raise ValueError(f'unknown schema source: {source}')
+        self.source = source
+        self.checks = checks
+
+    def validate(self, query: Mapping[str, Any], body: Mapping[str, Any]) -> Optional[str]:
+        """Return the first error message, or None when the request is valid"""
+        data = body if self.source == 'body' else query
+        for check in self.checks:
+            error = check(data)
+            if error is not None:
+                return error
+        return None
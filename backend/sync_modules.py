@@ -0,0 +1,65 @@
+"""
+Общие модули облачной функции
+Облачная функция (backend/api) загружается отдельной папкой и не видит модулей
+корня, поэтому общие с Flask/ASGI-приложениями модули лежат в ней копиями.
+Источник - модули корня: правьте их и копируйте этим скриптом; --check ничего
+не меняет и завершается с кодом 1, если копия отличается или отсутствует
+(запускайте перед деплоем функции и в CI).
+
+Запуск:
+    python backend/sync_modules.py            # скопировать изменённые модули в backend/api
+    python backend/sync_modules.py --check    # только проверить
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BACKEND_DIR)
+FUNCTION_DIR = os.path.join(BACKEND_DIR, 'api')
+
+SHARED_MODULES = (
+    'authz.py',
+    'cold_start.py',
+    'duty_calendar.py',
+    'http_cache.py',
+    'instrumentation.py',
+    'permissions.py',
+    'serialization.py',
+    'shift_rules.py',
+    'tenancy.py',
+)
+
+
+def stale_modules() -> List[str]:
+    """Shared modules whose copy in backend/api is missing or differs from the root one"""
+    stale = []
+    for name in SHARED_MODULES:
+        copy = os.path.join(FUNCTION_DIR, name)
+        if not os.path.exists(copy) or not filecmp.cmp(os.path.join(ROOT, name), copy, shallow=False):
+            stale.append(name)
+    return stale
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='report stale copies and exit 1 instead of copying')
+    args = parser.parse_args()
+
+    stale = stale_modules()
+    if args.check:
+        for name in stale:
+            print(f'backend/api/{name} differs from {name}; run python backend/sync_modules.py')
+        if stale:
+            sys.exit(1)
+        return
+    for name in stale:
+        shutil.copyfile(os.path.join(ROOT, name), os.path.join(FUNCTION_DIR, name))
+        print(f'copied {name} -> backend/api/{name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Flask (gunicorn) против app_async (uvicorn) на одном ядре
+Оба сервера запускаются этим же скриптом (--serve) и привязываются к одному CPU,
+нагрузка идёт из основного процесса асинхронным HTTP/1.1-клиентом с keep-alive
+на остальных ядрах. Сценарии - общие для flask и asgi из scenarios.json/tests.json.
+На каждый уровень конкурентности выводятся rps и p50/p95/p99 обоих серверов.
+
+Нужны gunicorn и uvicorn (requirements.txt + requirements_async.txt), для
+Postgres - отдельная база под замеры:
+    python benchmarks/bench_async.py --db postgresql://localhost/dormitory_bench --concurrency 16,64,256
+    python benchmarks/bench_async.py --mysql --concurrency 64,256      # app_mysql.py против DB_BACKEND=mysql
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+# Без SECRET_KEY замер идёт без авторизации - authz.py требует сказать это явно
+if not os.environ.get('SECRET_KEY'):
+    os.environ.setdefault('AUTHZ_MODE', 'off')
+sys.path.insert(0, BENCH_DIR)
+
+from loadtest import DEFAULT_SCENARIOS, Result, Scenario, fill_placeholders, load_scenarios, seed_context  # noqa: E402
+
+FLASK_RESOURCES = ('users', 'announcements', 'tasks', 'duty-schedule')
+
+
+# ============= SERVERS =============
+
+def serve(kind: str, port: int, db: str, threads: int) -> None:
+    """Server bootstrap (runs in the child process): stand-in first, then gunicorn/uvicorn"""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    if db.startswith('sqlite:///'):
+        import sqlite_standin
+        sqlite_standin.install(db[len('sqlite:///'):])
+    if kind == 'asgi':
+        import uvicorn
+        uvicorn.run('app_async:app', host='127.0.0.1', port=port, workers=1, log_level='warning',
+                    access_log=False)
+    else:
+        from gunicorn.app.wsgiapp import run
+        sys.argv = ['gunicorn', f'{kind}:app', '--bind', f'127.0.0.1:{port}', '--workers', '1',
+                    '--worker-class', 'gthread', '--threads', str(threads), '--log-level', 'warning']
+        run()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, db: str, cpu: int, threads: int, env: Dict[str, str]) -> Tuple[subprocess.Popen, int]:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, __file__, '--serve', kind, '--port', str(port), '--db', db, '--threads', str(threads)],
+        env=dict(os.environ, **env),
+        preexec_fn=lambda: os.sched_setaffinity(0, {cpu}),
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} server exited with code {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start on port {port}')
+
+
+# ============= CLIENT =============
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+def build_request(scenario: Scenario, context: Dict[str, str], port: int) -> bytes:
+    parts = urlsplit(fill_placeholders(scenario.path, context))
+    params = [(k, v) for k, v in parse_qsl(parts.query) if k != 'resource']
+    target = f'/api/{scenario.resource}' + (f'?{urlencode(params)}' if params else '')
+    body = fill_placeholders(json.dumps(scenario.body), context).encode() if scenario.body is not None else b''
+    head = (f'{scenario.method} {target} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+    return head.encode() + body
+
+
+async def run_level(port: int, payload: bytes, scenario: Scenario, concurrency: int, requests: int) -> Result:
+    result = Result(scenario.name, concurrency)
+    remaining = [requests]
+
+    async def connection() -> None:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                start = time.perf_counter()
+                try:
+                    writer.write(payload)
+                    status = await read_response(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                    status = 599
+                result.latencies.append(time.perf_counter() - start)
+                result.statuses[str(status)] = result.statuses.get(str(status), 0) + 1
+                if status != scenario.expected_status:
+                    result.errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    result.wall = time.perf_counter() - start
+    return result
+
+
+# ============= MAIN =============
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:////tmp/dormitory-bench.db',
+                        help='postgresql://... (real database) or sqlite:///path (stand-in, smoke runs only)')
+    parser.add_argument('--mysql', action='store_true', help='compare app_mysql.py with app_async on DB_BACKEND=mysql')
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--scenarios', nargs='*', default=list(DEFAULT_SCENARIOS))
+    parser.add_argument('--only', help='run scenarios whose name contains this text')
+    parser.add_argument('--concurrency', default='16,64,256')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario per concurrency level')
+    parser.add_argument('--cpu', type=int, default=0, help='core the servers are pinned to')
+    parser.add_argument('--threads', type=int, default=32, help='gunicorn gthread threads for Flask')
+    parser.add_argument('--pool-size', type=int, default=10, help='DB_POOL_SIZE for both servers')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port, args.db, args.threads)
+
+    if args.db.startswith('sqlite:///'):
+        import sqlite_standin
+        sqlite_standin.install(args.db[len('sqlite:///'):])
+    if not args.no_seed:
+        import seed
+        seed.seed(args.db, reset=True)
+    context = seed_context(args.db)
+
+    flask_kind, flask_target = ('app_mysql', 'flask-mysql') if args.mysql else ('app', 'flask')
+    env = {'DB_POOL_SIZE': str(args.pool_size)}
+    if args.mysql or args.db.startswith('sqlite:///'):
+        env['DB_BACKEND'] = 'mysql'
+    else:
+        env['DATABASE_URL'] = args.db
+    # Генератор нагрузки не должен делить ядро с сервером
+    others = os.sched_getaffinity(0) - {args.cpu}
+    if others:
+        os.sched_setaffinity(0, others)
+
+    scenarios = [s for s in load_scenarios(args.scenarios)
+                 if flask_target in s.targets and 'asgi' in s.targets and s.resource in FLASK_RESOURCES
+                 and (not args.only or args.only in s.name)]
+    levels = [int(c) for c in args.concurrency.split(',')]
+    results: List[Dict[str, Any]] = []
+
+    for kind, label in ((flask_kind, 'flask'), ('asgi', 'asgi')):
+        process, port = start_server(kind, args.db, args.cpu, args.threads, env)
+        try:
+            for scenario in scenarios:
+                payload = build_request(scenario, context, port)
+                asyncio.run(run_level(port, payload, scenario, 4, 20))  # прогрев
+                for level in levels:
+                    result = asyncio.run(run_level(port, payload, scenario, level, args.requests)).to_dict()
+                    result['server'] = label
+                    results.append(result)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    by_key: Dict[Tuple[str, int], Dict[str, Dict[str, Any]]] = {}
+    for result in results:
+        by_key.setdefault((result['endpoint'], result['concurrency']), {})[result['server']] = result
+    print(f"{'scenario':<32} {'c':>4}  {'flask rps':>10} {'p99 ms':>8}  {'asgi rps':>10} {'p99 ms':>8}  {'speedup':>7}")
+    for (endpoint, level), pair in by_key.items():
+        flask, asgi = pair.get('flask'), pair.get('asgi')
+        if not flask or not asgi:
+            continue
+        speedup = asgi['throughput_rps'] / flask['throughput_rps'] if flask['throughput_rps'] else 0.0
+        print(f"{endpoint[:32]:<32} {level:>4}  {flask['throughput_rps']:>10.1f} {flask['latency_ms']['p99']:>8.2f}  "
+              f"{asgi['throughput_rps']:>10.1f} {asgi['latency_ms']['p99']:>8.2f}  {speedup:>6.2f}x")
+
+    if args.output:
+        report = {'meta': {'db': 'sqlite' if args.db.startswith('sqlite:///') else 'postgres', 'mysql': args.mysql,
+                           'cpu': args.cpu, 'threads': args.threads, 'pool_size': args.pool_size,
+                           'requests_per_level': args.requests, 'concurrency': levels},
+                  'results': results}
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
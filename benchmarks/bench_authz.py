@@ -0,0 +1,92 @@
+"""
+Микробенчмарк авторизации (authz.py)
+Стоимость решения на запрос для типичных путей политики:
+  hot read    - GET users: только токен, уже проверенный раньше;
+  owner read  - GET work-shifts?userId=<свой>: токен и сравнение id;
+  capability  - DELETE logs администратором: права из permission_cache;
+  cold token  - первая встреча токена: HMAC и разбор JSON;
+  db resolve  - права из БД на каждый запрос, как без кэша (SQLite stand-in в
+                том же процессе; у настоящей БД добавится сетевой круг).
+На первых трёх путях load() не должен вызываться ни разу - это проверяется.
+Код выхода 1, если горячее чтение дороже --budget-us или путь без БД сходил в БД.
+
+Запуск: python benchmarks/bench_authz.py [--iterations 100000] [--budget-us 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+os.environ.setdefault('SECRET_KEY', 'bench-secret')
+os.environ['AUTHZ_MODE'] = 'enforce'
+
+import sqlite_standin  # noqa: E402
+from authz import TokenCache, authorize, issue_token, verify_token  # noqa: E402
+from permissions import PermissionCache, resolve  # noqa: E402
+from seed import Dormitory, seed_sqlite  # noqa: E402
+
+
+def per_call_us(fn, iterations: int) -> float:
+    begin = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - begin) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--budget-us', type=float, default=5.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'authz.db')
+    dormitory = Dormitory()
+    seed_sqlite(path, dormitory)
+    conn = sqlite_standin.connect()
+    cur = conn.cursor()
+
+    admin = next(u for u in dormitory.users if u['role'] == 'admin')
+    member = dormitory.residents()[0]
+    admin_headers = {'authorization': f"Bearer {issue_token(admin['id'])}"}
+    member_headers = {'authorization': f"Bearer {issue_token(member['id'])}"}
+    loads = []
+
+    def load(claims):
+        loads.append(claims.user_id)
+        return resolve(cur, claims.user_id, claims.tenant)
+
+    # Прогрев: токены проверены, права администратора в кэше
+    authorize('logs', 'DELETE', admin_headers, 'default', {}, load)
+    authorize('users', 'GET', member_headers, 'default', {}, load)
+    warm_loads = len(loads)
+
+    owner = {'userId': member['id']}
+    cases = [
+        ('hot read', lambda: authorize('users', 'GET', member_headers, 'default', {}, load)),
+        ('owner read', lambda: authorize('work-shifts', 'GET', member_headers, 'default', owner, load)),
+        ('capability', lambda: authorize('logs', 'DELETE', admin_headers, 'default', {}, load)),
+    ]
+    timings = {name: per_call_us(fn, args.iterations) for name, fn in cases}
+    cached_loads = len(loads) - warm_loads
+
+    token = member_headers['authorization'][7:]
+    timings['cold token'] = per_call_us(lambda: TokenCache().claims(token, time.time()), args.iterations // 10)
+    uncached = PermissionCache(max_size=0)
+    timings['db resolve'] = per_call_us(lambda: resolve(cur, admin['id'], cache=uncached), args.iterations // 100)
+    assert verify_token(token).user_id == member['id']
+
+    for name, value in timings.items():
+        print(f'{name:<12} {value:8.2f} us/request')
+    print(f"db lookups on cached paths: {cached_loads} (budget hot read {args.budget_us:.0f} us)")
+    conn.close()
+    if cached_loads or timings['hot read'] > args.budget_us:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Холодный старт облачных функций
+Каждый прогон - новый процесс интерпретатора, как новый экземпляр функции:
+  import      - import index целиком (зависимости и тело модуля);
+  warmup      - событие прогрева на холодном экземпляре: импорт драйвера,
+                первое соединение, SELECT 1 (SQLite stand-in, без сети);
+  warm        - повторный прогрев: соединение берётся отложенное, не новое.
+Драйвер БД не должен импортироваться вместе с модулем - это проверяется, а
+соединение повторного прогрева должно быть переиспользовано. Для одного
+прогона печатаются самые дорогие модули из python -X importtime.
+Код выхода 1, если лучший импорт дольше --budget-ms, драйвер импортирован
+вместе с модулем или тёплый вызов открыл новое соединение.
+
+Запуск: python benchmarks/bench_cold_start.py [--repeat 10] [--budget-ms 60] [--top 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from seed import Dormitory, seed_sqlite  # noqa: E402
+
+TARGETS = {
+    'function': os.path.join(ROOT, 'backend', 'api'),  # backend/api/index.py
+    'vercel': ROOT,  # api/index.py + модули корня
+}
+
+# Выполняется в дочернем процессе: argv = каталог модулей, каталог index.py, путь к БД
+PROBE = '''
+import json, sys, time
+modules, function_dir, bench_dir, db = sys.argv[1:5]
+sys.path[:0] = [function_dir, modules]
+started = time.perf_counter()
+import index
+result = {'import': (time.perf_counter() - started) * 1000, 'driver_imported': 'psycopg2' in sys.modules}
+sys.path.insert(0, bench_dir)
+import sqlite_standin
+sqlite_standin.install(db)
+from cold_start import FUNCTION_CONNECTIONS
+
+def warmup():
+    return index.handler({'warmup': True}, None) if hasattr(index, 'LazyConnection') else index.warmup()
+
+for phase in ('warmup', 'warm'):
+    started = time.perf_counter()
+    response = warmup()
+    result[phase] = (time.perf_counter() - started) * 1000
+    result[phase + '_status'] = response['statusCode']
+result['opened'] = FUNCTION_CONNECTIONS.value('opened')
+result['startup'] = index.startup.as_dict()
+print(json.dumps(result))
+'''
+
+
+def probe_args(target: str, db: str):
+    modules = TARGETS[target]
+    function_dir = modules if target == 'function' else os.path.join(ROOT, 'api')
+    return [modules, function_dir, BENCH_DIR, db]
+
+
+def clean_env():
+    env = dict(os.environ)
+    # Авторизация и профилировщик не участвуют в прогреве
+    for name in ('SECRET_KEY', 'PYTHONPROFILEIMPORTTIME'):
+        env.pop(name, None)
+    env['AUTHZ_MODE'] = 'off'
+    env['LOG_LEVEL'] = 'WARNING'
+    return env
+
+
+def run_probe(target: str, db: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', PROBE, *probe_args(target, db)], env=clean_env(),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_profile(target: str, db: str, top: int):
+    """Most expensive modules of import index by self time (us), from python -X importtime"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE, *probe_args(target, db)],
+                            env=clean_env(), capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        entries.append((int(self_us), int(cumulative_us), name))
+        if name == 'index':  # дальше - stand-in и прогрев, не импорт функции
+            break
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=('function', 'vercel', 'all'), default='all')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=60.0)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), 'cold_start.db')
+    seed_sqlite(db, Dormitory())
+
+    failed = False
+    targets = TARGETS if args.target == 'all' else (args.target,)
+    for target in targets:
+        # Первый прогон пишет байткод в __pycache__; как и на платформе, меряем со скомпилированным
+        run_probe(target, db)
+        runs = [run_probe(target, db) for _ in range(args.repeat)]
+        imports = [run['import'] for run in runs]
+        print(f'{target}: import best {min(imports):.1f} ms, median {statistics.median(imports):.1f} ms; '
+              f"warmup {statistics.median(run['warmup'] for run in runs):.1f} ms, "
+              f"warm {statistics.median(run['warm'] for run in runs):.2f} ms")
+        print(f"  startup profile: {runs[-1]['startup']}")
+        for self_us, cumulative_us, name in import_profile(target, db, args.top):
+            print(f'  {self_us / 1000:7.2f} ms self {cumulative_us / 1000:7.2f} ms total  {name}')
+
+        problems = []
+        if min(imports) > args.budget_ms:
+            problems.append(f'import over budget {args.budget_ms:.0f} ms')
+        if any(run['driver_imported'] for run in runs):
+            problems.append('psycopg2 imported with the module')
+        if any(run['opened'] != 1 or run['warmup_status'] != 200 or run['warm_status'] != 200 for run in runs):
+            problems.append('warm invocation did not reuse the connection')
+        for problem in problems:
+            print(f'  FAIL: {problem}')
+        failed = failed or bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
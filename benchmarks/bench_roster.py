@@ -0,0 +1,84 @@
+"""
+Микробенчмарк генератора графика дежурств
+Всё общежитие из seed.py (этажи 2–5, ~200 жильцов), пять зон, семестр
+без воскресений и праздников. Замеряется generate_roster + подготовка строк
+для пакетной вставки, затем проверяется результат: никто не дежурит дважды
+в день и чаще раза в min_gap дней, разброс нагрузки не больше одного дежурства.
+Код выхода 1, если лучший прогон дольше --budget-ms или проверка не прошла.
+
+Запуск: python benchmarks/bench_roster.py [--per-zone 2] [--repeat 5] [--budget-ms 1000]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from duty_roster import RosterSpec, generate_roster, roster_rows, roster_summary  # noqa: E402
+from seed import ZONES, Dormitory  # noqa: E402
+
+HOLIDAYS = (date(2026, 2, 23), date(2026, 3, 9), date(2026, 5, 1), date(2026, 5, 11), date(2026, 6, 12))
+
+
+def check(roster, residents, min_gap: int) -> list:
+    """Return a list of rule violations"""
+    problems = []
+    by_user = {}
+    for user_id, day, _ in roster:
+        by_user.setdefault(user_id, []).append(day)
+    for user_id, days in by_user.items():
+        days.sort()
+        for previous, current in zip(days, days[1:]):
+            if (current - previous).days < min_gap:
+                problems.append(f'{user_id}: {previous} and {current}')
+                break
+    loads = Counter(user_id for user_id, _, _ in roster)
+    spread = max(loads[r] for r in residents) - min(loads[r] for r in residents)
+    if spread > 1:
+        problems.append(f'load spread {spread}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', default='2026-02-09')
+    parser.add_argument('--days', type=int, default=140)
+    parser.add_argument('--per-zone', type=int, default=2)
+    parser.add_argument('--min-gap', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1000.0)
+    args = parser.parse_args()
+
+    dormitory = Dormitory()
+    residents = [u['id'] for u in dormitory.build_users() if u['room']]
+    start = date.fromisoformat(args.start)
+    spec = RosterSpec(start, start + timedelta(days=args.days - 1), list(ZONES), skip_dates=HOLIDAYS,
+                      skip_weekdays=(6,), per_zone=args.per_zone, min_gap=args.min_gap)
+
+    timings = []
+    for _ in range(args.repeat):
+        begin = time.perf_counter()
+        roster = generate_roster(residents, spec.zones, spec.working_days(), spec.per_zone, spec.min_gap)
+        rows = roster_rows(roster)
+        timings.append(time.perf_counter() - begin)
+
+    best = min(timings) * 1000
+    summary = roster_summary(roster, residents)
+    problems = check(roster, residents, args.min_gap)
+    print(f"residents={summary['residents']} zones={len(spec.zones)} days={len(spec.working_days())} "
+          f"rows={len(rows)} load={summary['minLoad']}..{summary['maxLoad']}")
+    print(f'best {best:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms '
+          f'(budget {args.budget_ms:.0f} ms)')
+    for problem in problems[:10]:
+        print(f'violation: {problem}')
+    if problems or best > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
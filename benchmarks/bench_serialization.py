@@ -0,0 +1,112 @@
+"""
+Микробенчмарк сериализации: 10k строк work_shifts
+Сравнивает старый путь (convert_dict_keys_to_camel + json.dumps(default=str))
+с модулем serialization (stdlib и orjson)
+
+Запуск: python benchmarks/bench_serialization.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization  # noqa: E402
+
+COLUMNS = (
+    'id', 'user_id', 'user_name', 'days', 'completed_days', 'assigned_by',
+    'assigned_by_name', 'completed_by', 'completed_by_name', 'reason',
+    'assigned_at', 'completed_at', 'is_archived', 'archived_at', 'penalty_rate',
+)
+
+
+class FakeCursor:
+    """Cursor stand-in exposing only description"""
+
+    def __init__(self, columns):
+        self.description = tuple((name, None, None, None, None, None, None) for name in columns)
+
+
+def make_rows(count: int) -> List[Dict[str, Any]]:
+    base = datetime(2024, 9, 1, 8, 30)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'id': i,
+            'user_id': str(uuid.uuid4()),
+            'user_name': f'Студент {i}',
+            'days': i % 5 + 1,
+            'completed_days': i % 3,
+            'assigned_by': uuid.uuid4(),
+            'assigned_by_name': 'Комендант',
+            'completed_by': None,
+            'completed_by_name': None,
+            'reason': 'Оценка 2 за уборку комнаты',
+            'assigned_at': base + timedelta(minutes=i),
+            'completed_at': None,
+            'is_archived': False,
+            'archived_at': None,
+            'penalty_rate': Decimal('1.50'),
+        })
+    return rows
+
+
+def legacy_snake_to_camel(snake_str: str) -> str:
+    components = snake_str.split('_')
+    return components[0] + ''.join(x.title() for x in components[1:])
+
+
+def legacy_convert(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {legacy_snake_to_camel(key): value for key, value in data.items()}
+
+
+def run_legacy(cur, rows) -> str:
+    return json.dumps({'workShifts': [legacy_convert(dict(r)) for r in rows]}, default=str)
+
+
+def run_stdlib(cur, rows) -> str:
+    return serialization._dumps_json({'workShifts': serialization.rows_to_camel(cur, rows)})
+
+
+def run_fast(cur, rows) -> str:
+    return serialization.dumps({'workShifts': serialization.rows_to_camel(cur, rows)})
+
+
+def measure(fn, cur, rows, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(cur, rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    cur = FakeCursor(COLUMNS)
+
+    cases = [('legacy', run_legacy), ('stdlib', run_stdlib)]
+    if serialization.orjson is not None:
+        cases.append(('orjson', run_fast))
+
+    baseline = None
+    print(f'rows={args.rows} repeat={args.repeat} backend={serialization.JSON_BACKEND}')
+    for name, fn in cases:
+        elapsed = measure(fn, cur, rows, args.repeat)
+        baseline = baseline or elapsed
+        print(f'{name:>8}: {elapsed * 1000:8.2f} ms  x{baseline / elapsed:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Микробенчмарк автоматического назначения отработок
+Всё общежитие из seed.py (80 комнат, ~200 жильцов) и ежедневные оценки
+за семестр без воскресений - около 10 тысяч строк. Замеряется
+evaluate + plan_shifts + строки уведомлений, то есть всё, что обработчик
+делает между чтением оценок и пакетной вставкой. Результат сверяется с
+наивным подсчётом (каждое правило заново перебирает оценки своего окна).
+Код выхода 1, если лучший прогон дольше --budget-ms или результаты разошлись.
+
+Запуск: python benchmarks/bench_shift_rules.py [--rules 2x2/week=1,3x2/week=2] [--repeat 5] [--budget-ms 100]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from seed import Dormitory  # noqa: E402
+from shift_rules import DEFAULT_RULES, evaluate, notification_rows, parse_rules, plan_shifts, window_start  # noqa: E402
+
+
+def naive(scores, rules) -> dict:
+    """(room, period, window) -> days, straight from the rule definitions"""
+    windows = {}
+    for room, day, score in scores:
+        for period in {rule.period for rule in rules}:
+            windows.setdefault((room, period, window_start(period, day)), []).append(score)
+    result = {}
+    for key, values in windows.items():
+        fired = [rule.days for rule in rules
+                 if rule.period == key[1] and sum(1 for s in values if s <= rule.score) >= rule.count]
+        if fired:
+            result[key] = max(fired)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', default='2026-02-09')
+    parser.add_argument('--days', type=int, default=140)
+    parser.add_argument('--rules', default=DEFAULT_RULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    dormitory = Dormitory()
+    dormitory.build_users()
+    residents = dormitory.residents()
+    rules = parse_rules(args.rules)
+    scores = [(room, day, score) for room, day, score, _ in
+              dormitory.cleanliness_scores(date.fromisoformat(args.start), args.days)]
+    # Обработчик читает только оценки не выше старшего порога
+    low = [row for row in scores if row[2] <= max(rule.score for rule in rules)]
+
+    timings = []
+    for _ in range(args.repeat):
+        begin = time.perf_counter()
+        hits = evaluate(low, rules)
+        rows, _ = plan_shifts(hits, residents)
+        notifications = notification_rows(rows)
+        timings.append(time.perf_counter() - begin)
+
+    expected = naive(scores, rules)
+    actual = {(hit.room, hit.rule.period, hit.start): hit.rule.days for hit in hits}
+    mismatches = sorted(set(expected.items()) ^ set(actual.items()))
+
+    best = min(timings) * 1000
+    print(f"rooms={len({r['room'] for r in residents})} residents={len(residents)} scores={len(scores)} "
+          f"low={len(low)} rules={','.join(rule.key for rule in rules)}")
+    print(f'windows={len(hits)} shifts={len(rows)} days={sum(row[2] for row in rows)} '
+          f'notifications={len(notifications)}')
+    print(f'best {best:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms '
+          f'(budget {args.budget_ms:.0f} ms)')
+    for mismatch in mismatches[:10]:
+        print(f'mismatch: {mismatch}')
+    if mismatches or best > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
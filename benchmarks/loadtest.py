@@ -0,0 +1,393 @@
+"""
+Нагрузочный тест API в одном процессе
+Сценарии берутся из backend/api/tests.json (+ benchmarks/scenarios.json),
+запросы идут напрямую в handler() облачной функции, во Flask-приложение
+(test_client) или в ASGI-приложение app_async поверх Postgres или SQLite-заглушки. На каждый уровень
+конкурентности считаются пропускная способность и p50/p95/p99 по эндпоинтам,
+отчёт пишется в JSON и может сравниваться с базовым для поиска регрессий.
+
+Запуск:
+    python benchmarks/loadtest.py --target handler --concurrency 1,8,32 --output report.json
+    python benchmarks/loadtest.py --target flask --db postgresql://localhost/dormitory_bench
+    python benchmarks/loadtest.py --target handler --baseline report.json --max-regression 0.2
+    python benchmarks/loadtest.py --target asgi --concurrency 1,8,32
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+# Без SECRET_KEY замер идёт без авторизации - authz.py требует сказать это явно
+if not os.environ.get('SECRET_KEY'):
+    os.environ.setdefault('AUTHZ_MODE', 'off')
+FUNCTION_DIR = os.path.join(ROOT, 'backend', 'api')
+DEFAULT_SCENARIOS = (os.path.join(FUNCTION_DIR, 'tests.json'), os.path.join(BENCH_DIR, 'scenarios.json'))
+
+sys.path.insert(0, BENCH_DIR)
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    expected_status: int
+    body: Optional[Dict[str, Any]] = None
+    targets: Tuple[str, ...] = ('handler', 'flask', 'flask-mysql', 'asgi')
+
+    @property
+    def resource(self) -> str:
+        return dict(parse_qsl(urlsplit(self.path).query)).get('resource', '')
+
+
+@dataclass
+class Result:
+    endpoint: str
+    concurrency: int
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    wall: float = 0.0
+
+    @staticmethod
+    def percentile(values: List[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[rank]
+
+    def to_dict(self) -> Dict[str, Any]:
+        ms = [v * 1000 for v in self.latencies]
+        return {
+            'endpoint': self.endpoint,
+            'concurrency': self.concurrency,
+            'requests': len(ms),
+            'errors': self.errors,
+            'statuses': self.statuses,
+            'throughput_rps': round(len(ms) / self.wall, 2) if self.wall else 0.0,
+            'latency_ms': {
+                'p50': round(self.percentile(ms, 50), 3),
+                'p95': round(self.percentile(ms, 95), 3),
+                'p99': round(self.percentile(ms, 99), 3),
+                'mean': round(sum(ms) / len(ms), 3) if ms else 0.0,
+                'max': round(max(ms), 3) if ms else 0.0,
+            },
+        }
+
+
+def load_scenarios(paths) -> List[Scenario]:
+    scenarios = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as fh:
+            data = json.load(fh)
+        for test in data.get('tests', []):
+            scenarios.append(Scenario(
+                name=test['name'], method=test.get('method', 'GET'), path=test['path'],
+                expected_status=test.get('expectedStatus', 200), body=test.get('body'),
+                targets=tuple(test.get('targets', Scenario.targets)),
+            ))
+    return scenarios
+
+
+def fill_placeholders(text: str, context: Dict[str, str]) -> str:
+    for key, value in context.items():
+        text = text.replace('{' + key + '}', value)
+    return text
+
+
+# ============= TARGETS =============
+
+def auth_headers(context: Dict[str, str]) -> Dict[str, str]:
+    return {'Authorization': f"Bearer {context['token']}"} if context.get('token') else {}
+
+
+def _load_module(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _quiet(module) -> None:
+    # Лимит запросов на IP мешает нагрузочному тесту, логи на каждый запрос тоже
+    module.RATE_LIMIT_REQUESTS = 10 ** 9
+    for name in ('dormitory.api', 'dormitory.instrumentation'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def handler_target() -> Callable[[Scenario, Dict[str, str]], int]:
+    """Call the cloud-function handler() with a synthetic event"""
+    sys.path.insert(0, FUNCTION_DIR)
+    module = _load_module('cloud_function', os.path.join(FUNCTION_DIR, 'index.py'))
+    _quiet(module)
+
+    def call(scenario: Scenario, context: Dict[str, str]) -> int:
+        parts = urlsplit(fill_placeholders(scenario.path, context))
+        body = fill_placeholders(json.dumps(scenario.body), context) if scenario.body is not None else None
+        event = {
+            'httpMethod': scenario.method,
+            'queryStringParameters': dict(parse_qsl(parts.query)),
+            'headers': {'Content-Type': 'application/json', **auth_headers(context)},
+            'body': body,
+            'requestContext': {'identity': {'sourceIp': '127.0.0.1'}},
+        }
+        if body is None:
+            event.pop('body')
+        return module.handler(event, None)['statusCode']
+
+    call.module = module
+    return call
+
+
+def flask_target(filename: str) -> Callable[[Scenario, Dict[str, str]], int]:
+    """Call a Flask app through its test client; handler paths map to /api/<resource>"""
+    sys.path.insert(0, ROOT)
+    module = _load_module(os.path.splitext(filename)[0], os.path.join(ROOT, filename))
+    _quiet(module)
+    local = threading.local()
+
+    def call(scenario: Scenario, context: Dict[str, str]) -> int:
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = module.app.test_client()
+        parts = urlsplit(fill_placeholders(scenario.path, context))
+        params = [(k, v) for k, v in parse_qsl(parts.query) if k != 'resource']
+        url = f'/api/{scenario.resource}' + (f'?{urlencode(params)}' if params else '')
+        body = json.loads(fill_placeholders(json.dumps(scenario.body), context)) if scenario.body is not None else None
+        response = client.open(url, method=scenario.method, json=body, headers=auth_headers(context))
+        return response.status_code
+
+    def supports(scenario: Scenario) -> bool:
+        adapter = module.app.url_map.bind('localhost')
+        return adapter.test(f'/api/{scenario.resource}', method=scenario.method)
+
+    call.module = module
+    call.supports = supports
+    return call
+
+
+def asgi_target() -> Callable[[Scenario, Dict[str, str]], int]:
+    """Call app_async.app on an event loop thread; handler paths map to /api/<resource>"""
+    sys.path.insert(0, ROOT)
+    module = _load_module('app_async', os.path.join(ROOT, 'app_async.py'))
+    _quiet(module)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='asgi-loop', daemon=True).start()
+
+    async def request(scope: Dict[str, Any], body: bytes) -> int:
+        status = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await module.app(scope, receive, send)
+        return status[0]
+
+    def call(scenario: Scenario, context: Dict[str, str]) -> int:
+        parts = urlsplit(fill_placeholders(scenario.path, context))
+        params = [(k, v) for k, v in parse_qsl(parts.query) if k != 'resource']
+        body = fill_placeholders(json.dumps(scenario.body), context).encode() if scenario.body is not None else b''
+        scope = {
+            'type': 'http', 'method': scenario.method, 'path': f'/api/{scenario.resource}',
+            'query_string': urlencode(params).encode(), 'client': ('127.0.0.1', 0),
+            'headers': [(b'content-type', b'application/json')] + [
+                (name.lower().encode(), value.encode()) for name, value in auth_headers(context).items()],
+        }
+        return asyncio.run_coroutine_threadsafe(request(scope, body), loop).result()
+
+    def supports(scenario: Scenario) -> bool:
+        entry = module.ROUTES.get(f'/api/{scenario.resource}')
+        return entry is not None and (scenario.method == 'OPTIONS' or scenario.method in entry[1])
+
+    call.module = module
+    call.supports = supports
+    return call
+
+
+# ============= RUNNER =============
+
+def seed_context(db: str) -> Dict[str, str]:
+    """Ids of real seeded rows for {placeholders} in scenario paths and bodies"""
+    if db.startswith('sqlite:///'):
+        import sqlite_standin
+        conn = sqlite_standin.raw_connection()
+        user_id = conn.execute("SELECT id FROM users WHERE room IS NOT NULL ORDER BY id LIMIT 1").fetchone()[0]
+        admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin' LIMIT 1").fetchone()[0]
+        conn.close()
+    else:
+        import psycopg2
+        conn = psycopg2.connect(db)
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE room IS NOT NULL ORDER BY id LIMIT 1")
+        user_id = cur.fetchone()[0]
+        cur.execute("SELECT id FROM users WHERE role IN ('admin', 'manager') LIMIT 1")
+        admin_id = cur.fetchone()[0]
+        conn.close()
+    context = {'userId': user_id, 'adminId': admin_id}
+    # С SECRET_KEY приложения проверяют права (authz.py): запросы идут от администратора
+    if os.environ.get('SECRET_KEY'):
+        sys.path.insert(0, ROOT)
+        from authz import issue_token
+        context['token'] = issue_token(admin_id)
+    return context
+
+
+def run_level(call, scenario: Scenario, context: Dict[str, str], concurrency: int, requests: int) -> Result:
+    result = Result(scenario.name, concurrency)
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count: int) -> None:
+        local_latencies, local_statuses, local_errors = [], {}, 0
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                status = call(scenario, context)
+            except Exception:
+                status = 599
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[str(status)] = local_statuses.get(str(status), 0) + 1
+            if status != scenario.expected_status:
+                local_errors += 1
+        with lock:
+            result.latencies.extend(local_latencies)
+            result.errors += local_errors
+            for key, value in local_statuses.items():
+                result.statuses[key] = result.statuses.get(key, 0) + value
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [c for c in per_worker if c]))
+    result.wall = time.perf_counter() - start
+    return result
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Return human-readable regressions of p95 latency or throughput against a baseline report"""
+    previous = {(r['endpoint'], r['concurrency']): r for r in baseline.get('results', [])}
+    regressions = []
+    for current in report['results']:
+        old = previous.get((current['endpoint'], current['concurrency']))
+        if not old:
+            continue
+        old_p95, new_p95 = old['latency_ms']['p95'], current['latency_ms']['p95']
+        if old_p95 and new_p95 > old_p95 * (1 + max_regression):
+            regressions.append(f"{current['endpoint']} c={current['concurrency']}: p95 {old_p95:.2f} -> {new_p95:.2f} ms")
+        old_rps, new_rps = old['throughput_rps'], current['throughput_rps']
+        if old_rps and new_rps < old_rps * (1 - max_regression):
+            regressions.append(f"{current['endpoint']} c={current['concurrency']}: {old_rps:.0f} -> {new_rps:.0f} rps")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=('handler', 'flask', 'flask-mysql', 'asgi'), default='handler')
+    parser.add_argument('--db', default='sqlite:////tmp/dormitory-bench.db',
+                        help='sqlite:///path (stand-in) or postgresql://... (real database)')
+    parser.add_argument('--no-seed', action='store_true', help='reuse the existing database contents')
+    parser.add_argument('--scenarios', nargs='*', default=list(DEFAULT_SCENARIOS))
+    parser.add_argument('--only', help='run scenarios whose name contains this text')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario per concurrency level')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='compare against a previous JSON report')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.db.startswith('sqlite:///'):
+        import sqlite_standin
+        sqlite_standin.install(args.db[len('sqlite:///'):])
+        # asyncpg заглушкой не подменяется: app_async идёт через MySQL-ветку (pymysql в потоках)
+        os.environ.setdefault('DB_BACKEND', 'mysql')
+    else:
+        os.environ['DATABASE_URL'] = args.db
+    if not args.no_seed:
+        import seed
+        seed.seed(args.db, reset=True)
+
+    if args.target == 'handler':
+        call = handler_target()
+    elif args.target == 'asgi':
+        call = asgi_target()
+    else:
+        call = flask_target('app.py' if args.target == 'flask' else 'app_mysql.py')
+
+    context = seed_context(args.db)
+    levels = [int(c) for c in args.concurrency.split(',')]
+    results = []
+    for scenario in load_scenarios(args.scenarios):
+        if args.target not in scenario.targets or (args.only and args.only not in scenario.name):
+            continue
+        if hasattr(call, 'supports') and not call.supports(scenario):
+            print(f'skip {scenario.name}: not served by {args.target}')
+            continue
+        for _ in range(args.warmup):
+            call(scenario, context)
+        for level in levels:
+            result = run_level(call, scenario, context, level, args.requests).to_dict()
+            results.append(result)
+            lat = result['latency_ms']
+            print(f"{scenario.name[:40]:<40} c={level:<3} {result['throughput_rps']:>9.1f} rps  "
+                  f"p50={lat['p50']:.2f} p95={lat['p95']:.2f} p99={lat['p99']:.2f} ms  errors={result['errors']}")
+
+    report = {
+        'meta': {
+            'target': args.target,
+            'db': 'sqlite' if args.db.startswith('sqlite:///') else 'postgres',
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'requests_per_level': args.requests,
+            'concurrency': levels,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f'report written to {args.output}')
+
+    exit_code = 0
+    if any(r['errors'] for r in results):
+        print('some requests returned an unexpected status')
+        exit_code = 1
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(report, json.load(fh), args.max_regression)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            exit_code = 1
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+SQLite-заглушка для psycopg2 и pymysql
+Позволяет гонять handler() и Flask-приложения в одном процессе без сервера БД:
+SQL переводится из диалектов Postgres/MySQL в SQLite, строки отдаются словарями
+как у RealDictCursor / DictCursor.
+
+Использование:
+    import sqlite_standin
+    sqlite_standin.install('/tmp/dormitory-bench.db')
+    # дальше import psycopg2 / pymysql возвращает заглушку
+"""
+import json
+import re
+import sqlite3
+import sys
+import types
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Optional
+
+sqlite3.register_adapter(uuid.UUID, str)
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(dict, json.dumps)
+sqlite3.register_adapter(list, json.dumps)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(sep=' '))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+
+_DB_PATH = ':memory:'
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+# Правила перевода SQL; порядок важен
+_RULES = (
+    (re.compile(r'::\s*(jsonb|json|text\[\]|text|date|timestamp|integer|int)\b', re.I), ''),
+    (re.compile(r'\bas\s+group\b', re.I), 'AS "group"'),
+    (re.compile(r'`'), '"'),
+    (re.compile(r'\bNOW\(\)', re.I), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'\bILIKE\b', re.I), 'LIKE'),
+    (re.compile(r'\bFOR\s+UPDATE(\s+OF\s+\w+)?(\s+SKIP\s+LOCKED|\s+NOWAIT)?', re.I), ''),
+    (re.compile(r'\bLOCK\s+IN\s+SHARE\s+MODE\b', re.I), ''),
+    (re.compile(r'ON\s+DUPLICATE\s+KEY\s+UPDATE', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bON\s+CONFLICT\s+ON\s+CONSTRAINT\s+\w+', re.I), 'ON CONFLICT'),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bVALUES\((\w+)\)'), r'excluded.\1'),
+    (re.compile(r'%\((\w+)\)s'), r':\1'),
+    (re.compile(r'(?<!%)%s'), '?'),
+    (re.compile(r'%%'), '%'),
+)
+
+
+@lru_cache(maxsize=1024)
+def translate(sql: str) -> str:
+    """Translate Postgres/MySQL flavoured SQL into SQLite"""
+    for pattern, replacement in _RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _adapt_params(params: Any) -> Any:
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {k: _adapt_value(v) for k, v in params.items()}
+    return tuple(_adapt_value(v) for v in params)
+
+
+def _adapt_value(value: Any) -> Any:
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+class StandinCursor:
+    """DB-API cursor returning dict rows (RealDictCursor/DictCursor semantics)"""
+
+    def __init__(self, connection, *args, **kwargs):
+        self.connection = connection
+        self._cur = connection._raw.cursor()
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, query, vars=None):
+        if isinstance(query, bytes):
+            query = query.decode()
+        try:
+            self._cur.execute(translate(query), _adapt_params(vars))
+        except sqlite3.IntegrityError as exc:
+            raise IntegrityError(str(exc)) from exc
+        except sqlite3.OperationalError as exc:
+            raise OperationalError(f'{exc}: {translate(query)}') from exc
+        self.description = self._cur.description
+        self.rowcount = self._cur.rowcount
+        self.lastrowid = self._cur.lastrowid
+        return self.rowcount
+
+    def executemany(self, query, seq_of_vars):
+        self._cur.executemany(translate(query), [_adapt_params(v) for v in seq_of_vars])
+        self.description = self._cur.description
+        self.rowcount = self._cur.rowcount
+        return self.rowcount
+
+    def _row(self, row):
+        if row is None:
+            return None
+        return dict(zip((c[0] for c in self.description), row))
+
+    def fetchone(self):
+        if self.description is None:
+            return None
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size: int = 100):
+        if self.description is None:
+            return []
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        if self.description is None:
+            return []
+        names = [c[0] for c in self.description]
+        return [dict(zip(names, r)) for r in self._cur.fetchall()]
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StandinConnection:
+    """Connection wrapper with the psycopg2/pymysql surface used by the apps"""
+
+    def __init__(self, cursor_factory=None):
+        self._raw = sqlite3.connect(_DB_PATH, timeout=30, check_same_thread=False)
+        self._raw.execute('PRAGMA journal_mode=WAL')
+        self._raw.execute('PRAGMA synchronous=NORMAL')
+        self._cursor_factory = cursor_factory or StandinCursor
+        self.closed = 0
+        self.autocommit = False
+
+    def cursor(self, cursor_factory=None, *args, **kwargs):
+        return (cursor_factory or self._cursor_factory)(self)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+            self.closed = 1
+
+    def ping(self, reconnect: bool = False):
+        self._raw.execute('SELECT 1')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+def connect(*args, cursor_factory=None, cursorclass=None, **kwargs) -> StandinConnection:
+    """psycopg2.connect / pymysql.connect replacement"""
+    return StandinConnection(cursor_factory or cursorclass)
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def install(path: Optional[str] = None) -> None:
+    """Register the stand-in as psycopg2 and pymysql in sys.modules"""
+    global _DB_PATH
+    if path:
+        _DB_PATH = path
+    errors = dict(Error=Error, DatabaseError=DatabaseError, OperationalError=OperationalError,
+                  IntegrityError=IntegrityError, InterfaceError=InterfaceError)
+
+    extras = _module('psycopg2.extras', RealDictCursor=StandinCursor)
+    psycopg2 = _module('psycopg2', connect=connect, extras=extras, **errors)
+    sys.modules['psycopg2'] = psycopg2
+    sys.modules['psycopg2.extras'] = extras
+
+    cursors = _module('pymysql.cursors', DictCursor=StandinCursor, SSDictCursor=StandinCursor, Cursor=StandinCursor)
+    pymysql = _module('pymysql', connect=connect, cursors=cursors, **errors)
+    sys.modules['pymysql'] = pymysql
+    sys.modules['pymysql.cursors'] = cursors
+
+
+def raw_connection() -> sqlite3.Connection:
+    """Plain sqlite3 connection to the stand-in database (used by the seeder)"""
+    return sqlite3.connect(_DB_PATH, timeout=30)
+
+
+def installed_path() -> str:
+    return _DB_PATH
+
@@ -0,0 +1,131 @@
+"""
+Холодный старт облачных функций (backend/api/index.py, api/index.py)
+Экземпляр функции живёт дольше одного вызова: модуль импортируется один раз,
+следующие (тёплые) вызовы приходят в тот же процесс. Поэтому драйвер БД
+импортируется при первом соединении, а не при импорте модуля, а соединение
+после вызова не закрывается, а ждёт следующего вызова - не дольше
+DB_CONN_MAX_IDLE секунд, дальше его мог закрыть сервер или NAT.
+
+startup - профиль старта экземпляра: импорт модуля, импорт драйвера, первое
+соединение, первый вызов (по разу на экземпляр). Событие прогрева
+({"warmup": true} или сообщение таймера) проходит все эти этапы до первого
+пользовательского запроса и возвращает профиль.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from instrumentation import registry
+
+DB_CONN_MAX_IDLE = float(os.environ.get('DB_CONN_MAX_IDLE', 240))
+
+FUNCTION_CONNECTIONS = registry.counter('function_db_connections_total',
+                                        'Connections taken by invocations: reused from a warm one or opened',
+                                        ('source',))
+
+
+class StartupProfile:
+    """Milliseconds spent on each one-off initialization step of this instance"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.cold = True
+
+    def record(self, name: str, started: float) -> None:
+        """Keep the first measurement of a step (perf_counter start)"""
+        self.phases.setdefault(name, round((time.perf_counter() - started) * 1000, 2))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def first_invocation(self, started: float) -> bool:
+        """Record the first invocation; True only once per instance"""
+        if not self.cold:
+            return False
+        self.cold = False
+        self.record('first_invocation', started)
+        return True
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.phases)
+
+
+startup = StartupProfile()
+
+
+def _is_closed(conn) -> bool:
+    # psycopg2: closed != 0; pymysql: open == False
+    return bool(getattr(conn, 'closed', 0)) or not getattr(conn, 'open', True)
+
+
+def _close(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class WarmConnections:
+    """One parked connection per tenant, kept between invocations of the instance"""
+
+    def __init__(self, connect: Callable[[str], Any], max_idle: float = DB_CONN_MAX_IDLE):
+        self._connect = connect
+        self.max_idle = max_idle
+        self._idle: Dict[str, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, tenant: str):
+        """The parked connection if it is fresh enough, a new one otherwise"""
+        with self._lock:
+            entry = self._idle.pop(tenant, None)
+        if entry is not None:
+            conn, parked_at = entry
+            if not _is_closed(conn) and time.monotonic() - parked_at < self.max_idle:
+                FUNCTION_CONNECTIONS.inc('reused')
+                return conn
+            _close(conn)
+        conn = self._connect(tenant)
+        FUNCTION_CONNECTIONS.inc('opened')
+        return conn
+
+    def put(self, tenant: str, conn) -> None:
+        """Park a connection for the next invocation; the open transaction is rolled back"""
+        if _is_closed(conn):
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            _close(conn)
+            return
+        with self._lock:
+            # Параллельный вызов уже оставил своё соединение - лишнее закрываем
+            if tenant not in self._idle:
+                self._idle[tenant] = (conn, time.monotonic())
+                return
+        _close(conn)
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conn, _ in idle.values():
+            _close(conn)
+
+
+def is_warmup(event: Any) -> bool:
+    """Warmup ping: {"warmup": true} or a timer trigger message"""
+    if not isinstance(event, dict):
+        return False
+    if event.get('warmup') is True:
+        return True
+    messages = event.get('messages')
+    return isinstance(messages, list) and any(
+        isinstance(message, dict)
+        and str((message.get('event_metadata') or {}).get('event_type', '')).endswith('TimerMessage')
+        for message in messages)
@@ -0,0 +1,18 @@
+-- Счётчики версий таблиц для ETag / условных GET-запросов
+-- Увеличиваются приложением в той же транзакции, что и запись
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO table_versions (table_name, version) VALUES
+    ('users', 0),
+    ('announcements', 0),
+    ('tasks', 0),
+    ('duty_schedule', 0),
+    ('work_shifts', 0),
+    ('archived_work_shifts', 0),
+    ('notifications', 0),
+    ('action_logs', 0)
+ON CONFLICT (table_name) DO NOTHING;
@@ -0,0 +1,15 @@
+-- Составные индексы для выборок графика дежурств по диапазону дат
+-- (date, zone): календарь и фильтр from/to/zone; (user_id, date): дежурства жильца
+-- Одиночные индексы по date и user_id покрываются префиксами составных
+-- duty_schedule есть только в базах Flask-приложения (схема из REG_RU_DEPLOY.md)
+
+DO $$
+BEGIN
+    IF to_regclass('duty_schedule') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_duty_schedule_date_zone ON duty_schedule(date, zone);
+        CREATE INDEX IF NOT EXISTS idx_duty_schedule_user_date ON duty_schedule(user_id, date);
+
+        DROP INDEX IF EXISTS idx_duty_schedule_date;
+        DROP INDEX IF EXISTS idx_duty_schedule_user_id;
+    END IF;
+END $$;
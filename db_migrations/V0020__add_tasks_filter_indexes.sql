@@ -0,0 +1,19 @@
+-- Индексы для серверных фильтров доски задач
+-- (assigned_to, status): задачи исполнителя с фильтром по статусу
+-- частичный по due_date: просроченные и скоро истекающие среди открытых задач
+-- (status, created_at): список по статусу в порядке создания
+-- Одиночный индекс по assigned_to покрывается префиксом составного
+-- tasks есть только в базах Flask-приложения (схема из REG_RU_DEPLOY.md)
+
+DO $$
+BEGIN
+    IF to_regclass('tasks') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_tasks_assigned_status ON tasks(assigned_to, status);
+        CREATE INDEX IF NOT EXISTS idx_tasks_open_due_date ON tasks(due_date)
+            WHERE status IN ('pending', 'in_progress');
+        CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks(status, created_at DESC);
+
+        DROP INDEX IF EXISTS idx_tasks_assigned_to;
+        DROP INDEX IF EXISTS idx_tasks_status;
+    END IF;
+END $$;
@@ -0,0 +1,30 @@
+-- Очередь жалоб для модераторов и счётчики по категориям
+-- assigned_*: кто взял жалобу в работу (очередь выдаёт open -> in_progress)
+-- complaint_counts: число жалоб по (категории, статусу), обновляется приложением
+-- в той же транзакции, что и запись в complaints
+
+ALTER TABLE complaints ADD COLUMN IF NOT EXISTS assigned_to VARCHAR(255);
+ALTER TABLE complaints ADD COLUMN IF NOT EXISTS assigned_to_name VARCHAR(255);
+ALTER TABLE complaints ADD COLUMN IF NOT EXISTS assigned_at TIMESTAMP;
+
+-- Голова очереди: самые старые открытые жалобы
+CREATE INDEX IF NOT EXISTS idx_complaints_open_queue ON complaints(created_at, id) WHERE status = 'open';
+-- История автора с keyset-пагинацией (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_complaints_author_created ON complaints(created_by, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_complaints_assigned_to ON complaints(assigned_to, status);
+
+DROP INDEX IF EXISTS idx_complaints_created_by;
+
+CREATE TABLE IF NOT EXISTS complaint_counts (
+    category VARCHAR(100) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, status)
+);
+
+INSERT INTO complaint_counts (category, status, total)
+SELECT category, status, COUNT(*) FROM complaints GROUP BY category, status
+ON CONFLICT (category, status) DO UPDATE SET total = EXCLUDED.total;
+
+INSERT INTO table_versions (table_name, version) VALUES ('complaints', 0)
+ON CONFLICT (table_name) DO NOTHING;
@@ -0,0 +1,16 @@
+-- Лента объявлений: закреплённые сверху, затем свежие по категории
+-- Колонки есть в исходной схеме, но отсутствуют в базах, созданных по REG_RU_DEPLOY.md
+-- Частичный индекс по закреплённым - их немного, первая страница читает его целиком
+-- (created_at, id) и (category, created_at, id): keyset-пагинация ленты
+
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS category VARCHAR(100);
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS priority VARCHAR(50) NOT NULL DEFAULT 'normal';
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS is_pinned BOOLEAN DEFAULT FALSE;
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_announcements_pinned ON announcements(created_at DESC) WHERE is_pinned = TRUE;
+CREATE INDEX IF NOT EXISTS idx_announcements_feed ON announcements(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_announcements_category_feed ON announcements(category, created_at DESC, id DESC);
+
+-- Покрывается префиксом idx_announcements_feed
+DROP INDEX IF EXISTS idx_announcements_created_at;
@@ -0,0 +1,3 @@
+-- Счётчик непрочитанных для /api/dashboard/bootstrap: частичный индекс
+-- содержит только непрочитанные уведомления и остаётся маленьким
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id) WHERE is_read = FALSE;
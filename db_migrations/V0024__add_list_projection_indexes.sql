@@ -0,0 +1,19 @@
+-- Покрывающие индексы для узких проекций списков (fields= в облачной функции)
+-- Колонки проекции по умолчанию лежат в INCLUDE, поэтому список читается
+-- index-only scan без обращения к строкам таблицы
+
+CREATE INDEX IF NOT EXISTS idx_work_shifts_active_user ON work_shifts(user_id, assigned_at DESC)
+    INCLUDE (id, user_name, days, completed_days) WHERE is_archived = FALSE;
+CREATE INDEX IF NOT EXISTS idx_work_shifts_active ON work_shifts(assigned_at DESC)
+    INCLUDE (id, user_id, user_name, days, completed_days) WHERE is_archived = FALSE;
+CREATE INDEX IF NOT EXISTS idx_archived_work_shifts_archived_at ON archived_work_shifts(archived_at DESC)
+    INCLUDE (id, user_id, user_name, days, assigned_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at DESC)
+    INCLUDE (id, type, title, is_read);
+CREATE INDEX IF NOT EXISTS idx_action_logs_recent ON action_logs(created_at DESC)
+    INCLUDE (id, action, user_name, target_user_name);
+
+-- Покрываются префиксами новых индексов
+DROP INDEX IF EXISTS idx_work_shifts_user_id;
+DROP INDEX IF EXISTS idx_notifications_user_id;
+DROP INDEX IF EXISTS idx_action_logs_created_at;
@@ -0,0 +1,95 @@
+-- Несколько общежитий (тенантов) в одной базе
+-- tenant_id во всех таблицах; строки разделяются политиками RLS по настройке
+-- сессии app.tenant_id, которую приложение задаёт при открытии соединения
+-- (tenancy.postgres_options). Без настройки сессия видит тенант 'default',
+-- поэтому однотенантные развёртывания работают как раньше.
+-- FORCE: политики действуют и на владельца таблиц; суперпользователь RLS
+-- обходит всегда - приложение должно подключаться обычной ролью.
+
+CREATE OR REPLACE FUNCTION app_tenant() RETURNS VARCHAR(64)
+    LANGUAGE sql STABLE
+    AS $$ SELECT COALESCE(NULLIF(current_setting('app.tenant_id', true), ''), 'default')::VARCHAR(64) $$;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['users', 'announcements', 'tasks', 'duty_schedule', 'work_shifts',
+                             'archived_work_shifts', 'notifications', 'action_logs', 'council_tasks',
+                             'complaints', 'complaint_counts', 'table_versions'] LOOP
+        -- tasks и duty_schedule есть только в базах Flask-приложения
+        CONTINUE WHEN to_regclass(t) IS NULL;
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS tenant_id VARCHAR(64) NOT NULL DEFAULT app_tenant()', t);
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', t);
+        EXECUTE format('ALTER TABLE %I FORCE ROW LEVEL SECURITY', t);
+        EXECUTE format('DROP POLICY IF EXISTS tenant_isolation ON %I', t);
+        EXECUTE format('CREATE POLICY tenant_isolation ON %I USING (tenant_id = app_tenant())', t);
+    END LOOP;
+END $$;
+
+-- Счётчики и email уникальны в пределах тенанта
+-- (приложение ссылается на ключи по имени ограничения: ON CONFLICT ON CONSTRAINT)
+ALTER TABLE table_versions DROP CONSTRAINT table_versions_pkey;
+ALTER TABLE table_versions ADD CONSTRAINT table_versions_pkey PRIMARY KEY (tenant_id, table_name);
+
+ALTER TABLE complaint_counts DROP CONSTRAINT complaint_counts_pkey;
+ALTER TABLE complaint_counts ADD CONSTRAINT complaint_counts_pkey PRIMARY KEY (tenant_id, category, status);
+
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_email_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_tenant_email ON users(tenant_id, email);
+
+-- Списки без ключа пользователя: tenant_id первым, политика RLS становится
+-- условием индекса. Индексы по user_id не меняются - id пользователя уже
+-- принадлежит одному тенанту.
+DROP INDEX IF EXISTS idx_announcements_pinned;
+DROP INDEX IF EXISTS idx_announcements_feed;
+DROP INDEX IF EXISTS idx_announcements_category_feed;
+CREATE INDEX idx_announcements_pinned ON announcements(tenant_id, created_at DESC) WHERE is_pinned = TRUE;
+CREATE INDEX idx_announcements_feed ON announcements(tenant_id, created_at DESC, id DESC);
+CREATE INDEX idx_announcements_category_feed ON announcements(tenant_id, category, created_at DESC, id DESC);
+
+-- tasks и duty_schedule: только там, где они есть (как в цикле выше)
+DO $$
+BEGIN
+    IF to_regclass('tasks') IS NOT NULL THEN
+        DROP INDEX IF EXISTS idx_tasks_open_due_date;
+        DROP INDEX IF EXISTS idx_tasks_status_created_at;
+        CREATE INDEX idx_tasks_open_due_date ON tasks(tenant_id, due_date)
+            WHERE status IN ('pending', 'in_progress');
+        CREATE INDEX idx_tasks_status_created_at ON tasks(tenant_id, status, created_at DESC);
+    END IF;
+    IF to_regclass('duty_schedule') IS NOT NULL THEN
+        DROP INDEX IF EXISTS idx_duty_schedule_date_zone;
+        CREATE INDEX idx_duty_schedule_date_zone ON duty_schedule(tenant_id, date, zone);
+    END IF;
+END $$;
+
+DROP INDEX IF EXISTS idx_work_shifts_active;
+DROP INDEX IF EXISTS idx_archived_work_shifts_archived_at;
+CREATE INDEX idx_work_shifts_active ON work_shifts(tenant_id, assigned_at DESC)
+    INCLUDE (id, user_id, user_name, days, completed_days) WHERE is_archived = FALSE;
+CREATE INDEX idx_archived_work_shifts_archived_at ON archived_work_shifts(tenant_id, archived_at DESC)
+    INCLUDE (id, user_id, user_name, days, assigned_at);
+
+DROP INDEX IF EXISTS idx_notifications_created_at;
+CREATE INDEX idx_notifications_created_at ON notifications(tenant_id, created_at DESC);
+
+DROP INDEX IF EXISTS idx_action_logs_recent;
+DROP INDEX IF EXISTS idx_action_logs_action;
+CREATE INDEX idx_action_logs_recent ON action_logs(tenant_id, created_at DESC)
+    INCLUDE (id, action, user_name, target_user_name);
+CREATE INDEX idx_action_logs_action ON action_logs(tenant_id, action);
+
+DROP INDEX IF EXISTS idx_council_tasks_status;
+DROP INDEX IF EXISTS idx_council_tasks_due_date;
+CREATE INDEX idx_council_tasks_status ON council_tasks(tenant_id, status);
+CREATE INDEX idx_council_tasks_due_date ON council_tasks(tenant_id, due_date);
+
+DROP INDEX IF EXISTS idx_complaints_open_queue;
+DROP INDEX IF EXISTS idx_complaints_status;
+DROP INDEX IF EXISTS idx_complaints_category;
+DROP INDEX IF EXISTS idx_complaints_created_at;
+CREATE INDEX idx_complaints_open_queue ON complaints(tenant_id, created_at, id) WHERE status = 'open';
+CREATE INDEX idx_complaints_status ON complaints(tenant_id, status);
+CREATE INDEX idx_complaints_category ON complaints(tenant_id, category);
+CREATE INDEX idx_complaints_created_at ON complaints(tenant_id, created_at DESC);
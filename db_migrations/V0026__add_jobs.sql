@@ -0,0 +1,36 @@
+-- Очередь фоновых заданий (jobs.py, worker.py)
+-- Обработчик HTTP ставит задание и отвечает 202, воркер забирает готовые
+-- задания FOR UPDATE SKIP LOCKED в порядке priority DESC, run_at, id.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    tenant_id VARCHAR(64) NOT NULL DEFAULT app_tenant(),
+    kind VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    priority INTEGER NOT NULL DEFAULT 0,
+    dedup_key VARCHAR(255),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(255),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    CONSTRAINT jobs_status_check CHECK (status IN ('queued', 'running', 'done', 'failed'))
+);
+
+-- Выборка воркера: только ждущие задания, в порядке выдачи
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(tenant_id, priority DESC, run_at, id) WHERE status = 'queued';
+-- Одно незавершённое задание на ключ; ENQUEUE_SQL ссылается на этот индекс в ON CONFLICT
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs(tenant_id, dedup_key)
+    WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running');
+-- Поиск заданий с истёкшей арендой (упавший воркер)
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_at) WHERE status = 'running';
+
+ALTER TABLE jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE jobs FORCE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS tenant_isolation ON jobs;
+CREATE POLICY tenant_isolation ON jobs USING (tenant_id = app_tenant());
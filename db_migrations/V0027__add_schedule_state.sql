@@ -0,0 +1,12 @@
+-- Состояние периодических расписаний (scheduler.py)
+-- Последний отработанный слот каждого расписания: по нему новый лидер
+-- догоняет пропущенные запуски. Таблица общая для всех тенантов - лидер
+-- ставит задания каждому тенанту сам, поэтому tenant_id и RLS ей не нужны.
+
+CREATE TABLE IF NOT EXISTS schedule_state (
+    name VARCHAR(100) PRIMARY KEY,
+    last_slot TIMESTAMP NOT NULL,
+    last_run_at TIMESTAMP,
+    runs BIGINT NOT NULL DEFAULT 0,
+    last_error TEXT
+);
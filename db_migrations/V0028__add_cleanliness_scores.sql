@@ -0,0 +1,32 @@
+-- Оценки за уборку комнат и автоматические отработки (shift_rules.py)
+-- Оценки раньше жили только в браузере ответственного за чистоту; теперь
+-- они пишутся пакетами в cleanliness_scores, и правила вида «две двойки за
+-- неделю - 1 день» назначают по ним отработки всем жильцам комнаты.
+
+CREATE TABLE IF NOT EXISTS cleanliness_scores (
+    id BIGSERIAL PRIMARY KEY,
+    tenant_id VARCHAR(64) NOT NULL DEFAULT app_tenant(),
+    room VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    score SMALLINT NOT NULL,
+    inspector VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT cleanliness_scores_score_check CHECK (score BETWEEN 2 AND 5)
+);
+
+-- Одна оценка комнаты в день; повторная запись её заменяет (ON CONFLICT ссылается на этот ключ)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cleanliness_scores_room_date ON cleanliness_scores(tenant_id, room, date);
+-- Выборка правил: только низкие оценки за период
+CREATE INDEX IF NOT EXISTS idx_cleanliness_scores_date_score ON cleanliness_scores(tenant_id, date, score);
+
+ALTER TABLE cleanliness_scores ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cleanliness_scores FORCE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS tenant_isolation ON cleanliness_scores;
+CREATE POLICY tenant_isolation ON cleanliness_scores USING (tenant_id = app_tenant());
+
+-- Отработка, назначенная правилом, помнит окно (cleanliness:<период>:<начало>):
+-- повторный прогон за тот же период окно второй раз не начисляет
+ALTER TABLE work_shifts ADD COLUMN IF NOT EXISTS rule_key VARCHAR(100);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_work_shifts_rule_key ON work_shifts(tenant_id, user_id, rule_key)
+    WHERE rule_key IS NOT NULL;
@@ -0,0 +1,47 @@
+-- Должности пользователей отдельной таблицей (permissions.py)
+-- users.positions бывает TEXT[] (V0001) или jsonb (облачная функция); права
+-- и выборки «кто занимает должность» теперь идут по user_positions, а
+-- колонка остаётся копией для ответов API и пишется вместе с ней.
+
+CREATE TABLE IF NOT EXISTS user_positions (
+    tenant_id VARCHAR(64) NOT NULL DEFAULT app_tenant(),
+    user_id VARCHAR(255) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    position VARCHAR(100) NOT NULL,
+    floor SMALLINT,
+    assigned_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, position)
+);
+
+-- «Кто занимает должность X» - один поиск по индексу
+CREATE INDEX IF NOT EXISTS idx_user_positions_position ON user_positions(tenant_id, position, user_id);
+-- Старосты и ответственные за чистоту этажа
+CREATE INDEX IF NOT EXISTS idx_user_positions_floor ON user_positions(tenant_id, floor) WHERE floor IS NOT NULL;
+
+-- Перенос существующих должностей из колонки любого из двух типов
+DO $$
+DECLARE
+    column_type TEXT;
+BEGIN
+    SELECT data_type INTO column_type FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'users' AND column_name = 'positions';
+
+    IF column_type = 'ARRAY' THEN
+        INSERT INTO user_positions (tenant_id, user_id, position)
+        SELECT DISTINCT u.tenant_id, u.id, p FROM users u, unnest(u.positions) AS p
+        WHERE p IS NOT NULL AND p <> ''
+        ON CONFLICT DO NOTHING;
+    ELSIF column_type = 'jsonb' THEN
+        INSERT INTO user_positions (tenant_id, user_id, position)
+        SELECT DISTINCT u.tenant_id, u.id, p FROM users u, jsonb_array_elements_text(u.positions) AS p
+        WHERE jsonb_typeof(u.positions) = 'array' AND p <> ''
+        ON CONFLICT DO NOTHING;
+    END IF;
+END $$;
+
+UPDATE user_positions SET floor = substring(position FROM '^floor_(\d+)_(?:head|cleanliness)$')::SMALLINT
+WHERE position ~ '^floor_\d+_(head|cleanliness)$';
+
+ALTER TABLE user_positions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_positions FORCE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS tenant_isolation ON user_positions;
+CREATE POLICY tenant_isolation ON user_positions USING (tenant_id = app_tenant());
@@ -0,0 +1,113 @@
+"""
+Пул соединений с БД
+Потокобезопасный пул поверх любой DB-API фабрики соединений (psycopg2, pymysql),
+со статистикой загрузки для readiness-проверок и метрик
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PoolExhausted(Exception):
+    """No connection became available within the acquire timeout"""
+
+
+def _is_closed(conn) -> bool:
+    # psycopg2: closed != 0; pymysql: open == False
+    return bool(getattr(conn, 'closed', 0)) or not getattr(conn, 'open', True)
+
+
+class ConnectionPool:
+    """Bounded pool: connections are created lazily up to maxsize and reused"""
+
+    def __init__(self, factory: Callable[[], Any], maxsize: int = 10, timeout: float = 5.0):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle: List[Any] = []
+        self._size = 0
+        self._waiting = 0
+        self._acquired_total = 0
+        self._exhausted_total = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Take an idle connection or open a new one; raises PoolExhausted on timeout"""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if not _is_closed(conn):
+                        self._acquired_total += 1
+                        return conn
+                    self._size -= 1
+                if self._size < self.maxsize:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._exhausted_total += 1
+                    raise PoolExhausted(f'No free database connection (pool size {self.maxsize})')
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        try:
+            conn = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._acquired_total += 1
+        return conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """Return a connection; open transactions are rolled back, broken ones dropped"""
+        if not discard and not _is_closed(conn):
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard or _is_closed(conn):
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        """Close idle connections (connections in use are closed when returned)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool utilization"""
+        with self._cond:
+            idle = len(self._idle)
+            in_use = self._size - idle
+            return {
+                'size': self._size,
+                'max': self.maxsize,
+                'in_use': in_use,
+                'idle': idle,
+                'waiting': self._waiting,
+                'utilization': round(in_use / self.maxsize, 3) if self.maxsize else 0.0,
+                'acquired_total': self._acquired_total,
+                'exhausted_total': self._exhausted_total,
+            }
@@ -0,0 +1,234 @@
+"""
+Маршрутизация чтений на реплики БД
+У каждой реплики свой пул; фоновый поток раз в REPLICA_CHECK_INTERVAL секунд
+измеряет её отставание. Записи и чтения клиента, недавно писавшего в БД,
+идут на primary: момент записи возвращается клиенту cookie (или заголовком
+X-Last-Write), и реплика берётся, только если её отставание меньше времени,
+прошедшего с этой записи. Упавшая или отставшая реплика выводится из ротации
+до следующей успешной проверки, а чтение уходит на другую реплику или primary.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from db_pool import ConnectionPool
+from instrumentation import registry
+
+logger = logging.getLogger('dormitory.replicas')
+
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 30))
+# Запас на отставание, накопившееся после последней проверки
+REPLICA_LAG_SLACK = float(os.environ.get('REPLICA_LAG_SLACK', 1))
+
+WROTE_AT_COOKIE = 'db_wrote_at'
+WROTE_AT_HEADER = 'X-Last-Write'
+
+READS_ROUTED = registry.counter('db_reads_routed_total', 'Connections handed out by target and reason',
+                                ('target', 'reason'))
+REPLICA_UP = registry.gauge('db_replica_up', 'Replica passed its last health check', ('replica',))
+REPLICA_LAG = registry.gauge('db_replica_lag_seconds', 'Replication lag measured by the last health check',
+                             ('replica',))
+
+PG_LAG_SQL = """
+    SELECT pg_is_in_recovery() AS replica,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag
+"""
+
+
+def postgres_lag(cur) -> float:
+    """Replay lag of a Postgres standby; 0 when everything received is replayed"""
+    cur.execute(PG_LAG_SQL)
+    row = cur.fetchone()
+    if not row['replica']:
+        raise RuntimeError('server is not in recovery')
+    if row['lag'] is None:
+        raise RuntimeError('replay timestamp unknown')
+    return float(row['lag'])
+
+
+def mysql_lag(cur) -> float:
+    """Seconds_Behind_Source of a MySQL replica (Seconds_Behind_Master before 8.0.22)"""
+    try:
+        cur.execute('SHOW REPLICA STATUS')
+    except Exception:
+        cur.execute('SHOW SLAVE STATUS')
+    row = cur.fetchone()
+    if not row:
+        raise RuntimeError('replication is not configured')
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    if lag is None:
+        raise RuntimeError('replication threads are stopped')
+    return float(lag)
+
+
+LAG_PROBES: Dict[str, Callable[[Any], float]] = {
+    'postgres': postgres_lag,
+    'mysql': mysql_lag,
+}
+
+
+class Replica:
+    """One read replica: its pool and the result of the last health check"""
+
+    __slots__ = ('name', 'pool', 'healthy', 'lag', 'error', 'checked_at')
+
+    def __init__(self, name: str, pool: ConnectionPool):
+        self.name = name
+        self.pool = pool
+        self.healthy = False
+        self.lag = 0.0
+        self.error: Optional[str] = 'not checked yet'
+        self.checked_at = 0.0
+
+    def mark_down(self, error: str) -> None:
+        if self.healthy:
+            logger.warning('replica %s is out of rotation: %s', self.name, error)
+        self.healthy = False
+        self.error = error
+        REPLICA_UP.set(self.name, value=0)
+
+
+class ReplicaRouter:
+    """Hands out primary or replica connections; without replicas everything goes to the primary"""
+
+    def __init__(self, primary: ConnectionPool, replicas: Sequence[Tuple[str, ConnectionPool]], dialect: str,
+                 probe: Optional[Callable[[Any], float]] = None, check_interval: float = REPLICA_CHECK_INTERVAL,
+                 max_lag: float = REPLICA_MAX_LAG):
+        self.primary = primary
+        self.replicas = [Replica(name, pool) for name, pool in replicas]
+        self.probe = probe or LAG_PROBES[dialect]
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._turn = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if self.replicas:
+            self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+            self._thread.start()
+
+    # ---- health checks ----
+
+    def check(self, replica: Replica) -> None:
+        discard = False
+        try:
+            conn = replica.pool.getconn(timeout=self.check_interval)
+        except Exception as e:
+            replica.mark_down(f'connect failed: {e}')
+            return
+        try:
+            cur = conn.cursor()
+            lag = self.probe(cur)
+            cur.close()
+            conn.rollback()
+        except Exception as e:
+            discard = True
+            replica.mark_down(f'check failed: {e}')
+            return
+        finally:
+            replica.pool.putconn(conn, discard=discard)
+
+        replica.lag = lag
+        replica.checked_at = time.time()
+        REPLICA_LAG.set(replica.name, value=lag)
+        if lag > self.max_lag:
+            replica.mark_down(f'lag {lag:.1f}s > {self.max_lag:g}s')
+            return
+        if not replica.healthy:
+            logger.info('replica %s is back in rotation (lag %.1fs)', replica.name, lag)
+        replica.healthy = True
+        replica.error = None
+        REPLICA_UP.set(replica.name, value=1)
+
+    def check_all(self) -> None:
+        for replica in self.replicas:
+            self.check(replica)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check_all()
+            self._stop.wait(self.check_interval)
+
+    def close(self) -> None:
+        self._stop.set()
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+    # ---- routing ----
+
+    def _candidates(self, wrote_at: Optional[float]) -> List[Replica]:
+        since_write = time.time() - wrote_at if wrote_at is not None else None
+        return [r for r in self.replicas
+                if r.healthy and (since_write is None or since_write > r.lag + REPLICA_LAG_SLACK)]
+
+    def acquire(self, readonly: bool, wrote_at: Optional[float] = None):
+        """Connection for the request; returns (conn, pool it must be returned to)"""
+        if not readonly or not self.replicas:
+            READS_ROUTED.inc('primary', 'write' if not readonly else 'no_replica')
+            return self.primary.getconn(), self.primary
+
+        candidates = self._candidates(wrote_at)
+        if not candidates:
+            reason = 'pinned' if wrote_at is not None and any(r.healthy for r in self.replicas) else 'no_replica'
+            READS_ROUTED.inc('primary', reason)
+            return self.primary.getconn(), self.primary
+
+        start = next(self._turn)
+        for offset in range(len(candidates)):
+            replica = candidates[(start + offset) % len(candidates)]
+            try:
+                conn = replica.pool.getconn()
+            except Exception as e:
+                # Переключение: реплика выходит из ротации до следующей успешной проверки
+                replica.mark_down(f'connect failed: {e}')
+                continue
+            READS_ROUTED.inc('replica', 'read')
+            return conn, replica.pool
+
+        READS_ROUTED.inc('primary', 'failover')
+        return self.primary.getconn(), self.primary
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Replica states for the readiness report"""
+        return [{
+            'name': r.name,
+            'healthy': r.healthy,
+            'lagSeconds': round(r.lag, 3),
+            'error': r.error,
+            'checkedAt': r.checked_at or None,
+            'pool': r.pool.stats(),
+        } for r in self.replicas]
+
+
+def parse_wrote_at(value: Optional[str]) -> Optional[float]:
+    """Write marker sent back by the client; garbage and stale markers are ignored"""
+    if not value:
+        return None
+    try:
+        wrote_at = float(value)
+    except ValueError:
+        return None
+    age = time.time() - wrote_at
+    # Старше REPLICA_MAX_LAG маркер ничего не меняет: отставшие реплики уже вне ротации
+    return wrote_at if -REPLICA_MAX_LAG < age < REPLICA_MAX_LAG + REPLICA_LAG_SLACK else None
+
+
+def init_flask(app, router: ReplicaRouter) -> None:
+    """Send the write marker back after successful non-GET requests"""
+    if not router.replicas:
+        return
+    from flask import g
+
+    @app.after_request
+    def _remember_write(response):
+        wrote_at = g.pop('db_wrote_at', None)
+        if wrote_at is not None and response.status_code < 400:
+            marker = f'{wrote_at:.3f}'
+            response.set_cookie(WROTE_AT_COOKIE, marker, max_age=int(REPLICA_MAX_LAG + REPLICA_LAG_SLACK) + 1,
+                                httponly=True, samesite='Lax')
+            response.headers[WROTE_AT_HEADER] = marker
+        return response
@@ -0,0 +1,236 @@
+"""
+Генератор графика дежурств
+По списку жильцов, зон, диапазону дат и нерабочим дням строит
+равномерную ротацию: каждое место отдаётся наименее загруженному жильцу
+(min-куча по числу дежурств), жилец не дежурит чаще чем раз в min_gap
+дней, порядок зон сдвигается каждый день. Уже записанные в диапазоне
+дежурства занимают свои места и учитываются в нагрузке, а их дни (и дни
+незадолго до начала диапазона) держат промежуток min_gap. Результат
+пишется одной пакетной вставкой.
+"""
+import heapq
+import os
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from duty_calendar import FilterError, parse_day
+from instrumentation import track
+
+# Семестр с запасом
+MAX_ROSTER_DAYS = int(os.environ.get('DUTY_MAX_ROSTER_DAYS', 200))
+MAX_ZONES = 20
+MAX_PER_ZONE = 10
+
+Assignment = Tuple[str, date, str]
+
+
+class RosterSpec:
+    """Validated roster request"""
+
+    __slots__ = ('start', 'end', 'zones', 'floor', 'room', 'group', 'skip_dates', 'skip_weekdays',
+                 'per_zone', 'min_gap', 'dry_run')
+
+    def __init__(self, start: date, end: date, zones: List[str], floor: Optional[str] = None,
+                 room: Optional[str] = None, group: Optional[str] = None, skip_dates: Iterable[date] = (),
+                 skip_weekdays: Iterable[int] = (), per_zone: int = 1, min_gap: int = 2, dry_run: bool = False):
+        self.start = start
+        self.end = end
+        self.zones = zones
+        self.floor = floor
+        self.room = room
+        self.group = group
+        self.skip_dates = frozenset(skip_dates)
+        self.skip_weekdays = frozenset(skip_weekdays)
+        self.per_zone = per_zone
+        self.min_gap = min_gap
+        self.dry_run = dry_run
+
+    @property
+    def dedup_key(self) -> str:
+        """Job dedup key: one queued generation per range and zone set"""
+        return f"duty_roster:{self.start}:{self.end}:{','.join(sorted(self.zones))}"
+
+    def working_days(self) -> List[date]:
+        days = []
+        day = self.start
+        while day <= self.end:
+            if day not in self.skip_dates and day.weekday() not in self.skip_weekdays:
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+
+def _bounded_int(data: Mapping[str, Any], name: str, default: int, low: int, high: int) -> int:
+    value = data.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+        raise FilterError(f'{name} must be an integer between {low} and {high}')
+    return value
+
+
+def _text(value: Any, max_length: int) -> Optional[str]:
+    text = str(value)[:max_length].strip() if value not in (None, '') else ''
+    return text or None
+
+
+def parse_roster_request(data: Mapping[str, Any]) -> RosterSpec:
+    """Validate the POST body; raises FilterError with a client-facing message"""
+    start = parse_day(data.get('from'), 'from')
+    end = parse_day(data.get('to'), 'to')
+    if not start or not end:
+        raise FilterError('from and to dates required')
+    if end < start:
+        raise FilterError("'to' must not be earlier than 'from'")
+    if (end - start).days + 1 > MAX_ROSTER_DAYS:
+        raise FilterError(f'Date range must not exceed {MAX_ROSTER_DAYS} days')
+
+    raw_zones = data.get('zones')
+    if not isinstance(raw_zones, list) or not raw_zones:
+        raise FilterError('zones must be a non-empty array')
+    zones = list(dict.fromkeys(z for z in (_text(z, 100) for z in raw_zones) if z))
+    if not zones or len(zones) > MAX_ZONES:
+        raise FilterError(f'zones must contain 1 to {MAX_ZONES} names')
+
+    skip_dates = data.get('skipDates') or []
+    skip_weekdays = data.get('skipWeekdays') or []
+    if not isinstance(skip_dates, list) or not isinstance(skip_weekdays, list):
+        raise FilterError('skipDates and skipWeekdays must be arrays')
+    if any(not isinstance(d, int) or isinstance(d, bool) or not 0 <= d <= 6 for d in skip_weekdays):
+        raise FilterError('skipWeekdays must contain numbers 0 (Monday) to 6 (Sunday)')
+
+    floor = _text(data.get('floor'), 10)
+    if floor is not None and not floor.isdigit():
+        raise FilterError('Invalid floor')
+
+    return RosterSpec(
+        start, end, zones,
+        floor=floor,
+        room=_text(data.get('room'), 50),
+        group=_text(data.get('group'), 50),
+        skip_dates=[parse_day(d, 'skipDates') for d in skip_dates],
+        skip_weekdays=skip_weekdays,
+        per_zone=_bounded_int(data, 'perZone', 1, 1, MAX_PER_ZONE),
+        min_gap=_bounded_int(data, 'minGap', 2, 1, 30),
+        dry_run=bool(data.get('dryRun')),
+    )
+
+
+def resident_filters(spec: RosterSpec) -> Tuple[str, List[Any]]:
+    """WHERE clause and params selecting the residents the roster covers"""
+    conditions, params = ["role = 'member'", 'room IS NOT NULL'], []
+    if spec.floor:
+        # Номер комнаты - этаж и две цифры (201, 315)
+        conditions.append('room LIKE %s')
+        params.append(f'{spec.floor}__')
+    if spec.room:
+        conditions.append('room = %s')
+        params.append(spec.room)
+    if spec.group:
+        conditions.append('room_group = %s')
+        params.append(spec.group)
+    return 'WHERE ' + ' AND '.join(conditions), params
+
+
+def generate_roster(residents: Sequence[str], zones: Sequence[str], days: Sequence[date], per_zone: int = 1,
+                    min_gap: int = 2, existing: Iterable[Assignment] = ()) -> List[Assignment]:
+    """Assign residents to (day, zone) slots, least loaded first, at most once per min_gap days"""
+    loads: Dict[str, int] = dict.fromkeys(residents, 0)
+    taken: Dict[Tuple[date, str], int] = {}
+    # Дни уже записанных дежурств каждого жильца: новое место не ближе min_gap дней к ним в обе стороны
+    busy: Dict[str, Set[int]] = {}
+    first = days[0] if days else None
+    for user_id, day, zone in existing:
+        busy.setdefault(user_id, set()).add(day.toordinal())
+        if first is not None and day < first:
+            continue  # дежурства до диапазона важны только для промежутка
+        taken[(day, zone)] = taken.get((day, zone), 0) + 1
+        if user_id in loads:
+            loads[user_id] += 1
+
+    def clashes(user_id: str, today: int, gap: int) -> bool:
+        booked = busy.get(user_id)
+        return bool(booked) and any(today + offset in booked for offset in range(1 - gap, gap))
+
+    # [нагрузка, день последнего дежурства, порядок, жилец] - порядок делает ротацию стабильной
+    never = -min_gap
+    start = first.toordinal() if first is not None else 0
+    heap = [[loads[user_id], max((d for d in busy.get(user_id, ()) if d < start), default=never), order, user_id]
+            for order, user_id in enumerate(residents)]
+    heapq.heapify(heap)
+
+    roster: List[Assignment] = []
+    for index, day in enumerate(days):
+        today = day.toordinal()
+        shift = index % len(zones)
+        for zone in list(zones[shift:]) + list(zones[:shift]):
+            for _ in range(per_zone - taken.get((day, zone), 0)):
+                deferred = []
+                chosen = None
+                while heap:
+                    entry = heapq.heappop(heap)
+                    if today - entry[1] >= min_gap and not clashes(entry[3], today, min_gap):
+                        chosen = entry
+                        break
+                    deferred.append(entry)
+                if chosen is None:
+                    # Жильцов меньше, чем мест за min_gap дней: ослабляем ограничение до «не дважды в день»
+                    for position, entry in enumerate(deferred):
+                        if entry[1] != today and not clashes(entry[3], today, 1):
+                            chosen = deferred.pop(position)
+                            break
+                for entry in deferred:
+                    heapq.heappush(heap, entry)
+                if chosen is None:
+                    break
+                chosen[0] += 1
+                chosen[1] = today
+                heapq.heappush(heap, chosen)
+                roster.append((chosen[3], day, zone))
+    return roster
+
+
+# Дежурства за min_gap дней до начала тоже держат промежуток; занятыми места
+# считаются только в зонах графика, а жилец занят в любой зоне
+EXISTING_SQL = "SELECT user_id, date, zone FROM duty_schedule WHERE date BETWEEN %s AND %s"
+
+
+def existing_range(spec: RosterSpec) -> Tuple[date, date]:
+    """Date range of EXISTING_SQL"""
+    return spec.start - timedelta(days=spec.min_gap - 1), spec.end
+
+
+def existing_duties(rows: Iterable[Mapping[str, Any]]) -> List[Assignment]:
+    """Assignments of EXISTING_SQL rows; the date comes as date or ISO text depending on the driver"""
+    return [(row['user_id'], row['date'] if isinstance(row['date'], date) else date.fromisoformat(str(row['date'])[:10]),
+             row['zone']) for row in rows]
+
+
+def plan_roster(cur, spec: RosterSpec) -> Tuple[List[str], List[Assignment]]:
+    """Read matching residents and duties already in the range, then build the roster"""
+    where, params = resident_filters(spec)
+    cur.execute(f"SELECT id FROM users {where} ORDER BY room, name", params)
+    residents = [row['id'] for row in cur.fetchall()]
+    if not residents:
+        raise FilterError('No residents match the filters')
+
+    cur.execute(EXISTING_SQL, existing_range(spec))
+    existing = existing_duties(cur.fetchall())
+
+    with track('roster'):
+        roster = generate_roster(residents, spec.zones, spec.working_days(), spec.per_zone, spec.min_gap, existing)
+    return residents, roster
+
+
+def roster_rows(roster: Iterable[Assignment]) -> List[Tuple[str, str, date, str]]:
+    """(id, user_id, date, zone) tuples for the bulk INSERT"""
+    return [(str(uuid.uuid4()), user_id, day, zone) for user_id, day, zone in roster]
+
+
+def roster_summary(roster: Sequence[Assignment], residents: Sequence[str]) -> Dict[str, Any]:
+    """Load spread over the generated assignments"""
+    loads: Dict[str, int] = dict.fromkeys(residents, 0)
+    for user_id, _, _ in roster:
+        loads[user_id] = loads.get(user_id, 0) + 1
+    values = list(loads.values()) or [0]
+    return {'assignments': len(roster), 'residents': len(residents), 'minLoad': min(values), 'maxLoad': max(values)}
+
@@ -0,0 +1,188 @@
+"""
+Проверки здоровья для балансировщика
+liveness - процесс жив и отвечает; readiness - есть свободные соединения в пуле
+и БД отвечает быстро. Пинг БД кэшируется на HEALTH_CACHE_SECONDS, чтобы частые
+пробы не создавали нагрузку.
+"""
+import asyncio
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from db_pool import ConnectionPool, PoolExhausted
+from instrumentation import registry
+
+HEALTH_CACHE_SECONDS = float(os.environ.get('HEALTH_CACHE_SECONDS', 5))
+HEALTH_DB_TIMEOUT = float(os.environ.get('HEALTH_DB_TIMEOUT', 1))
+READY_MAX_POOL_UTILIZATION = float(os.environ.get('READY_MAX_POOL_UTILIZATION', 0.9))
+READY_MAX_DB_LATENCY_MS = float(os.environ.get('READY_MAX_DB_LATENCY_MS', 500))
+
+POOL_IN_USE = registry.gauge('db_pool_connections_in_use', 'Connections checked out of the pool')
+POOL_WAITING = registry.gauge('db_pool_waiting', 'Requests waiting for a pooled connection')
+DB_PING_SECONDS = registry.gauge('db_ping_seconds', 'Latest database round-trip time')
+READY = registry.gauge('app_ready', '1 when the readiness check passes')
+
+_STARTED_AT = datetime.now(timezone.utc)
+_BUILD_INFO: Optional[Dict[str, Any]] = None
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             timeout=2, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def build_info(backend: str) -> Dict[str, Any]:
+    """Static build/runtime description, computed once per process"""
+    global _BUILD_INFO
+    if _BUILD_INFO is None:
+        _BUILD_INFO = {
+            'version': os.environ.get('APP_VERSION', 'dev'),
+            'revision': os.environ.get('GIT_SHA') or os.environ.get('VERCEL_GIT_COMMIT_SHA') or _git_revision(),
+            'python': platform.python_version(),
+            'startedAt': _STARTED_AT.isoformat(),
+        }
+    return dict(_BUILD_INFO, database=backend)
+
+
+def liveness_report(backend: str) -> Dict[str, Any]:
+    """Uptime and build info"""
+    return {
+        'status': 'ok',
+        'uptimeSeconds': round((datetime.now(timezone.utc) - _STARTED_AT).total_seconds(), 1),
+        'build': build_info(backend),
+    }
+
+
+class HealthChecker:
+    """Liveness/readiness reports for one app instance"""
+
+    def __init__(self, pool: ConnectionPool, backend: str, rate_limit_size: Callable[[], int]):
+        self.pool = pool
+        self.backend = backend
+        self.rate_limit_size = rate_limit_size
+        self._db_check: Optional[Dict[str, Any]] = None
+        self._db_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _ping(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            conn = self.pool.getconn(timeout=HEALTH_DB_TIMEOUT)
+        except PoolExhausted as e:
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            return {'ok': False, 'error': f'connect failed: {e}'}
+        discard = False
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+        except Exception as e:
+            discard = True
+            return {'ok': False, 'error': f'query failed: {e}'}
+        finally:
+            self.pool.putconn(conn, discard=discard)
+        latency = time.perf_counter() - started
+        DB_PING_SECONDS.set(value=latency)
+        return {'ok': True, 'latencyMs': round(latency * 1000, 2)}
+
+    def database(self) -> Dict[str, Any]:
+        """Cached DB round-trip check; only one prober hits the database per interval"""
+        now = time.monotonic()
+        if self._db_check is None or now - self._db_checked_at >= HEALTH_CACHE_SECONDS:
+            with self._lock:
+                if self._db_check is None or time.monotonic() - self._db_checked_at >= HEALTH_CACHE_SECONDS:
+                    check = self._ping()
+                    check['checkedAt'] = datetime.now(timezone.utc).isoformat()
+                    self._db_check = check
+                    self._db_checked_at = time.monotonic()
+        return dict(self._db_check, ageSeconds=round(time.monotonic() - self._db_checked_at, 3))
+
+    def liveness(self) -> Dict[str, Any]:
+        """Process is up; never touches the database"""
+        return liveness_report(self.backend)
+
+    def readiness(self) -> Tuple[Dict[str, Any], int]:
+        """Full dependency report; 503 tells the balancer to stop routing traffic here"""
+        pool = self.pool.stats()
+        return readiness_report(pool, self.database(), self.rate_limit_size(), self.backend)
+
+
+class AsyncHealthChecker:
+    """Same reports for app_async.py; the database object provides session() and stats()"""
+
+    def __init__(self, database, rate_limit_size: Callable[[], int]):
+        self.db = database
+        self.rate_limit_size = rate_limit_size
+        self._db_check: Optional[Dict[str, Any]] = None
+        self._db_checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _ping(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            async with self.db.session() as session:
+                await asyncio.wait_for(session.fetchrow('SELECT 1'), HEALTH_DB_TIMEOUT)
+        except PoolExhausted as e:
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            return {'ok': False, 'error': f'query failed: {e}'}
+        latency = time.perf_counter() - started
+        DB_PING_SECONDS.set(value=latency)
+        return {'ok': True, 'latencyMs': round(latency * 1000, 2)}
+
+    async def database(self) -> Dict[str, Any]:
+        """Cached DB round-trip check; concurrent probes await the same ping"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self._db_check is None or time.monotonic() - self._db_checked_at >= HEALTH_CACHE_SECONDS:
+            async with self._lock:
+                if self._db_check is None or time.monotonic() - self._db_checked_at >= HEALTH_CACHE_SECONDS:
+                    check = await self._ping()
+                    check['checkedAt'] = datetime.now(timezone.utc).isoformat()
+                    self._db_check = check
+                    self._db_checked_at = time.monotonic()
+        return dict(self._db_check, ageSeconds=round(time.monotonic() - self._db_checked_at, 3))
+
+    def liveness(self) -> Dict[str, Any]:
+        return liveness_report(self.db.name)
+
+    async def readiness(self) -> Tuple[Dict[str, Any], int]:
+        pool = self.db.stats()
+        return readiness_report(pool, await self.database(), self.rate_limit_size(), self.db.name)
+
+
+def readiness_report(pool: Dict[str, Any], db: Dict[str, Any], tracked_clients: int,
+                     backend: str) -> Tuple[Dict[str, Any], int]:
+    """Decide readiness from pool stats and the cached DB check"""
+    POOL_IN_USE.set(value=pool['in_use'])
+    POOL_WAITING.set(value=pool['waiting'])
+
+    reasons = []
+    if not db['ok']:
+        reasons.append('database unavailable')
+    elif db['latencyMs'] > READY_MAX_DB_LATENCY_MS:
+        reasons.append(f"database latency {db['latencyMs']}ms > {READY_MAX_DB_LATENCY_MS:g}ms")
+    if pool['waiting'] or pool['utilization'] >= READY_MAX_POOL_UTILIZATION:
+        reasons.append(f"connection pool saturated ({pool['in_use']}/{pool['max']}, {pool['waiting']} waiting)")
+
+    ready = not reasons
+    READY.set(value=1 if ready else 0)
+    report = {
+        'status': 'ok' if ready else 'unavailable',
+        'reasons': reasons,
+        'database': db,
+        'pool': pool,
+        'rateLimiter': {'trackedClients': tracked_clients},
+        'build': build_info(backend),
+    }
+    return report, 200 if ready else 503
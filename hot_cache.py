@@ -0,0 +1,54 @@
+"""
+Горячий кэш отрендеренных ответов внутри процесса
+Запись хранится вместе с ETag, под которым она была построена. Отдаётся
+только при совпадении с текущим ETag ресурса (счётчики table_versions),
+поэтому запись, сделанная другим воркером, сразу делает кэш неактуальным.
+Локальные записи вызывают invalidate() и освобождают память сразу.
+"""
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple, Union
+
+from instrumentation import registry
+
+Body = Union[str, bytes]
+
+HOT_CACHE_EVENTS = registry.counter('hot_cache_events_total', 'Hot cache hits, misses, stale entries and invalidations',
+                                    ('cache', 'event'))
+
+
+class HotCache:
+    """Small LRU of serialized bodies keyed by request shape and validated by ETag"""
+
+    def __init__(self, name: str, maxsize: int = 32):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[Hashable, Tuple[str, Body]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, etag: str) -> Optional[Body]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == etag:
+                self._entries.move_to_end(key)
+                HOT_CACHE_EVENTS.inc(self.name, 'hit')
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        HOT_CACHE_EVENTS.inc(self.name, 'stale' if entry is not None else 'miss')
+        return None
+
+    def put(self, key: Hashable, etag: str, body: Body) -> None:
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        HOT_CACHE_EVENTS.inc(self.name, 'invalidate')
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,117 @@
+"""
+HTTP-кэширование для read-эндпоинтов
+ETag считается по счётчикам версий таблиц (table_versions), которые
+увеличиваются в той же транзакции, что и запись. Условный GET с
+совпадающим If-None-Match получает 304 без выполнения основного запроса.
+"""
+import hashlib
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+# Таблицы, от которых зависит ответ ресурса
+RESOURCE_TABLES: Dict[str, Tuple[str, ...]] = {
+    'users': ('users',),
+    'announcements': ('announcements', 'users'),
+    'tasks': ('tasks', 'users'),
+    'duty-schedule': ('duty_schedule', 'users'),
+    'work-shifts': ('work_shifts', 'archived_work_shifts'),
+    'notifications': ('notifications',),
+    'logs': ('action_logs',),
+    'complaints': ('complaints',),
+    'cleanliness-scores': ('cleanliness_scores',),
+    'bootstrap': ('users', 'notifications', 'work_shifts', 'duty_schedule', 'announcements'),
+}
+
+# Политики Cache-Control: no-cache = всегда ревалидировать по ETag
+CACHE_POLICIES: Dict[str, str] = {
+    'users': 'private, no-cache',
+    'announcements': 'private, no-cache',
+    'tasks': 'private, no-cache',
+    'duty-schedule': 'private, no-cache',
+    'work-shifts': 'private, no-cache',
+    'notifications': 'private, no-cache',
+    'logs': 'private, no-cache',
+    'complaints': 'private, no-cache',
+    'cleanliness-scores': 'private, no-cache',
+    'bootstrap': 'private, no-cache',
+}
+DEFAULT_CACHE_POLICY = 'private, no-cache'
+
+# Postgres: по имени ограничения - с V0025 ключ (tenant_id, table_name), а в базах
+# без миграции - (table_name); tenant_id заполняет DEFAULT app_tenant()
+BUMP_SQL = {
+    'postgres': """INSERT INTO table_versions (table_name, version) VALUES (%s, 1)
+                   ON CONFLICT ON CONSTRAINT table_versions_pkey DO UPDATE SET version = table_versions.version + 1""",
+    'mysql': """INSERT INTO table_versions (table_name, version) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1""",
+}
+
+
+def versions_query(tables: Tuple[str, ...]) -> str:
+    """SQL reading the version counters of tables (one %s per table)"""
+    placeholders = ', '.join(['%s'] * len(tables))
+    return f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})"
+
+
+def versions_from_rows(rows: Iterable[Mapping[str, Any]], tables: Tuple[str, ...]) -> Tuple[int, ...]:
+    """Order fetched counters like tables (missing rows count as 0)"""
+    versions = {row['table_name']: row['version'] for row in rows}
+    return tuple(int(versions.get(t, 0)) for t in tables)
+
+
+def fetch_versions(cur, tables: Iterable[str]) -> Tuple[int, ...]:
+    """Read version counters for tables (missing rows count as 0)"""
+    tables = tuple(tables)
+    cur.execute(versions_query(tables), tables)
+    return versions_from_rows(cur.fetchall(), tables)
+
+
+def bump_versions(cur, *tables: str, dialect: str = 'postgres') -> None:
+    """Increment version counters; call inside the write transaction before commit"""
+    sql = BUMP_SQL[dialect]
+    for table in tables:
+        cur.execute(sql, (table,))
+
+
+def compute_etag(resource: str, versions: Tuple[int, ...], params: Optional[Mapping[str, Any]] = None,
+                 tenant: Optional[str] = None) -> str:
+    """Build a weak ETag from table versions, normalized query params and the tenant"""
+    parts = [resource, '.'.join(str(v) for v in versions)]
+    if tenant:
+        # Счётчики у каждого тенанта свои и могут совпасть
+        parts.append(f'@{tenant}')
+    if params:
+        parts.extend(f'{k}={params[k]}' for k in sorted(params) if k != 'resource')
+    digest = hashlib.blake2b('|'.join(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def resource_etag(cur, resource: str, params: Optional[Mapping[str, Any]] = None,
+                  tenant: Optional[str] = None) -> str:
+    """Compute the current ETag for a resource with one primary-key lookup"""
+    return compute_etag(resource, fetch_versions(cur, RESOURCE_TABLES[resource]), params, tenant)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against the current ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cache_headers(resource: str, etag: str) -> Dict[str, str]:
+    """Response headers for a cacheable read"""
+    return {
+        'ETag': etag,
+        'Cache-Control': CACHE_POLICIES.get(resource, DEFAULT_CACHE_POLICY),
+        # Тенант может прийти заголовком X-Tenant-Id на тот же URL
+        'Vary': 'Origin, X-Tenant-Id',
+    }
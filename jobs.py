@@ -0,0 +1,188 @@
+"""
+Очередь фоновых заданий в основной БД (таблица jobs)
+Обработчик HTTP ставит задание в той же транзакции, что и свою запись, и
+сразу отвечает 202; worker.py забирает задания FOR UPDATE SKIP LOCKED, так
+что несколько процессов никогда не берут одно задание. Упавшее задание
+повторяется с экспоненциальной задержкой до max_attempts. Пока задание с
+dedup_key ждёт или выполняется, повторная постановка возвращает его же.
+Пока обработчик работает, воркер продлевает аренду (locked_at), поэтому
+брошенным считается только задание, чей воркер перестал отвечать.
+"""
+import json
+import os
+import random
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_BACKOFF_BASE = float(os.environ.get('JOB_BACKOFF_BASE', 10))
+JOB_BACKOFF_MAX = float(os.environ.get('JOB_BACKOFF_MAX', 3600))
+# Задание, аренду которого дольше не продлевали, считается брошенным упавшим воркером
+JOB_LEASE = float(os.environ.get('JOB_LEASE', 600))
+# Как часто воркер продлевает аренду выполняемого задания
+JOB_HEARTBEAT = float(os.environ.get('JOB_HEARTBEAT', JOB_LEASE / 3))
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+JOB_COLUMNS = ('id, kind, status, priority, attempts, max_attempts, dedup_key, last_error, result, '
+               'run_at, created_at, finished_at')
+
+ENQUEUE_SQL = {
+    'postgres': """INSERT INTO jobs (kind, payload, priority, dedup_key, max_attempts) VALUES (%s, %s, %s, %s, %s)
+                   ON CONFLICT (tenant_id, dedup_key) WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running')
+                   DO NOTHING""",
+    # Уникальный ключ на вычисляемой колонке dedup_active; LAST_INSERT_ID(id) отдаёт id уже стоящего задания
+    'mysql': """INSERT INTO jobs (kind, payload, priority, dedup_key, max_attempts) VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)""",
+}
+ACTIVE_DUPLICATE_SQL = f"SELECT {JOB_COLUMNS} FROM jobs WHERE dedup_key = %s AND status IN ('queued', 'running')"
+JOB_SQL = f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = %s"
+
+CLAIM_SQL = """SELECT id, kind, payload, attempts, max_attempts FROM jobs
+               WHERE status = 'queued' AND run_at <= CURRENT_TIMESTAMP
+               ORDER BY priority DESC, run_at, id LIMIT 1 FOR UPDATE SKIP LOCKED"""
+START_SQL = """UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = CURRENT_TIMESTAMP
+               WHERE id = %s"""
+DONE_SQL = """UPDATE jobs SET status = 'done', result = %s, last_error = NULL, locked_by = NULL,
+              finished_at = CURRENT_TIMESTAMP WHERE id = %s"""
+FAILED_SQL = """UPDATE jobs SET status = 'failed', last_error = %s, locked_by = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s"""
+RENEW_SQL = """UPDATE jobs SET locked_at = CURRENT_TIMESTAMP
+               WHERE id = %s AND status = 'running' AND locked_by = %s"""
+RETRY_SQL = {
+    'postgres': """UPDATE jobs SET status = 'queued', last_error = %s, locked_by = NULL,
+                   run_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second' WHERE id = %s""",
+    'mysql': """UPDATE jobs SET status = 'queued', last_error = %s, locked_by = NULL,
+                run_at = CURRENT_TIMESTAMP + INTERVAL %s SECOND WHERE id = %s""",
+}
+RECLAIM_SQL = {
+    'postgres': """UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                   last_error = 'lease expired', locked_by = NULL,
+                   finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP ELSE finished_at END
+                   WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'""",
+    'mysql': """UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                last_error = 'lease expired', locked_by = NULL,
+                finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP ELSE finished_at END
+                WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - INTERVAL %s SECOND""",
+}
+
+JobHandler = Callable[[Any, Any, Dict[str, Any], str], Optional[Dict[str, Any]]]
+
+# kind -> handler(conn, cur, payload, dialect); заполняется в worker.py
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str):
+    """Register the handler of a job kind"""
+    def register(fn: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _json_value(value: Any) -> Any:
+    # JSONB приходит из psycopg2 разобранным, JSON из pymysql - строкой
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def _timestamp(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def enqueue_params(kind: str, payload: Optional[Dict[str, Any]] = None, priority: int = 0,
+                   dedup_key: Optional[str] = None, max_attempts: int = JOB_MAX_ATTEMPTS) -> Tuple[Any, ...]:
+    """Parameters of ENQUEUE_SQL"""
+    return kind, json.dumps(payload or {}, default=str), priority, dedup_key, max_attempts
+
+
+def enqueue(cur, kind: str, payload: Optional[Dict[str, Any]] = None, priority: int = 0,
+            dedup_key: Optional[str] = None, max_attempts: int = JOB_MAX_ATTEMPTS,
+            dialect: str = 'postgres') -> Dict[str, Any]:
+    """Queue a job in the caller's transaction; returns it (or the active job with the same dedup_key)"""
+    params = enqueue_params(kind, payload, priority, dedup_key, max_attempts)
+    if dialect == 'mysql':
+        cur.execute(ENQUEUE_SQL['mysql'], params)
+        cur.execute(JOB_SQL, (cur.lastrowid,))
+        return cur.fetchone()
+    while True:
+        cur.execute(f"{ENQUEUE_SQL['postgres']} RETURNING {JOB_COLUMNS}", params)
+        job = cur.fetchone()
+        if job is None:
+            cur.execute(ACTIVE_DUPLICATE_SQL, (dedup_key,))
+            job = cur.fetchone()
+        # Дубликат мог завершиться между INSERT и SELECT - тогда ставим заново
+        if job is not None:
+            return job
+
+
+def job_view(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Job row as the status endpoint returns it"""
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'priority': row['priority'],
+        'attempts': row['attempts'],
+        'maxAttempts': row['max_attempts'],
+        'dedupKey': row['dedup_key'],
+        'lastError': row['last_error'],
+        'result': _json_value(row['result']),
+        'runAt': _timestamp(row['run_at']),
+        'createdAt': _timestamp(row['created_at']),
+        'finishedAt': _timestamp(row['finished_at']),
+    }
+
+
+def parse_job_id(value: Optional[str]) -> Optional[int]:
+    try:
+        job_id = int(value or '')
+    except ValueError:
+        return None
+    return job_id if job_id > 0 else None
+
+
+def backoff(attempts: int) -> float:
+    """Delay before the next attempt: doubling from JOB_BACKOFF_BASE, capped, with jitter"""
+    delay = min(JOB_BACKOFF_BASE * 2 ** max(attempts - 1, 0), JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(conn, cur, worker: str) -> Optional[Dict[str, Any]]:
+    """Take the most urgent ready job and mark it running (own short transaction)"""
+    cur.execute(CLAIM_SQL)
+    job = cur.fetchone()
+    if job is None:
+        conn.rollback()
+        return None
+    cur.execute(START_SQL, (worker, job['id']))
+    conn.commit()
+    job['payload'] = _json_value(job['payload']) or {}
+    job['attempts'] += 1
+    return job
+
+
+def renew(cur, job: Dict[str, Any], worker: str) -> bool:
+    """Extend the lease of a running job; False once it is no longer ours"""
+    cur.execute(RENEW_SQL, (job['id'], worker))
+    return cur.rowcount > 0
+
+
+def finish(cur, job: Dict[str, Any], result: Optional[Dict[str, Any]]) -> None:
+    """Mark the job done; call in the handler's transaction so both commit together"""
+    cur.execute(DONE_SQL, (json.dumps(result, default=str) if result is not None else None, job['id']))
+
+
+def fail(cur, job: Dict[str, Any], error: str, dialect: str, permanent: bool = False) -> bool:
+    """Schedule a retry or give up; returns True when the job is failed for good"""
+    error = error[:2000]
+    if permanent or job['attempts'] >= job['max_attempts']:
+        cur.execute(FAILED_SQL, (error, job['id']))
+        return True
+    cur.execute(RETRY_SQL[dialect], (error, round(backoff(job['attempts']), 3), job['id']))
+    return False
+
+
+def reclaim(cur, dialect: str, lease: float = JOB_LEASE) -> int:
+    """Return jobs of crashed workers to the queue; returns their count"""
+    cur.execute(RECLAIM_SQL[dialect], (lease,))
+    return cur.rowcount
@@ -0,0 +1,218 @@
+"""
+Права пользователей: роль и должности -> набор возможностей
+Должности лежат в user_positions по одной на строку (индексы по должности
+и по пользователю), поэтому «кто занимает должность X» - один поиск по
+индексу; users.positions остаётся копией для ответов API. Набор
+возможностей компилируется один раз на сочетание роли и должностей
+(floor_N_* разбирается здесь, а не на каждой проверке) и кэшируется на
+пользователя. Смена роли или должностей увеличивает счётчик user_positions
+в table_versions в той же транзакции: кэш любого процесса видит новую
+версию и перечитывает права. authz.py берёт права отсюда без проверки
+версии, пока запись моложе AUTHZ_CACHE_TTL.
+"""
+import os
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+PERMISSION_CACHE_SIZE = int(os.environ.get('PERMISSION_CACHE_SIZE', 10000))
+
+# Счётчик версии в table_versions; меняется при смене роли или должностей
+VERSION_TABLE = 'user_positions'
+
+ROLES = ('manager', 'admin', 'moderator', 'member')
+STAFF_ROLES = frozenset(('manager', 'admin', 'moderator'))
+FLOORS = (2, 3, 4, 5)
+MAX_POSITIONS = 20
+
+_FLOOR_POSITION = re.compile(r'^floor_(\d+)_(head|cleanliness)$')
+
+# Возможности - те же проверки, что фронтенд считал у себя (canEditAnyFloor и т.д.)
+MANAGE_USERS = 'manage_users'
+EDIT_ANY_FLOOR = 'edit_any_floor'
+VIEW_LOGS = 'view_logs'
+CREATE_ANNOUNCEMENTS = 'create_announcements'
+COUNCIL_ACCESS = 'council_access'
+FLOOR_MANAGER = 'floor_manager'
+MANAGE_COUNCIL = 'manage_council'
+MANAGE_WORK_SHIFTS = 'manage_work_shifts'
+COMPLETE_WORK_SHIFTS = 'complete_work_shifts'
+
+STAFF_CAPABILITIES = frozenset((MANAGE_USERS, EDIT_ANY_FLOOR, VIEW_LOGS, CREATE_ANNOUNCEMENTS, COUNCIL_ACCESS,
+                                MANAGE_COUNCIL, MANAGE_WORK_SHIFTS, COMPLETE_WORK_SHIFTS))
+POSITION_CAPABILITIES: Dict[str, FrozenSet[str]] = {
+    'director': frozenset((EDIT_ANY_FLOOR,)),
+    'vice_director': frozenset((EDIT_ANY_FLOOR,)),
+    'cleanliness_manager': frozenset((EDIT_ANY_FLOOR,)),
+    'chairman': frozenset((EDIT_ANY_FLOOR, VIEW_LOGS, MANAGE_WORK_SHIFTS, COMPLETE_WORK_SHIFTS)),
+    'vice_chairman': frozenset((EDIT_ANY_FLOOR, VIEW_LOGS, MANAGE_WORK_SHIFTS, COMPLETE_WORK_SHIFTS)),
+    'secretary': frozenset((VIEW_LOGS, MANAGE_WORK_SHIFTS, COMPLETE_WORK_SHIFTS)),
+    'household_sector': frozenset((COMPLETE_WORK_SHIFTS,)),
+    'media_sector': frozenset((CREATE_ANNOUNCEMENTS,)),
+    'sports_sector': frozenset((CREATE_ANNOUNCEMENTS,)),
+    'cultural_sector': frozenset((CREATE_ANNOUNCEMENTS,)),
+    'duty_sector': frozenset((CREATE_ANNOUNCEMENTS,)),
+}
+FLOOR_CAPABILITIES = frozenset((CREATE_ANNOUNCEMENTS, FLOOR_MANAGER))
+
+VERSION_SQL = "SELECT version FROM table_versions WHERE table_name = %s"
+GRANTS_SQL = """SELECT u.role, p.position FROM users u
+                LEFT JOIN user_positions p ON p.user_id = u.id
+                WHERE u.id = %s"""
+HOLDERS_SQL = """SELECT u.id, u.name, u.room, u.role FROM user_positions p
+                 JOIN users u ON u.id = p.user_id
+                 WHERE p.position = %s ORDER BY u.name"""
+DELETE_POSITIONS_SQL = "DELETE FROM user_positions WHERE user_id = %s"
+INSERT_POSITION_SQL = "INSERT INTO user_positions (user_id, position, floor) VALUES (%s, %s, %s)"
+
+
+def position_floor(position: str) -> Optional[int]:
+    """Floor of a floor_N_head / floor_N_cleanliness position"""
+    match = _FLOOR_POSITION.match(position)
+    return int(match.group(1)) if match else None
+
+
+def normalize_positions(value: Any) -> List[str]:
+    """Deduplicated position names; raises ValueError with a client-facing message"""
+    if not isinstance(value, list) or len(value) > MAX_POSITIONS:
+        raise ValueError(f'Positions must be an array of at most {MAX_POSITIONS} items')
+    positions = []
+    for item in value:
+        if not isinstance(item, str) or not item.strip() or len(item) > 100:
+            raise ValueError('Positions must be non-empty strings')
+        if item.strip() not in positions:
+            positions.append(item.strip())
+    return positions
+
+
+class Capabilities:
+    """Compiled permissions of one role and position set; shared between users"""
+
+    __slots__ = ('role', 'positions', 'capabilities', 'floors')
+
+    def __init__(self, role: str, positions: FrozenSet[str], capabilities: FrozenSet[str], floors: FrozenSet[int]):
+        self.role = role
+        self.positions = positions
+        self.capabilities = capabilities
+        self.floors = floors
+
+    def can(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    def can_edit_floor(self, floor: int) -> bool:
+        return EDIT_ANY_FLOOR in self.capabilities or floor in self.floors
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'role': self.role,
+            'positions': sorted(self.positions),
+            'capabilities': sorted(self.capabilities),
+            'floors': list(FLOORS) if EDIT_ANY_FLOOR in self.capabilities else sorted(self.floors),
+        }
+
+
+@lru_cache(maxsize=1024)
+def compile_capabilities(role: str, positions: FrozenSet[str]) -> Capabilities:
+    """Capabilities of a role and position set (memoized: few distinct combinations exist)"""
+    capabilities = set(STAFF_CAPABILITIES if role in STAFF_ROLES else ())
+    floors = set()
+    for position in positions:
+        capabilities |= POSITION_CAPABILITIES.get(position, frozenset())
+        floor = position_floor(position)
+        if floor is not None:
+            capabilities |= FLOOR_CAPABILITIES
+            floors.add(floor)
+    if positions:
+        capabilities.add(COUNCIL_ACCESS)
+    return Capabilities(role, positions, frozenset(capabilities), frozenset(floors))
+
+
+def grants_from_rows(rows: Sequence[Mapping[str, Any]]) -> Optional[Capabilities]:
+    """Capabilities from GRANTS_SQL rows; None for an unknown user"""
+    if not rows:
+        return None
+    return compile_capabilities(rows[0]['role'], frozenset(row['position'] for row in rows if row['position']))
+
+
+def version_from_row(row: Optional[Mapping[str, Any]]) -> int:
+    return int(row['version']) if row else 0
+
+
+class PermissionCache:
+    """LRU of (tenant, user) -> capabilities, valid while the user_positions version is unchanged"""
+
+    def __init__(self, max_size: int = PERMISSION_CACHE_SIZE):
+        self.max_size = max_size
+        # (версия, права, когда версия последний раз сверялась с БД)
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[int, Capabilities, float]]' = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, user_id: str, version: int, tenant: str = 'default') -> Optional[Capabilities]:
+        key = (tenant, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries[key] = (version, entry[1], monotonic())
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def recent(self, user_id: str, max_age: float, tenant: str = 'default') -> Optional[Capabilities]:
+        """Entry checked against the version less than max_age seconds ago, without reading the version"""
+        # Без блокировки: чтение словаря атомарно, порядок LRU обновит get() после max_age
+        entry = self._entries.get((tenant, user_id))
+        if entry is None or monotonic() - entry[2] >= max_age:
+            return None
+        return entry[1]
+
+    def put(self, user_id: str, version: int, capabilities: Capabilities, tenant: str = 'default') -> None:
+        key = (tenant, user_id)
+        with self._lock:
+            self._entries[key] = (version, capabilities, monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[str] = None, tenant: str = 'default') -> None:
+        """Drop one user's entry, or the whole tenant's"""
+        with self._lock:
+            if user_id is not None:
+                self._entries.pop((tenant, user_id), None)
+            else:
+                for key in [k for k in self._entries if k[0] == tenant]:
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+permission_cache = PermissionCache()
+
+
+def resolve(cur, user_id: str, tenant: str = 'default', cache: PermissionCache = permission_cache) -> Optional[Capabilities]:
+    """Capabilities of a user: one version read on a hit, plus one indexed join on a miss"""
+    cur.execute(VERSION_SQL, (VERSION_TABLE,))
+    version = version_from_row(cur.fetchone())
+    capabilities = cache.get(user_id, version, tenant)
+    if capabilities is None:
+        cur.execute(GRANTS_SQL, (user_id,))
+        capabilities = grants_from_rows(cur.fetchall())
+        if capabilities is not None:
+            cache.put(user_id, version, capabilities, tenant)
+    return capabilities
+
+
+def position_rows(user_id: str, positions: Iterable[str]) -> List[Tuple[str, str, Optional[int]]]:
+    """(user_id, position, floor) rows for INSERT_POSITION_SQL"""
+    return [(user_id, position, position_floor(position)) for position in positions]
+
+
+def replace_positions(cur, user_id: str, positions: Iterable[str]) -> None:
+    """Rewrite a user's rows in user_positions; call in the transaction that updates users"""
+    cur.execute(DELETE_POSITIONS_SQL, (user_id,))
+    rows = position_rows(user_id, positions)
+    if rows:
+        cur.executemany(INSERT_POSITION_SQL, rows)
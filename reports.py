@@ -0,0 +1,271 @@
+"""
+Семестровые отчёты для администрации (CSV и XLSX)
+Отчёт читается курсором на стороне сервера пачками по REPORT_BATCH строк,
+каждая пачка форматируется и сразу уходит клиенту, так что память не
+растёт с размером отчёта. Форматирование пачек (экранирование, XML листа)
+выполняется в пуле процессов REPORT_PROCESSES, чтобы не занимать event loop.
+XLSX пишется потоковым zip без сторонних библиотек: один лист, строки inline.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from duty_calendar import FilterError, parse_day
+
+REPORT_BATCH = int(os.environ.get('REPORT_BATCH', 1000))
+REPORT_PROCESSES = int(os.environ.get('REPORT_PROCESSES', 2))
+REPORT_MAX_DAYS = 400
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class Report:
+    """Named query with spreadsheet columns; params(start, end) binds the period [start, end)"""
+
+    __slots__ = ('name', 'title', 'columns', 'sql', 'timestamps')
+
+    def __init__(self, name: str, title: str, columns: Sequence[Tuple[str, str]], sql: str, timestamps: bool = True):
+        self.name = name
+        self.title = title
+        self.columns = tuple(columns)
+        self.sql = sql
+        # Период сравнивается с TIMESTAMP (datetime) или с DATE (date) - asyncpg не приводит типы сам
+        self.timestamps = timestamps
+
+    def params(self, start: date, end: date) -> Tuple[Any, ...]:
+        bounds = (datetime.combine(start, time()), datetime.combine(end, time())) if self.timestamps else (start, end)
+        # Каждый подзапрос ограничен периодом: пара (начало, конец) на каждый
+        return bounds * (self.sql.count('%s') // 2)
+
+    def header(self) -> Tuple[str, ...]:
+        return tuple(title for _, title in self.columns)
+
+    def row(self, record: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(record[key] for key, _ in self.columns)
+
+
+REPORTS = {report.name: report for report in (
+    Report('work-shifts', 'Отработки по жильцам', (
+        ('name', 'Жилец'), ('room', 'Комната'), ('shifts', 'Отработок'), ('days_assigned', 'Назначено дней'),
+        ('days_completed', 'Отработано дней'), ('days_owed', 'Осталось дней'), ('days_archived', 'В архиве дней'),
+    ), """
+        SELECT u.name, u.room, COALESCE(a.shifts, 0) AS shifts, COALESCE(a.assigned, 0) AS days_assigned,
+               COALESCE(a.completed, 0) AS days_completed,
+               COALESCE(a.assigned, 0) - COALESCE(a.completed, 0) AS days_owed, COALESCE(h.days, 0) AS days_archived
+        FROM users u
+        LEFT JOIN (SELECT user_id, COUNT(*) AS shifts, SUM(days) AS assigned,
+                          SUM(COALESCE(completed_days, 0)) AS completed
+                   FROM work_shifts WHERE is_archived = FALSE AND assigned_at >= %s AND assigned_at < %s
+                   GROUP BY user_id) a ON a.user_id = u.id
+        LEFT JOIN (SELECT user_id, SUM(days) AS days FROM archived_work_shifts
+                   WHERE archived_at >= %s AND archived_at < %s GROUP BY user_id) h ON h.user_id = u.id
+        WHERE a.user_id IS NOT NULL OR h.user_id IS NOT NULL
+        ORDER BY u.room, u.name
+    """),
+    Report('archive', 'Архив отработок', (
+        ('user_name', 'Жилец'), ('days', 'Дней'), ('reason', 'Причина'), ('assigned_by_name', 'Назначил'),
+        ('assigned_at', 'Назначено'), ('archived_at', 'В архиве с'),
+    ), """
+        SELECT user_name, days, reason, assigned_by_name, assigned_at, archived_at FROM archived_work_shifts
+        WHERE archived_at >= %s AND archived_at < %s
+        ORDER BY archived_at, id
+    """),
+    Report('duty-compliance', 'Выполнение дежурств', (
+        ('name', 'Жилец'), ('room', 'Комната'), ('duties', 'Дежурств'), ('completed', 'Выполнено'),
+        ('missed', 'Пропущено'), ('pending', 'Ожидает'), ('compliance', 'Выполнение, %'),
+    ), """
+        SELECT u.name, u.room, COUNT(*) AS duties,
+               SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) AS completed,
+               SUM(CASE WHEN d.status = 'missed' THEN 1 ELSE 0 END) AS missed,
+               SUM(CASE WHEN d.status = 'pending' THEN 1 ELSE 0 END) AS pending,
+               ROUND(100.0 * SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END)
+                     / NULLIF(SUM(CASE WHEN d.status IN ('completed', 'missed') THEN 1 ELSE 0 END), 0), 1) AS compliance
+        FROM duty_schedule d JOIN users u ON u.id = d.user_id
+        WHERE d.date >= %s AND d.date < %s
+        GROUP BY u.id, u.name, u.room
+        ORDER BY u.room, u.name
+    """, timestamps=False),
+)}
+
+
+def semester(today: date) -> Tuple[date, date]:
+    """Semester containing today as [start, end): spring Feb 1 - Jul 1, autumn Jul 1 - Feb 1"""
+    spring, autumn = date(today.year, 2, 1), date(today.year, 7, 1)
+    if today < spring:
+        return date(today.year - 1, 7, 1), spring
+    return (spring, autumn) if today < autumn else (autumn, date(today.year + 1, 2, 1))
+
+
+def parse_report_request(args: Dict[str, str], today: Optional[date] = None) -> Tuple[Report, str, date, date]:
+    """report, format and the period [start, end); 'to' is inclusive in the query string"""
+    report = REPORTS.get(args.get('report', ''))
+    if report is None:
+        raise FilterError(f"report must be one of: {', '.join(REPORTS)}")
+    fmt = args.get('format', 'csv')
+    if fmt not in FORMATS:
+        raise FilterError(f"format must be one of: {', '.join(FORMATS)}")
+    start, end = semester(today or date.today())
+    if args.get('from'):
+        start = parse_day(args['from'], 'from')
+    if args.get('to'):
+        end = parse_day(args['to'], 'to') + timedelta(days=1)
+    if end <= start:
+        raise FilterError('to must not be earlier than from')
+    if (end - start).days > REPORT_MAX_DAYS:
+        raise FilterError(f'Report period is limited to {REPORT_MAX_DAYS} days')
+    return report, fmt, start, end
+
+
+def filename(report: Report, fmt: str, start: date, end: date) -> str:
+    return f'{report.name}_{start.isoformat()}_{(end - timedelta(days=1)).isoformat()}.{fmt}'
+
+
+# ============= FORMATTING (runs in the process pool) =============
+
+# Формулы в ячейках из пользовательского текста (причина, имя) не исполняются
+_FORMULA_START = ('=', '+', '-', '@', '\t', '\r')
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='minutes')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return "'" + value if value.startswith(_FORMULA_START) else value
+    return value if isinstance(value, (int, float, Decimal)) else _text(value)
+
+
+def _xlsx_cell(value: Any) -> str:
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', _text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def render_rows(fmt: str, rows: List[Tuple[Any, ...]]) -> bytes:
+    """CSV lines or sheet <row> elements for a batch of rows"""
+    if fmt == 'csv':
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\r\n')
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        return out.getvalue().encode('utf-8')
+    return ''.join('<row>' + ''.join(_xlsx_cell(v) for v in row) + '</row>' for row in rows).encode('utf-8')
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def formatter_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool (None with REPORT_PROCESSES=0: batches are formatted in a thread)"""
+    global _pool
+    if _pool is None and REPORT_PROCESSES > 0:
+        # spawn: дочерние процессы не наследуют соединения и event loop родителя
+        _pool = ProcessPoolExecutor(REPORT_PROCESSES, mp_context=get_context('spawn'))
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ============= XLSX CONTAINER =============
+
+_XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/></Relationships>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/></Relationships>'),
+)
+_WORKBOOK = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+             'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+             '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+_SHEET_HEAD = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = b'</sheetData></worksheet>'
+
+
+class _Sink:
+    """Write-only target for ZipFile: collects output until it is taken"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class XlsxStream:
+    """Single-sheet workbook produced as zip bytes while rows arrive (the zip is never held whole)"""
+
+    def __init__(self, sheet_name: str):
+        self._sink = _Sink()
+        # Поток без seek: zipfile пишет размеры записей в дескрипторы данных
+        self._zip = zipfile.ZipFile(self._sink, 'w', zipfile.ZIP_DEFLATED)
+        for name, xml in _XLSX_PARTS:
+            self._zip.writestr(name, xml)
+        self._zip.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})))
+        self._sheet = self._zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._sheet.write(_SHEET_HEAD)
+
+    def write(self, rows_xml: bytes) -> bytes:
+        """Compress sheet rows; returns zip bytes ready to send"""
+        self._sheet.write(rows_xml)
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._sheet.write(_SHEET_TAIL)
+        self._sheet.close()
+        self._zip.close()
+        return self._sink.take()
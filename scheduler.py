@@ -0,0 +1,345 @@
+"""
+Периодические задачи по расписанию cron
+Планировщик работает потоком внутри воркеров gunicorn (SCHEDULER_ENABLED=1)
+или отдельным процессом. Экземпляров может быть много: лидером становится
+тот, кто взял блокировку БД (pg_try_advisory_lock / GET_LOCK) на своём
+соединении, остальные ждут, пока оно не оборвётся. Лидер только ставит
+задания в очередь (jobs.py) для каждого тенанта, выполняет их worker.py.
+
+Последний отработанный слот каждого расписания хранится в schedule_state:
+пропущенные за время простоя слоты догоняются одним запуском. Запуск
+сдвигается на детерминированную случайную задержку (jitter), одинаковую
+для всех экземпляров.
+
+Запуск:
+    python scheduler.py            # Postgres
+    python scheduler.py --mysql    # MySQL
+    python scheduler.py --once     # один такт, если этот процесс - лидер (cron)
+"""
+import argparse
+import hashlib
+import logging
+import os
+import random
+import signal
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from instrumentation import registry
+from jobs import enqueue
+from tenancy import DEFAULT_TENANT, TenantConfig
+from worker import TenantConnections
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '').lower() in ('1', 'true', 'yes')
+SCHEDULER_TICK = float(os.environ.get('SCHEDULER_TICK', 30))
+SCHEDULER_JITTER = float(os.environ.get('SCHEDULER_JITTER', 60))
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 180))
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+
+SCHEDULER_LOCK = 'dormitory.scheduler'
+
+SCHEDULER_LEADER = registry.gauge('scheduler_leader', '1 while this process holds the scheduler lock')
+SCHEDULER_RUNS = registry.counter(
+    'scheduler_runs_total', 'Scheduled runs: enqueued, caught_up (after missed slots) or error', ('schedule', 'outcome'))
+SCHEDULER_LAST_RUN = registry.gauge(
+    'scheduler_last_run_timestamp_seconds', 'Unix time of the latest run', ('schedule',))
+SCHEDULER_DELAY = registry.gauge(
+    'scheduler_run_delay_seconds', 'How long after its slot the latest run started', ('schedule',))
+
+logger = logging.getLogger('dormitory.scheduler')
+
+# Ключ pg_try_advisory_lock - bigint; блокировки MySQL именованные и общие на сервер
+LOCK_SQL = {
+    'postgres': "SELECT pg_try_advisory_lock(%s) AS locked",
+    'mysql': "SELECT GET_LOCK(%s, 0) AS locked",
+}
+STATE_SQL = "SELECT name, last_slot FROM schedule_state"
+FIRST_SIGHT_SQL = {
+    'postgres': "INSERT INTO schedule_state (name, last_slot) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING",
+    'mysql': "INSERT IGNORE INTO schedule_state (name, last_slot) VALUES (%s, %s)",
+}
+RECORD_SQL = """UPDATE schedule_state SET last_slot = %s, last_run_at = CURRENT_TIMESTAMP, runs = runs + 1,
+                last_error = %s WHERE name = %s"""
+
+
+def lock_key(dialect: str) -> Any:
+    if dialect == 'mysql':
+        return f"{os.environ.get('MYSQL_DATABASE', 'dormitory_portal')}.{SCHEDULER_LOCK}"
+    return int.from_bytes(hashlib.blake2b(SCHEDULER_LOCK.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+# ============= CRON =============
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+}
+# (минимум, максимум): минута, час, день месяца, месяц, день недели (0 и 7 - воскресенье)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _cron_field(text: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for part in text.split(','):
+        span, slash, step_text = part.partition('/')
+        step = int(step_text) if slash else 1
+        if span == '*':
+            start, end = low, high
+        elif '-' in span:
+            start, end = (int(v) for v in span.split('-', 1))
+        else:
+            start = int(span)
+            end = high if slash else start
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f'Cron field out of range: {part!r}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class Cron:
+    """Five-field cron expression (minute hour day month weekday) with * , - / and @aliases"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+        try:
+            minutes, hours, days, months, weekdays = (
+                _cron_field(text, low, high) for text, (low, high) in zip(fields, CRON_FIELDS))
+        except ValueError as e:
+            raise ValueError(f'Invalid cron expression {expression!r}: {e}') from None
+        self.minutes = sorted(minutes, reverse=True)
+        self.hours = sorted(hours, reverse=True)
+        self.days = days
+        self.months = months
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        # Как в cron: если заданы и день месяца, и день недели, подходит любой из них
+        self.any_day = fields[2] != '*' and fields[4] != '*'
+
+    def matches_day(self, day: date) -> bool:
+        if day.month not in self.months:
+            return False
+        by_date = day.day in self.days
+        by_weekday = (day.weekday() + 1) % 7 in self.weekdays
+        return by_date or by_weekday if self.any_day else by_date and by_weekday
+
+    def previous(self, moment: datetime) -> Optional[datetime]:
+        """Latest slot at or before moment (None if there is none within 5 years)"""
+        moment = moment.replace(second=0, microsecond=0)
+        day = moment.date()
+        for _ in range(366 * 5):
+            if self.matches_day(day):
+                limit = moment.time() if day == moment.date() else time(23, 59)
+                for hour in self.hours:
+                    if hour > limit.hour:
+                        continue
+                    for minute in self.minutes:
+                        if hour < limit.hour or minute <= limit.minute:
+                            return datetime.combine(day, time(hour, minute))
+            day -= timedelta(days=1)
+        return None
+
+
+# ============= SCHEDULES =============
+
+class Schedule:
+    """Job kind queued for every tenant on a cron schedule"""
+
+    __slots__ = ('name', 'cron', 'kind', 'payload', 'jitter', 'dialects')
+
+    def __init__(self, name: str, cron: str, kind: str, payload: Optional[Dict[str, Any]] = None,
+                 jitter: float = SCHEDULER_JITTER, dialects: Iterable[str] = ('postgres', 'mysql')):
+        self.name = name
+        self.cron = Cron(cron)
+        self.kind = kind
+        self.payload = payload or {}
+        self.jitter = jitter
+        self.dialects = frozenset(dialects)
+
+    def due_at(self, slot: datetime) -> datetime:
+        # Задержка зависит только от слота: новый лидер ждёт того же момента
+        offset = random.Random(f'{self.name}:{slot.isoformat()}').uniform(0, self.jitter)
+        return slot + timedelta(seconds=offset)
+
+
+SCHEDULES = (
+    Schedule('action_logs_retention', '30 3 * * *', 'cleanup_action_logs', {'olderThanDays': LOG_RETENTION_DAYS}),
+    Schedule('notifications_retention', '45 3 * * *', 'cleanup_notifications',
+             {'olderThanDays': NOTIFICATION_RETENTION_DAYS}),
+    # Конец семестра: 1 февраля и 1 июля
+    Schedule('semester_shift_archive', '0 4 1 2,7 *', 'archive_work_shifts'),
+    # complaint_counts (V0021) есть только в Postgres
+    Schedule('complaint_counts_refresh', '15 * * * *', 'refresh_complaint_counts', dialects=('postgres',)),
+)
+
+
+def load_schedules(dialect: str, schedules: Iterable[Schedule] = SCHEDULES) -> List[Schedule]:
+    """Schedules for a dialect; SCHEDULE_<NAME> replaces the cron expression or disables one with 'off'"""
+    result = []
+    for schedule in schedules:
+        override = os.environ.get(f'SCHEDULE_{schedule.name.upper()}', '').strip()
+        if dialect not in schedule.dialects or override.lower() == 'off':
+            continue
+        if override:
+            schedule = Schedule(schedule.name, override, schedule.kind, schedule.payload, schedule.jitter,
+                                schedule.dialects)
+        result.append(schedule)
+    return result
+
+
+def _as_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+# ============= SCHEDULER =============
+
+class Scheduler:
+    """Leader-elected loop that queues due schedules"""
+
+    def __init__(self, dialect: str, tenant_config: TenantConfig, schedules: Optional[List[Schedule]] = None):
+        self.dialect = dialect
+        self.tenant_config = tenant_config
+        self.schedules = load_schedules(dialect) if schedules is None else schedules
+        self.connections = TenantConnections(dialect, tenant_config)
+        self.leader = False
+        self.stopping = threading.Event()
+
+    def lead(self) -> bool:
+        """Take (or confirm) leadership; the lock lives as long as the default tenant's connection"""
+        try:
+            conn = self.connections.get(DEFAULT_TENANT)
+            cur = conn.cursor()
+            if self.leader:
+                cur.execute("SELECT 1")
+            else:
+                cur.execute(LOCK_SQL[self.dialect], (lock_key(self.dialect),))
+                self.leader = bool(cur.fetchone()['locked'])
+                if self.leader:
+                    logger.info('scheduler lock acquired')
+            cur.close()
+            conn.commit()
+        except Exception:
+            logger.exception('scheduler lock check failed')
+            # Сервер снимает блокировку вместе с соединением
+            self.connections.drop(DEFAULT_TENANT)
+            self.leader = False
+        SCHEDULER_LEADER.set(value=1 if self.leader else 0)
+        return self.leader
+
+    def enqueue_all(self, schedule: Schedule) -> Optional[str]:
+        """Queue the schedule's job for every tenant; returns the first error"""
+        error = None
+        for tenant in sorted(self.tenant_config.tenants):
+            conn = None
+            try:
+                conn = self.connections.get(tenant)
+                cur = conn.cursor()
+                # Незавершённый запуск прошлого слота не дублируется
+                enqueue(cur, schedule.kind, schedule.payload, dedup_key=f'schedule:{schedule.name}',
+                        dialect=self.dialect)
+                cur.close()
+                conn.commit()
+            except Exception as e:
+                logger.exception('%s: could not queue %s', tenant, schedule.name)
+                error = error or f'{tenant}: {e}'
+                if tenant != DEFAULT_TENANT:
+                    self.connections.drop(tenant)
+                elif conn is not None:
+                    conn.rollback()
+        return error
+
+    def tick(self, now: Optional[datetime] = None) -> List[Tuple[str, str]]:
+        """Queue every schedule whose slot is due; returns (schedule, outcome) pairs"""
+        now = now or datetime.now()
+        conn = self.connections.get(DEFAULT_TENANT)
+        cur = conn.cursor()
+        cur.execute(STATE_SQL)
+        state = {row['name']: _as_datetime(row['last_slot']) for row in cur.fetchall()}
+        conn.commit()
+
+        runs = []
+        for schedule in self.schedules:
+            slot = schedule.cron.previous(now)
+            if slot is None:
+                continue
+            last = state.get(schedule.name)
+            if last is None:
+                # Новое расписание начинает со следующего слота, а не с запуска при старте
+                cur.execute(FIRST_SIGHT_SQL[self.dialect], (schedule.name, slot))
+                conn.commit()
+                continue
+            if slot <= last or now < schedule.due_at(slot):
+                continue
+
+            missed = schedule.cron.previous(slot - timedelta(minutes=1))
+            error = self.enqueue_all(schedule)
+            cur.execute(RECORD_SQL, (slot, error, schedule.name))
+            conn.commit()
+
+            outcome = 'error' if error else 'caught_up' if missed is not None and missed > last else 'enqueued'
+            SCHEDULER_RUNS.inc(schedule.name, outcome)
+            SCHEDULER_LAST_RUN.set(schedule.name, value=now.timestamp())
+            SCHEDULER_DELAY.set(schedule.name, value=(now - slot).total_seconds())
+            logger.info('%s: slot %s %s', schedule.name, slot.isoformat(), outcome)
+            runs.append((schedule.name, outcome))
+        cur.close()
+        return runs
+
+    def run_once(self) -> List[Tuple[str, str]]:
+        if not self.lead():
+            return []
+        try:
+            return self.tick()
+        except Exception:
+            logger.exception('scheduler tick failed')
+            self.connections.drop(DEFAULT_TENANT)
+            self.leader = False
+            return []
+
+    def run(self, interval: float = SCHEDULER_TICK) -> None:
+        logger.info('scheduler started (%s): %s', self.dialect, ', '.join(s.name for s in self.schedules) or 'no schedules')
+        while not self.stopping.is_set():
+            self.run_once()
+            self.stopping.wait(interval)
+        self.connections.close()
+        SCHEDULER_LEADER.set(value=0)
+        logger.info('scheduler stopped')
+
+    def stop(self, *_) -> None:
+        self.stopping.set()
+
+
+def start_background(dialect: str, tenant_config: TenantConfig) -> Optional[Scheduler]:
+    """Run the scheduler in a daemon thread of a web worker when SCHEDULER_ENABLED is set"""
+    if not SCHEDULER_ENABLED:
+        return None
+    scheduler = Scheduler(dialect, tenant_config)
+    threading.Thread(target=scheduler.run, name='scheduler', daemon=True).start()
+    return scheduler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mysql', action='store_true', help='use the MySQL database of app_mysql.py')
+    parser.add_argument('--once', action='store_true', help='run one tick if this process wins the lock, then exit')
+    parser.add_argument('--interval', type=float, default=SCHEDULER_TICK, help='seconds between ticks')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    scheduler = Scheduler('mysql' if args.mysql else 'postgres', TenantConfig.from_env())
+    if args.once:
+        logger.info('runs: %s', scheduler.run_once())
+        scheduler.connections.close()
+        return
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run(args.interval)
+
+
+if __name__ == '__main__':
+    main()
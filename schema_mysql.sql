@@ -34,9 +34,15 @@ CREATE TABLE announcements (
     title VARCHAR(500) NOT NULL,
     content TEXT NOT NULL,
     author_id VARCHAR(255) NOT NULL,
-    created_at DATETIME DEFAULT NULL,
+    category VARCHAR(100) DEFAULT NULL,
+    priority VARCHAR(50) NOT NULL DEFAULT 'normal',
+    is_pinned TINYINT(1) NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT NULL,
     PRIMARY KEY (id),
-    KEY idx_announcements_created_at (created_at),
+    KEY idx_announcements_pinned (is_pinned, created_at),
+    KEY idx_announcements_feed (created_at, id),
+    KEY idx_announcements_category_feed (category, created_at, id),
     KEY idx_announcements_author (author_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 
@@ -52,8 +58,9 @@ CREATE TABLE tasks (
     created_at DATETIME DEFAULT NULL,
     updated_at DATETIME DEFAULT NULL,
     PRIMARY KEY (id),
-    KEY idx_tasks_status (status),
-    KEY idx_tasks_assigned_to (assigned_to),
+    KEY idx_tasks_assigned_status (assigned_to, status),
+    KEY idx_tasks_status_due_date (status, due_date),
+    KEY idx_tasks_status_created_at (status, created_at),
     KEY idx_tasks_due_date (due_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 
@@ -66,11 +73,73 @@ CREATE TABLE duty_schedule (
     status VARCHAR(50) NOT NULL DEFAULT 'pending',
     created_at DATETIME DEFAULT NULL,
     PRIMARY KEY (id),
-    KEY idx_duty_schedule_date (date),
-    KEY idx_duty_schedule_user_id (user_id),
+    KEY idx_duty_schedule_date_zone (date, zone),
+    KEY idx_duty_schedule_user_date (user_id, date),
     KEY idx_duty_schedule_status (status)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 
+-- Счётчики версий таблиц (ETag для условных GET-запросов)
+CREATE TABLE table_versions (
+    table_name VARCHAR(100) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Очередь фоновых заданий (jobs.py, worker.py); SKIP LOCKED требует MySQL 8.0+
+CREATE TABLE jobs (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    kind VARCHAR(100) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    priority INT NOT NULL DEFAULT 0,
+    dedup_key VARCHAR(255) DEFAULT NULL,
+    -- Частичных индексов нет: ключ дедупликации уникален, пока задание не завершено
+    dedup_active VARCHAR(255) AS (IF(status IN ('queued', 'running'), dedup_key, NULL)) STORED,
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(255) DEFAULT NULL,
+    locked_at DATETIME DEFAULT NULL,
+    last_error TEXT,
+    result TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME DEFAULT NULL,
+    PRIMARY KEY (id),
+    UNIQUE KEY uq_jobs_dedup_active (dedup_active),
+    KEY idx_jobs_ready (status, priority, run_at, id),
+    KEY idx_jobs_running (status, locked_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Последние слоты периодических расписаний (scheduler.py)
+CREATE TABLE schedule_state (
+    name VARCHAR(100) NOT NULL,
+    last_slot DATETIME NOT NULL,
+    last_run_at DATETIME DEFAULT NULL,
+    runs BIGINT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    PRIMARY KEY (name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Должности пользователей по одной на строку (permissions.py); users.positions - копия для ответов API
+CREATE TABLE user_positions (
+    user_id VARCHAR(255) NOT NULL,
+    position VARCHAR(100) NOT NULL,
+    floor SMALLINT DEFAULT NULL,
+    assigned_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, position),
+    KEY idx_user_positions_position (position, user_id),
+    KEY idx_user_positions_floor (floor),
+    CONSTRAINT fk_user_positions_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Перенос должностей уже существующих пользователей (MySQL 8.0+, один раз):
+-- INSERT IGNORE INTO user_positions (user_id, position, floor)
+-- SELECT u.id, p.position, IF(p.position REGEXP '^floor_[0-9]+_(head|cleanliness)$',
+--                             CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(p.position, '_', 2), '_', -1) AS UNSIGNED), NULL)
+-- FROM users u, JSON_TABLE(IF(JSON_VALID(u.positions), u.positions, '[]'), '$[*]'
+--                          COLUMNS (position VARCHAR(100) PATH '$')) p
+-- WHERE p.position <> '';
+
 -- Пример создания тестового администратора
 -- Пароль: admin123 (хеш SHA256)
 -- Раскомментируйте и выполните после создания таблиц:
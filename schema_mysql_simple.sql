@@ -25,12 +25,18 @@ CREATE TABLE announcements (
     title VARCHAR(500) NOT NULL,
     content TEXT NOT NULL,
     author_id VARCHAR(255) NOT NULL,
-    created_at DATETIME,
+    category VARCHAR(100),
+    priority VARCHAR(50) NOT NULL DEFAULT 'normal',
+    is_pinned TINYINT(1) NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME,
     PRIMARY KEY (id)
 );
 
--- Индекс для даты объявлений
-CREATE INDEX idx_announcements_created_at ON announcements(created_at);
+-- Индексы ленты объявлений: закреплённые и keyset по (created_at, id)
+CREATE INDEX idx_announcements_pinned ON announcements(is_pinned, created_at);
+CREATE INDEX idx_announcements_feed ON announcements(created_at, id);
+CREATE INDEX idx_announcements_category_feed ON announcements(category, created_at, id);
 
 -- Таблица 3: Задачи
 CREATE TABLE tasks (
@@ -47,8 +53,9 @@ CREATE TABLE tasks (
 );
 
 -- Индексы для задач
-CREATE INDEX idx_tasks_status ON tasks(status);
-CREATE INDEX idx_tasks_assigned_to ON tasks(assigned_to);
+CREATE INDEX idx_tasks_assigned_status ON tasks(assigned_to, status);
+CREATE INDEX idx_tasks_status_due_date ON tasks(status, due_date);
+CREATE INDEX idx_tasks_status_created_at ON tasks(status, created_at);
 
 -- Таблица 4: Дежурства
 CREATE TABLE duty_schedule (
@@ -62,5 +69,62 @@ CREATE TABLE duty_schedule (
 );
 
 -- Индексы для дежурств
-CREATE INDEX idx_duty_schedule_date ON duty_schedule(date);
-CREATE INDEX idx_duty_schedule_user_id ON duty_schedule(user_id);
+CREATE INDEX idx_duty_schedule_date_zone ON duty_schedule(date, zone);
+CREATE INDEX idx_duty_schedule_user_date ON duty_schedule(user_id, date);
+
+-- Таблица 5: Версии таблиц (ETag)
+CREATE TABLE table_versions (
+    table_name VARCHAR(100) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name)
+);
+
+-- Таблица 6: Фоновые задания (MySQL 8.0+)
+CREATE TABLE jobs (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    kind VARCHAR(100) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    priority INT NOT NULL DEFAULT 0,
+    dedup_key VARCHAR(255),
+    dedup_active VARCHAR(255) AS (IF(status IN ('queued', 'running'), dedup_key, NULL)) STORED,
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(255),
+    locked_at DATETIME,
+    last_error TEXT,
+    result TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME,
+    PRIMARY KEY (id)
+);
+
+-- Индексы для заданий
+CREATE UNIQUE INDEX uq_jobs_dedup_active ON jobs(dedup_active);
+CREATE INDEX idx_jobs_ready ON jobs(status, priority, run_at, id);
+CREATE INDEX idx_jobs_running ON jobs(status, locked_at);
+
+-- Таблица 7: Состояние расписаний
+CREATE TABLE schedule_state (
+    name VARCHAR(100) NOT NULL,
+    last_slot DATETIME NOT NULL,
+    last_run_at DATETIME,
+    runs BIGINT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    PRIMARY KEY (name)
+);
+
+-- Таблица 8: Должности пользователей
+CREATE TABLE user_positions (
+    user_id VARCHAR(255) NOT NULL,
+    position VARCHAR(100) NOT NULL,
+    floor SMALLINT,
+    assigned_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, position),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+-- Индексы для должностей
+CREATE INDEX idx_user_positions_position ON user_positions(position, user_id);
+CREATE INDEX idx_user_positions_floor ON user_positions(floor);
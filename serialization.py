@@ -0,0 +1,110 @@
+"""
+Сериализация ответов API
+Быстрое кодирование строк БД в JSON: ключи snake_case -> camelCase считаются
+один раз на набор колонок запроса, orjson используется если установлен
+"""
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+@lru_cache(maxsize=1024)
+def snake_to_camel(snake_str: str) -> str:
+    """Convert snake_case to camelCase (memoized per column name)"""
+    components = snake_str.split('_')
+    return components[0] + ''.join(x.title() for x in components[1:])
+
+
+@lru_cache(maxsize=256)
+def _camel_keys(columns: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(snake_to_camel(c) for c in columns)
+
+
+def column_names(description: Sequence[Any]) -> Tuple[str, ...]:
+    """Extract column names from a DB-API cursor description"""
+    return tuple(col[0] for col in description)
+
+
+def key_map(description: Sequence[Any]) -> Tuple[str, ...]:
+    """Return camelCase keys for a cursor description, computed once per column set"""
+    return _camel_keys(column_names(description))
+
+
+def rows_to_camel(cur, rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Convert fetched rows (dicts or tuples) to dicts with camelCase keys"""
+    rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+    if not rows:
+        return []
+    if isinstance(rows[0], dict):
+        # Ключи берутся из самой строки: cur.description мог смениться после следующего execute
+        keys = _camel_keys(tuple(rows[0]))
+        return [dict(zip(keys, row.values())) for row in rows]
+    keys = key_map(cur.description)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def row_to_camel(cur, row: Any) -> Dict[str, Any]:
+    """Convert a single fetched row to a dict with camelCase keys"""
+    return rows_to_camel(cur, (row,))[0]
+
+
+def _encode_datetime(value: datetime) -> str:
+    return value.isoformat()
+
+
+def _encode_str(value: Any) -> str:
+    return str(value)
+
+
+# Прямой поиск по точному типу быстрее цепочки isinstance
+_ENCODERS = {
+    datetime: _encode_datetime,
+    date: _encode_datetime,
+    time: _encode_datetime,
+    uuid.UUID: _encode_str,
+    Decimal: _encode_str,
+    memoryview: lambda v: v.tobytes().decode('utf-8', 'replace'),
+    bytes: lambda v: v.decode('utf-8', 'replace'),
+    set: list,
+    frozenset: list,
+}
+
+
+def default(value: Any) -> Any:
+    """Encode values the JSON backends do not handle natively"""
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps_json(obj: Any) -> str:
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':'))
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> str:
+        """Serialize obj to a JSON string"""
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize obj to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    dumps = _dumps_json
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize obj to UTF-8 JSON bytes"""
+        return _dumps_json(obj).encode()
@@ -0,0 +1,300 @@
+"""
+Автоматическое назначение отработок по оценкам за уборку
+Правило «N оценок не выше S за неделю/месяц - D дней отработки» задаётся
+строкой вида 2x2/week=1 (WORK_SHIFT_RULES) или в теле запроса. Низкие
+оценки периода раскладываются за один проход по окнам (неделя с
+понедельника, месяц с первого числа): для каждой комнаты и окна сразу
+считаются оценки под каждый порог. В окне срабатывает самое строгое
+правило периода, отработку получает каждый жилец комнаты. Отработка
+помнит окно (rule_key), поэтому повторный прогон его не начисляет.
+"""
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from duty_calendar import FilterError, parse_day
+
+# Семестр с запасом, как у графика дежурств
+MAX_RANGE_DAYS = int(os.environ.get('WORK_SHIFT_MAX_RANGE_DAYS', 200))
+MAX_RULES = 10
+MAX_SCORES = 5000
+PERIODS = ('week', 'month')
+SCORES = (2, 3, 4, 5)
+DEFAULT_RULES = os.environ.get('WORK_SHIFT_RULES', '2x2/week=1,3x2/week=2')
+NOTIFICATION_TYPE = 'work_shift_assigned'
+
+_RULE_RE = re.compile(r'^\s*(\d+)\s*x\s*(\d)\s*/\s*(week|month)\s*=\s*(\d+)\s*$')
+
+UPSERT_SCORE_SQL = {
+    'postgres': """INSERT INTO cleanliness_scores (room, date, score, inspector) VALUES (%s, %s, %s, %s)
+                   ON CONFLICT (tenant_id, room, date)
+                   DO UPDATE SET score = EXCLUDED.score, inspector = EXCLUDED.inspector, updated_at = CURRENT_TIMESTAMP""",
+    'mysql': """INSERT INTO cleanliness_scores (room, date, score, inspector) VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE score = VALUES(score), inspector = VALUES(inspector), updated_at = CURRENT_TIMESTAMP""",
+}
+
+Score = Tuple[str, date, int]
+ShiftRow = Tuple[str, str, int, str, str]
+
+
+def window_start(period: str, day: date) -> date:
+    return day - timedelta(days=day.weekday()) if period == 'week' else day.replace(day=1)
+
+
+def window_end(period: str, day: date) -> date:
+    if period == 'week':
+        return window_start(period, day) + timedelta(days=6)
+    following = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return following - timedelta(days=1)
+
+
+def _day(value: Any) -> date:
+    # DATE приходит из драйвера датой, из SQLite-заглушки - строкой
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class Rule:
+    """count scores of at most score within one period window -> days of work shift"""
+
+    __slots__ = ('count', 'score', 'period', 'days')
+
+    def __init__(self, count: int, score: int, period: str, days: int):
+        self.count = count
+        self.score = score
+        self.period = period
+        self.days = days
+
+    @property
+    def key(self) -> str:
+        return f'{self.count}x{self.score}/{self.period}'
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'score': self.score, 'period': self.period, 'days': self.days}
+
+
+def _rule(count: Any, score: Any, period: Any, days: Any) -> Rule:
+    if any(not isinstance(v, int) or isinstance(v, bool) for v in (count, score, days)):
+        raise FilterError('Rule count, score and days must be integers')
+    if period not in PERIODS:
+        raise FilterError(f"Rule period must be one of: {', '.join(PERIODS)}")
+    if score not in SCORES[:-1]:
+        raise FilterError('Rule score must be 2, 3 or 4')
+    if not 1 <= count <= 31 or not 1 <= days <= 30:
+        raise FilterError('Rule count must be 1 to 31 and days 1 to 30')
+    return Rule(count, score, period, days)
+
+
+def parse_rules(text: str) -> List[Rule]:
+    """Rules from '2x2/week=1,3x2/week=2'"""
+    rules = []
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        match = _RULE_RE.match(part)
+        if not match:
+            raise FilterError(f'Invalid rule {part!r}, expected <count>x<score>/<week|month>=<days>')
+        count, score, period, days = match.groups()
+        rules.append(_rule(int(count), int(score), period, int(days)))
+    return rules
+
+
+def rules_from_json(value: Any) -> List[Rule]:
+    """Rules from the request body: [{count, score, period, days}]"""
+    if not isinstance(value, list) or not value or len(value) > MAX_RULES:
+        raise FilterError(f'rules must be an array of 1 to {MAX_RULES} rules')
+    if not all(isinstance(item, dict) for item in value):
+        raise FilterError('Each rule must be an object')
+    return [_rule(item.get('count'), item.get('score'), item.get('period'), item.get('days')) for item in value]
+
+
+class AutoShiftSpec:
+    """Validated request of the assignment engine"""
+
+    __slots__ = ('start', 'end', 'rules', 'floor', 'room', 'dry_run', 'assigned_by', 'assigned_by_name')
+
+    def __init__(self, start: date, end: date, rules: List[Rule], floor: Optional[str] = None,
+                 room: Optional[str] = None, dry_run: bool = False, assigned_by: str = '',
+                 assigned_by_name: str = ''):
+        self.start = start
+        self.end = end
+        self.rules = rules
+        self.floor = floor
+        self.room = room
+        self.dry_run = dry_run
+        self.assigned_by = assigned_by
+        self.assigned_by_name = assigned_by_name
+
+    def scan_range(self) -> Tuple[date, date]:
+        """The period widened to whole windows: an edge week is judged on all of its scores"""
+        periods = {rule.period for rule in self.rules}
+        return (min(window_start(p, self.start) for p in periods),
+                max(window_end(p, self.end) for p in periods))
+
+
+def _text(value: Any, max_length: int) -> Optional[str]:
+    text = str(value)[:max_length].strip() if value not in (None, '') else ''
+    return text or None
+
+
+def parse_auto_request(data: Mapping[str, Any]) -> AutoShiftSpec:
+    """Validate the POST body; raises FilterError with a client-facing message"""
+    start = parse_day(data.get('from'), 'from')
+    end = parse_day(data.get('to'), 'to')
+    if not start or not end:
+        raise FilterError('from and to dates required')
+    if end < start:
+        raise FilterError("'to' must not be earlier than 'from'")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise FilterError(f'Date range must not exceed {MAX_RANGE_DAYS} days')
+
+    rules = rules_from_json(data['rules']) if data.get('rules') is not None else parse_rules(DEFAULT_RULES)
+    if not rules:
+        raise FilterError('No work shift rules configured')
+
+    floor = _text(data.get('floor'), 10)
+    if floor is not None and not floor.isdigit():
+        raise FilterError('Invalid floor')
+
+    return AutoShiftSpec(
+        start, end, rules,
+        floor=floor,
+        room=_text(data.get('room'), 50),
+        dry_run=bool(data.get('dryRun')),
+        assigned_by=str(data.get('assignedBy') or ''),
+        assigned_by_name=_text(data.get('assignedByName'), 255) or '',
+    )
+
+
+def parse_scores(value: Any) -> List[Tuple[str, date, int, Optional[str]]]:
+    """(room, date, score, inspector) rows of a bulk score upload"""
+    if not isinstance(value, list) or not value or len(value) > MAX_SCORES:
+        raise FilterError(f'scores must be an array of 1 to {MAX_SCORES} items')
+    rows: Dict[Tuple[str, date], Tuple[str, date, int, Optional[str]]] = {}
+    for item in value:
+        if not isinstance(item, dict):
+            raise FilterError('Each score must be an object')
+        room = _text(item.get('room'), 50)
+        day = parse_day(item.get('date'), 'score')
+        score = item.get('score')
+        if not room or not day:
+            raise FilterError('Each score needs room and date')
+        if score not in SCORES or isinstance(score, bool):
+            raise FilterError('score must be 2, 3, 4 or 5')
+        # Последняя оценка комнаты за день побеждает, как и при повторной записи
+        rows[(room, day)] = (room, day, score, _text(item.get('inspector'), 255))
+    return list(rows.values())
+
+
+def score_filters(spec: AutoShiftSpec) -> Tuple[str, List[Any]]:
+    """WHERE clause and params reading only the scores some rule can count"""
+    start, end = spec.scan_range()
+    conditions, params = ['date BETWEEN %s AND %s', 'score <= %s'], [start, end, max(r.score for r in spec.rules)]
+    if spec.floor:
+        # Номер комнаты - этаж и две цифры (201, 315)
+        conditions.append('room LIKE %s')
+        params.append(f'{spec.floor}__')
+    if spec.room:
+        conditions.append('room = %s')
+        params.append(spec.room)
+    return 'WHERE ' + ' AND '.join(conditions), params
+
+
+class Hit:
+    """A rule that fired for a room in one window"""
+
+    __slots__ = ('room', 'start', 'rule', 'scores')
+
+    def __init__(self, room: str, start: date, rule: Rule, scores: int):
+        self.room = room
+        self.start = start
+        self.rule = rule
+        self.scores = scores
+
+    @property
+    def rule_key(self) -> str:
+        return f'cleanliness:{self.rule.period}:{self.start.isoformat()}'
+
+    @property
+    def reason(self) -> str:
+        window = f'неделя с {self.start:%d.%m.%Y}' if self.rule.period == 'week' else f'{self.start:%m.%Y}'
+        return f'Уборка комнаты {self.room}: оценок не выше {self.rule.score} - {self.scores} ({window})'
+
+
+def evaluate(scores: Iterable[Score], rules: Sequence[Rule], start: Optional[date] = None,
+             end: Optional[date] = None) -> List[Hit]:
+    """Count low scores per (room, window) in one pass and pick the strongest rule of each window.
+    With start/end only windows overlapping that period count"""
+    thresholds = sorted({rule.score for rule in rules})
+    slot = {score: index for index, score in enumerate(thresholds)}
+    # Оценка s попадает во все пороги >= s: номер первого такого порога
+    first = {s: next((i for i, t in enumerate(thresholds) if s <= t), len(thresholds)) for s in SCORES}
+    periods = sorted({rule.period for rule in rules})
+    size = len(thresholds)
+
+    counts: Dict[Tuple[str, str, date], List[int]] = {}
+    for room, day, score in scores:
+        low = first.get(score, size)
+        if low == size:
+            continue
+        day = _day(day)
+        for period in periods:
+            key = (room, period, window_start(period, day))
+            bucket = counts.get(key)
+            if bucket is None:
+                bucket = counts[key] = [0] * size
+            bucket[low] += 1
+
+    # Строгие правила первыми: в окне срабатывает одно, с наибольшим числом дней
+    ordered = {p: sorted((r for r in rules if r.period == p), key=lambda r: (-r.days, r.score, r.count))
+               for p in periods}
+    hits = []
+    for (room, period, window), bucket in counts.items():
+        # scan_range расширен до окон самого длинного периода: при смеси недель и месяцев
+        # туда попадают недели целиком до начала или после конца периода
+        if (start is not None and window_end(period, window) < start) or (end is not None and window > end):
+            continue
+        # Копили по первому порогу - накопительная сумма даёт число оценок не выше каждого порога
+        total, cumulative = 0, []
+        for value in bucket:
+            total += value
+            cumulative.append(total)
+        for rule in ordered[period]:
+            if cumulative[slot[rule.score]] >= rule.count:
+                hits.append(Hit(room, window, rule, cumulative[slot[rule.score]]))
+                break
+    hits.sort(key=lambda hit: (hit.room, hit.start, hit.rule.period))
+    return hits
+
+
+def plan_shifts(hits: Sequence[Hit], residents: Iterable[Mapping[str, Any]],
+                taken: Set[Tuple[str, str]] = frozenset()) -> Tuple[List[ShiftRow], int]:
+    """(user_id, user_name, days, reason, rule_key) per resident of each hit room; skips windows already charged"""
+    by_room: Dict[str, List[Mapping[str, Any]]] = {}
+    for resident in residents:
+        by_room.setdefault(resident['room'], []).append(resident)
+    rows, skipped = [], 0
+    for hit in hits:
+        key = hit.rule_key
+        for resident in by_room.get(hit.room, ()):
+            if (resident['id'], key) in taken:
+                skipped += 1
+                continue
+            rows.append((resident['id'], resident['name'], hit.rule.days, hit.reason, key))
+    return rows, skipped
+
+
+def notification_rows(rows: Iterable[ShiftRow]) -> List[Tuple[str, str, str, str]]:
+    """(user_id, type, title, message) for the assigned shifts, worded like a manual assignment"""
+    return [(user_id, NOTIFICATION_TYPE, 'Назначены отработки',
+             f'Вам назначено {days} дн. отработок. Причина: {reason}')
+            for user_id, _, days, reason, _ in rows]
+
+
+def shifts_summary(scores: int, hits: Sequence[Hit], rows: Sequence[ShiftRow], skipped: int) -> Dict[str, Any]:
+    return {
+        'scores': scores,
+        'windows': len(hits),
+        'rooms': len({hit.room for hit in hits}),
+        'shifts': len(rows),
+        'days': sum(row[2] for row in rows),
+        'skipped': skipped,
+    }
@@ -0,0 +1,101 @@
+"""
+Схлопывание одинаковых одновременных чтений (single flight)
+Пока запрос с ключом K выполняется, такие же запросы не идут в БД, а ждут
+его готовый ответ (не дольше wait секунд, потом выполняются сами). Ключ -
+маршрут, нормализованные параметры и область видимости (тенант), поэтому
+ответ делится только между запросами, которые получили бы его и так.
+Маршруты подключаются явно, декоратором в приложении.
+"""
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from instrumentation import registry
+
+SINGLE_FLIGHT_EVENTS = registry.counter(
+    'single_flight_requests_total',
+    'Coalesced reads: miss = ran the query, hit = shared a result, timeout/error = ran alone after waiting, '
+    'bypass = not eligible', ('route', 'event'))
+
+Frozen = Tuple[int, bytes, List[Tuple[str, str]]]
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'shared')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.shared = False
+
+
+class SingleFlight:
+    """One call per key at a time; concurrent callers with the same key reuse its result"""
+
+    def __init__(self, name: str, wait: float = 2.0):
+        self.name = name
+        self.wait = wait
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], shareable: Callable[[Any], bool] = lambda result: True) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(self.wait) and call.shared:
+                SINGLE_FLIGHT_EVENTS.inc(self.name, 'hit')
+                return call.result
+            SINGLE_FLIGHT_EVENTS.inc(self.name, 'error' if call.done.is_set() else 'timeout')
+            return fn()
+
+        SINGLE_FLIGHT_EVENTS.inc(self.name, 'miss')
+        try:
+            call.result = fn()
+            call.shared = shareable(call.result)
+            return call.result
+        finally:
+            # Исключение ведущего не раздаётся: ожидающие выполнят запрос сами
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def bypass(self) -> None:
+        SINGLE_FLIGHT_EVENTS.inc(self.name, 'bypass')
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+def request_key(*scope: Hashable) -> Hashable:
+    """Flask request shape: path, sorted query args, If-None-Match and the caller's scope"""
+    from flask import request
+    return (request.path, scope, tuple(sorted(request.args.items(multi=True))),
+            request.headers.get('If-None-Match'))
+
+
+def flask_view(app, flight: SingleFlight, key: Callable[[], Optional[Hashable]]):
+    """Decorator coalescing a view; key() returns None for requests that must run on their own"""
+
+    def freeze(rv) -> Frozen:
+        response = app.make_response(rv)
+        return response.status_code, response.get_data(), list(response.headers.items())
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            shape = key()
+            if shape is None:
+                flight.bypass()
+                return view(*args, **kwargs)
+            # Ответ замораживается в байты: у каждого ждущего свой объект Response,
+            # а after_request (CORS, cookie) отрабатывает для каждого запроса отдельно
+            status, body, headers = flight.do(shape, lambda: freeze(view(*args, **kwargs)),
+                                              shareable=lambda frozen: frozen[0] < 500)
+            return app.response_class(body, status=status, headers=headers)
+        return wrapper
+
+    return decorator
@@ -1,6 +1,6 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import { User, AuthState } from '@/types/auth';
-import { api } from '@/lib/api';
+import { api, setAuthToken, setUnauthorizedHandler } from '@/lib/api';
 
 interface AuthContextType extends AuthState {
   login: (email: string, password: string, rememberMe: boolean) => Promise<void>;
@@ -16,6 +16,13 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   });
 
   useEffect(() => {
+    const expiry = localStorage.getItem('user_expiry');
+    if (expiry && new Date(expiry) < new Date()) {
+      localStorage.removeItem('user');
+      localStorage.removeItem('user_expiry');
+      localStorage.removeItem('auth_token');
+    }
+
     const savedUser = localStorage.getItem('user');
     const sessionUser = sessionStorage.getItem('user');
     
@@ -23,6 +30,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     
     if (userToRestore) {
       const parsedUser = JSON.parse(userToRestore);
+      setAuthToken((savedUser ? localStorage : sessionStorage).getItem('auth_token'));
       
       setAuthState({
         user: parsedUser,
@@ -33,7 +41,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
 
   const login = async (email: string, password: string, rememberMe: boolean) => {
     try {
-      const { user } = await api.users.login(email, password);
+      const { user, token } = await api.users.login(email, password);
+      setAuthToken(token);
 
       setAuthState({
         user: user,
@@ -45,8 +54,10 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         expiryDate.setMonth(expiryDate.getMonth() + 1);
         localStorage.setItem('user', JSON.stringify(user));
         localStorage.setItem('user_expiry', expiryDate.toISOString());
+        if (token) localStorage.setItem('auth_token', token);
       } else {
         sessionStorage.setItem('user', JSON.stringify(user));
+        if (token) sessionStorage.setItem('auth_token', token);
       }
     } catch (error: any) {
       throw new Error(error.message || 'Неверный email или пароль');
@@ -58,11 +69,20 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       user: null,
       isAuthenticated: false,
     });
+    setAuthToken(null);
     localStorage.removeItem('user');
     localStorage.removeItem('user_expiry');
+    localStorage.removeItem('auth_token');
     sessionStorage.removeItem('user');
+    sessionStorage.removeItem('auth_token');
   };
 
+  // Токен истёк или отозван - сессия заканчивается, пользователь входит заново
+  useEffect(() => {
+    setUnauthorizedHandler(logout);
+    return () => setUnauthorizedHandler(null);
+  }, []);
+
   return (
     <AuthContext.Provider value={{ ...authState, login, logout }}>
       {children}
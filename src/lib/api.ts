@@ -1,5 +1,19 @@
 const API_URL = import.meta.env.VITE_API_URL || '/api';
 
+// Токен из ответа входа; backend проверяет по нему права на каждый запрос
+let authToken: string | null = null;
+
+export const setAuthToken = (token: string | null) => {
+  authToken = token;
+};
+
+// Вызывается, когда backend отверг токен (истёк, сменился SECRET_KEY): нужно войти заново
+let onUnauthorized: (() => void) | null = null;
+
+export const setUnauthorizedHandler = (handler: (() => void) | null) => {
+  onUnauthorized = handler;
+};
+
 interface ApiResponse<T> {
   success: boolean;
   data?: T;
@@ -18,6 +32,7 @@ async function apiRequest<T>(
     method,
     headers: {
       'Content-Type': 'application/json',
+      ...(authToken ? { Authorization: `Bearer ${authToken}` } : {}),
     },
   };
 
@@ -40,6 +55,9 @@ async function apiRequest<T>(
     const data = await response.json();
 
     if (!response.ok) {
+      if (response.status === 401 && authToken && onUnauthorized) {
+        onUnauthorized();
+      }
       console.error('API Error:', {
         url,
         status: response.status,
@@ -61,9 +79,9 @@ export const api = {
   users: {
     getAll: () => apiRequest<{ users: any[] }>('users', 'GET'),
     login: (email: string, password: string) =>
-      apiRequest<{ user: any }>('users', 'POST', { action: 'login', email, password }),
+      apiRequest<{ user: any; token: string | null }>('users', 'POST', { action: 'login', email, password }),
     register: (email: string, password: string, name: string, room?: string, group?: string) =>
-      apiRequest<{ user: any }>('users', 'POST', { action: 'register', email, password, name, room, group }),
+      apiRequest<{ user: any; token: string | null }>('users', 'POST', { action: 'register', email, password, name, room, group }),
     update: (userId: string, updates: any) =>
       apiRequest<{ user: any }>('users', 'PUT', { userId, ...updates }),
   },
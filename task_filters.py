@@ -0,0 +1,134 @@
+"""
+Серверные фильтры списка задач
+Разбор status/priority/assignedTo/dueFrom/dueTo/view/limit/offset в условие
+WHERE под индексы (assigned_to, status) и частичный индекс открытых задач
+по due_date. Представления overdue и due-soon зависят от текущего времени,
+поэтому момент отсчёта округляется до минуты и входит в ETag.
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from duty_calendar import FilterError, parse_day
+
+TASK_STATUSES = ('pending', 'in_progress', 'completed', 'cancelled')
+TASK_PRIORITIES = ('low', 'medium', 'high', 'urgent')
+
+# Литералы, а не параметры: так планировщик Postgres сопоставляет условие
+# с частичным индексом idx_tasks_open_due_date и при подготовленных запросах
+OPEN_CONDITION = "t.status IN ('pending', 'in_progress')"
+
+VIEWS = ('overdue', 'due-soon')
+DEFAULT_DUE_SOON_DAYS = 3
+MAX_DUE_SOON_DAYS = 30
+MAX_LIMIT = 500
+
+
+class TaskQuery:
+    """WHERE/ORDER BY/LIMIT parts of the tasks listing and the ETag params"""
+
+    __slots__ = ('where', 'params', 'order', 'limit', 'offset', 'etag_params')
+
+    def __init__(self, where: str, params: List[Any], order: str, limit: Optional[int], offset: int,
+                 etag_params: Dict[str, Any]):
+        self.where = where
+        self.params = params
+        self.order = order
+        self.limit = limit
+        self.offset = offset
+        self.etag_params = etag_params
+
+    def tail(self) -> Tuple[str, List[Any]]:
+        """WHERE ... ORDER BY ... [LIMIT/OFFSET] and its params"""
+        sql = f'{self.where} ORDER BY {self.order}'
+        params = list(self.params)
+        if self.limit is not None:
+            sql += ' LIMIT %s OFFSET %s'
+            params += [self.limit, self.offset]
+        return sql, params
+
+
+def _choices(args: Mapping[str, str], name: str, allowed: Tuple[str, ...]) -> List[str]:
+    raw = args.get(name)
+    if not raw:
+        return []
+    values = list(dict.fromkeys(v.strip() for v in raw.split(',') if v.strip()))
+    for value in values:
+        if value not in allowed:
+            raise FilterError(f'Invalid {name}')
+    return values
+
+
+def _int_arg(args: Mapping[str, str], name: str, default: Optional[int], low: int, high: int) -> Optional[int]:
+    raw = args.get(name)
+    if raw in (None, ''):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise FilterError(f'Invalid {name}')
+    if not low <= value <= high:
+        raise FilterError(f'{name} must be between {low} and {high}')
+    return value
+
+
+def task_query(args: Mapping[str, str], now: Optional[datetime] = None) -> TaskQuery:
+    """Build the filtered listing; raises FilterError with a client-facing message"""
+    conditions: List[str] = []
+    params: List[Any] = []
+    etag_params: Dict[str, Any] = dict(args)
+
+    statuses = _choices(args, 'status', TASK_STATUSES)
+    if statuses:
+        conditions.append(f"t.status IN ({', '.join(['%s'] * len(statuses))})")
+        params += statuses
+
+    priorities = _choices(args, 'priority', TASK_PRIORITIES)
+    if priorities:
+        conditions.append(f"t.priority IN ({', '.join(['%s'] * len(priorities))})")
+        params += priorities
+
+    assigned_to = args.get('assignedTo')
+    if assigned_to == 'none':
+        conditions.append('t.assigned_to IS NULL')
+    elif assigned_to:
+        try:
+            uuid.UUID(assigned_to)
+        except ValueError:
+            raise FilterError('Invalid Assigned To ID')
+        conditions.append('t.assigned_to = %s')
+        params.append(assigned_to)
+
+    due_from = parse_day(args.get('dueFrom'), 'dueFrom')
+    due_to = parse_day(args.get('dueTo'), 'dueTo')
+    if due_from:
+        conditions.append('t.due_date >= %s')
+        params.append(datetime.combine(due_from, datetime.min.time()))
+    if due_to:
+        # dueTo включительно: до начала следующего дня
+        conditions.append('t.due_date < %s')
+        params.append(datetime.combine(due_to + timedelta(days=1), datetime.min.time()))
+
+    view = args.get('view')
+    if view and view not in VIEWS:
+        raise FilterError('Invalid view')
+    if view:
+        moment = (now or datetime.now()).replace(second=0, microsecond=0)
+        etag_params['asOf'] = moment.isoformat()
+        conditions.append(OPEN_CONDITION)
+        if view == 'overdue':
+            conditions.append('t.due_date < %s')
+            params.append(moment)
+        else:
+            days = _int_arg(args, 'days', DEFAULT_DUE_SOON_DAYS, 1, MAX_DUE_SOON_DAYS)
+            conditions.append('t.due_date >= %s AND t.due_date < %s')
+            params += [moment, moment + timedelta(days=days)]
+
+    # По сроку сортируем, когда выборка и так идёт по due_date
+    order = 't.due_date ASC, t.id' if view or due_from or due_to else 't.created_at DESC'
+
+    limit = _int_arg(args, 'limit', None, 1, MAX_LIMIT)
+    offset = _int_arg(args, 'offset', 0, 0, 1_000_000)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return TaskQuery(where, params, order, limit, offset or 0, etag_params)
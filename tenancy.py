@@ -0,0 +1,130 @@
+"""
+Несколько общежитий (тенантов) в одном развёртывании
+Тенант запроса определяется хостом (TENANT_HOSTS) или заголовком X-Tenant-Id,
+без них - тенант по умолчанию. Каждый тенант живёт на шарде из карты
+TENANT_SHARDS (по умолчанию - основная БД). В Postgres строки тенантов
+разделяются колонкой tenant_id и политиками RLS (V0025): соединение
+открывается с app.tenant_id, поэтому у тенанта свой пул, а SQL обработчиков
+не меняется. Лимиты запросов, ETag и кэши ведутся по тенантам.
+"""
+import os
+import re
+import threading
+from typing import Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+DEFAULT_TENANT = 'default'
+DEFAULT_SHARD = 'main'
+TENANT_HEADER = 'X-Tenant-Id'
+# Настройка сессии, которую читают политики RLS (функция app_tenant() в V0025)
+TENANT_SETTING = 'app.tenant_id'
+
+TENANT_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+T = TypeVar('T')
+
+
+def parse_map(value: str) -> Dict[str, str]:
+    """'a=x,b=y' -> {'a': 'x', 'b': 'y'}; a value may itself contain '='"""
+    result = {}
+    for item in value.split(','):
+        key, sep, val = item.partition('=')
+        if sep and key.strip() and val.strip():
+            result[key.strip()] = val.strip()
+    return result
+
+
+def postgres_options(tenant: str) -> str:
+    """libpq options that bind a new connection to a tenant"""
+    return f'-c {TENANT_SETTING}={tenant}'
+
+
+def mysql_database(database: str, tenant: str) -> str:
+    """MySQL has no RLS: every tenant but the default one gets its own database"""
+    return database if tenant == DEFAULT_TENANT else f"{database}_{tenant.replace('-', '_')}"
+
+
+class TenantConfig:
+    """Known tenants, host aliases, shard placement and per-tenant rate limits"""
+
+    def __init__(self, tenants: Iterable[str], hosts: Optional[Dict[str, str]] = None,
+                 placement: Optional[Dict[str, str]] = None, shards: Optional[Dict[str, str]] = None,
+                 rate_limits: Optional[Dict[str, int]] = None):
+        self.tenants = frozenset(tenants) | {DEFAULT_TENANT}
+        for tenant in self.tenants:
+            if not TENANT_ID.match(tenant):
+                raise ValueError(f'Invalid tenant id: {tenant!r}')
+        self.hosts = {host.lower(): tenant for host, tenant in (hosts or {}).items()}
+        self.placement = dict(placement or {})
+        self.shards = dict(shards or {})
+        self.rate_limits = dict(rate_limits or {})
+        for tenant in [*self.hosts.values(), *self.placement, *self.rate_limits]:
+            if tenant not in self.tenants:
+                raise ValueError(f'Tenant {tenant!r} is not listed in TENANTS')
+        for shard in self.placement.values():
+            if shard != DEFAULT_SHARD and shard not in self.shards:
+                raise ValueError(f'Shard {shard!r} has no entry in SHARD_URLS')
+
+    @classmethod
+    def from_env(cls) -> 'TenantConfig':
+        return cls(
+            [t.strip() for t in os.environ.get('TENANTS', '').split(',') if t.strip()],
+            hosts=parse_map(os.environ.get('TENANT_HOSTS', '')),
+            placement=parse_map(os.environ.get('TENANT_SHARDS', '')),
+            shards=parse_map(os.environ.get('SHARD_URLS', '')),
+            rate_limits={t: int(v) for t, v in parse_map(os.environ.get('TENANT_RATE_LIMITS', '')).items()},
+        )
+
+    def resolve(self, host: Optional[str], header: Optional[str]) -> Optional[str]:
+        """Tenant of a request; None when it names an unknown tenant or contradicts the host"""
+        tenant = self.hosts.get((host or '').split(':', 1)[0].lower())
+        requested = (header or '').strip().lower() or None
+        if tenant is not None:
+            # Заголовок не может увести запрос с хоста общежития к чужим данным
+            return tenant if requested in (None, tenant) else None
+        if requested is None:
+            return DEFAULT_TENANT
+        return requested if requested in self.tenants else None
+
+    def shard(self, tenant: str) -> str:
+        return self.placement.get(tenant, DEFAULT_SHARD)
+
+    def shard_url(self, tenant: str, main_url: Optional[str]) -> Optional[str]:
+        """Connection URL of the tenant's shard; main_url is the default database"""
+        shard = self.shard(tenant)
+        return main_url if shard == DEFAULT_SHARD else self.shards[shard]
+
+    def rate_limit(self, tenant: str, default: int) -> int:
+        return self.rate_limits.get(tenant, default)
+
+
+class PerTenant(Generic[T]):
+    """One instance per tenant (pool, router, cache), created on the tenant's first request"""
+
+    def __init__(self, factory: Callable[[str], T]):
+        self._factory = factory
+        self._items: Dict[str, T] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant: str) -> T:
+        item = self._items.get(tenant)
+        if item is None:
+            with self._lock:
+                item = self._items.get(tenant)
+                if item is None:
+                    item = self._items[tenant] = self._factory(tenant)
+        return item
+
+    def items(self) -> List[Tuple[str, T]]:
+        return sorted(self._items.items(), key=lambda pair: pair[0])
+
+
+def init_flask(app, config: TenantConfig) -> None:
+    """Resolve g.tenant before every request; unknown tenants get 404 without touching the DB"""
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def _resolve_tenant():
+        tenant = config.resolve(request.host, request.headers.get(TENANT_HEADER))
+        if tenant is None:
+            return jsonify({'error': 'Unknown tenant'}), 404
+        g.tenant = tenant
@@ -0,0 +1,355 @@
+"""
+Обработчик фоновых заданий (таблица jobs, см. jobs.py)
+Обходит всех тенантов из TENANTS, забирает готовые задания по приоритету и
+выполняет их вне запросов. Процессов можно запустить несколько: задания
+разбираются FOR UPDATE SKIP LOCKED. Пока задание выполняется, аренда
+продлевается каждые JOB_HEARTBEAT секунд с отдельного соединения; задания
+упавшего процесса через JOB_LEASE секунд возвращаются в очередь.
+
+Запуск:
+    python worker.py            # Postgres (DATABASE_URL)
+    python worker.py --mysql    # MySQL (MYSQL_HOST, MYSQL_DATABASE, ...)
+    python worker.py --once     # разобрать очередь и выйти (cron)
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+from duty_calendar import FilterError
+from duty_roster import parse_roster_request, plan_roster, roster_rows, roster_summary
+from http_cache import bump_versions
+from instrumentation import registry
+from jobs import JOB_HANDLERS, JOB_HEARTBEAT, JOB_LEASE, claim, fail, finish, job_handler, reclaim, renew
+from tenancy import TenantConfig, mysql_database, postgres_options
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+MYSQL_HOST = os.environ.get('MYSQL_HOST', 'localhost')
+MYSQL_PORT = int(os.environ.get('MYSQL_PORT', 3306))
+MYSQL_USER = os.environ.get('MYSQL_USER', 'root')
+MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', '')
+MYSQL_DATABASE = os.environ.get('MYSQL_DATABASE', 'dormitory_portal')
+
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+CLEANUP_BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', 1000))
+
+JOBS_PROCESSED = registry.counter(
+    'jobs_processed_total', 'Background jobs by outcome: done, retry or failed', ('kind', 'outcome'))
+
+logger = logging.getLogger('dormitory.worker')
+
+
+# ============= JOB HANDLERS =============
+
+@job_handler('duty_roster')
+def duty_roster_job(conn, cur, payload: Dict[str, Any], dialect: str) -> Dict[str, Any]:
+    """Generate and insert a roster queued by POST /api/duty-schedule/roster with async: true"""
+    spec = parse_roster_request(payload)
+    residents, roster = plan_roster(cur, spec)
+    rows = roster_rows(roster)
+    if rows:
+        if dialect == 'mysql':
+            cur.executemany(
+                "INSERT INTO duty_schedule (id, user_id, date, zone, status) VALUES (%s, %s, %s, %s, 'pending')", rows
+            )
+        else:
+            from psycopg2.extras import execute_values
+            execute_values(cur, "INSERT INTO duty_schedule (id, user_id, date, zone, status) VALUES %s",
+                           rows, template="(%s, %s, %s, %s, 'pending')", page_size=len(rows))
+        bump_versions(cur, 'duty_schedule', dialect=dialect)
+    summary = roster_summary(roster, residents)
+    summary['created'] = len(rows)
+    return {'roster': summary}
+
+
+def _in(ids: Sequence[Any]) -> str:
+    return ', '.join(['%s'] * len(ids))
+
+
+def purge(conn, cur, table: str, dialect: str, older_than_days: Optional[int] = None) -> int:
+    """Delete rows (older than N days, or all) in batches, committing each one so locks stay short"""
+    where, params = 'id <= %s', []
+    if older_than_days is not None:
+        where += ' AND created_at < %s'
+        params.append(datetime.now() - timedelta(days=older_than_days))
+    cur.execute(f"SELECT MAX(id) AS max_id FROM {table}")
+    # Записи, появившиеся во время очистки, остаются
+    max_id = cur.fetchone()['max_id']
+    deleted = 0
+    while max_id is not None:
+        cur.execute(f"SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT %s", (max_id, *params, CLEANUP_BATCH_SIZE))
+        ids = [row['id'] for row in cur.fetchall()]
+        if not ids:
+            break
+        cur.execute(f"DELETE FROM {table} WHERE id IN ({_in(ids)})", ids)
+        deleted += cur.rowcount
+        bump_versions(cur, table, dialect=dialect)
+        conn.commit()
+    return deleted
+
+
+@job_handler('cleanup_action_logs')
+def cleanup_action_logs_job(conn, cur, payload: Dict[str, Any], dialect: str) -> Dict[str, Any]:
+    """Clear the action log (DELETE /api/logs) or apply retention (olderThanDays)"""
+    return {'deleted': purge(conn, cur, 'action_logs', dialect, payload.get('olderThanDays'))}
+
+
+@job_handler('cleanup_notifications')
+def cleanup_notifications_job(conn, cur, payload: Dict[str, Any], dialect: str) -> Dict[str, Any]:
+    """Notification retention"""
+    return {'deleted': purge(conn, cur, 'notifications', dialect, payload.get('olderThanDays'))}
+
+
+@job_handler('archive_work_shifts')
+def archive_work_shifts_job(conn, cur, payload: Dict[str, Any], dialect: str) -> Dict[str, Any]:
+    """Move completed shifts (every active one with all: true) to archived_work_shifts in batches"""
+    where = 'is_archived = FALSE' if payload.get('all') else 'is_archived = FALSE AND COALESCE(completed_days, 0) >= days'
+    archived = 0
+    while True:
+        cur.execute(f"SELECT id FROM work_shifts WHERE {where} ORDER BY id LIMIT %s", (CLEANUP_BATCH_SIZE,))
+        ids = [row['id'] for row in cur.fetchall()]
+        if not ids:
+            break
+        cur.execute(
+            f"""INSERT INTO archived_work_shifts
+                (user_id, user_name, days, reason, assigned_by, assigned_by_name, assigned_at)
+                SELECT user_id, user_name, days, reason, assigned_by, assigned_by_name, assigned_at
+                FROM work_shifts WHERE id IN ({_in(ids)})""", ids
+        )
+        cur.execute(f"UPDATE work_shifts SET is_archived = TRUE, archived_at = CURRENT_TIMESTAMP WHERE id IN ({_in(ids)})",
+                    ids)
+        archived += len(ids)
+        bump_versions(cur, 'work_shifts', 'archived_work_shifts', dialect=dialect)
+        conn.commit()
+    return {'archived': archived}
+
+
+@job_handler('refresh_complaint_counts')
+def refresh_complaint_counts_job(conn, cur, payload: Dict[str, Any], dialect: str) -> Dict[str, Any]:
+    """Recount the complaint_counts rollup from complaints (Postgres only, V0021)"""
+    # Счётчики меняются в транзакциях жалоб: блокировка ждёт их завершения и не даёт
+    # затереть прибавку, сделанную между подсчётом и записью
+    cur.execute("LOCK TABLE complaint_counts IN EXCLUSIVE MODE")
+    cur.execute("""
+        INSERT INTO complaint_counts (category, status, total)
+        SELECT category, status, COUNT(*) FROM complaints GROUP BY category, status
+        ON CONFLICT ON CONSTRAINT complaint_counts_pkey DO UPDATE SET total = EXCLUDED.total
+        WHERE complaint_counts.total IS DISTINCT FROM EXCLUDED.total
+    """)
+    changed = cur.rowcount
+    cur.execute("""
+        UPDATE complaint_counts c SET total = 0
+        WHERE total <> 0 AND NOT EXISTS (
+            SELECT 1 FROM complaints WHERE category = c.category AND status = c.status)
+    """)
+    changed += cur.rowcount
+    if changed:
+        bump_versions(cur, 'complaints', dialect=dialect)
+    return {'changed': changed}
+
+
+# ============= WORKER =============
+
+def connect(dialect: str, tenant_config: TenantConfig, tenant: str):
+    """Dedicated connection to a tenant's database (dict rows, no pool)"""
+    if dialect == 'mysql':
+        import pymysql
+        from pymysql.cursors import DictCursor
+        host, _, port = tenant_config.shard_url(tenant, f'{MYSQL_HOST}:{MYSQL_PORT}').partition(':')
+        return pymysql.connect(host=host, port=int(port or MYSQL_PORT), user=MYSQL_USER, password=MYSQL_PASSWORD,
+                               database=mysql_database(MYSQL_DATABASE, tenant), cursorclass=DictCursor,
+                               charset='utf8mb4')
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    return psycopg2.connect(tenant_config.shard_url(tenant, DATABASE_URL), cursor_factory=RealDictCursor,
+                            options=postgres_options(tenant))
+
+
+class TenantConnections:
+    """One dedicated connection per tenant, reopened after a failure"""
+
+    def __init__(self, dialect: str, tenant_config: TenantConfig):
+        self.dialect = dialect
+        self.tenant_config = tenant_config
+        self._connections: Dict[str, Any] = {}
+
+    def get(self, tenant: str):
+        conn = self._connections.get(tenant)
+        if conn is None:
+            conn = self._connections[tenant] = connect(self.dialect, self.tenant_config, tenant)
+        return conn
+
+    def drop(self, tenant: str) -> None:
+        conn = self._connections.pop(tenant, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        for tenant in list(self._connections):
+            self.drop(tenant)
+
+
+class Heartbeat(threading.Thread):
+    """Renews the lease of a running job until stopped
+
+    The handler's transaction stays open for the whole job, so the renewal
+    commits over its own connection, opened only if the job outlives one
+    interval.
+    """
+
+    def __init__(self, worker: 'Worker', tenant: str, job: Dict[str, Any], interval: float = JOB_HEARTBEAT):
+        super().__init__(name=f"heartbeat-{job['id']}", daemon=True)
+        self.worker = worker
+        self.tenant = tenant
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        conn = None
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    if conn is None:
+                        conn = connect(self.worker.dialect, self.worker.tenant_config, self.tenant)
+                    cur = conn.cursor()
+                    try:
+                        owned = renew(cur, self.job, self.worker.name)
+                        conn.commit()
+                    finally:
+                        cur.close()
+                    if not owned:
+                        return
+                except Exception:
+                    # Следующая попытка - на новом соединении; аренда длиннее интервала
+                    logger.warning('job %s: lease renewal failed', self.job['id'], exc_info=True)
+                    if conn is not None:
+                        try:
+                            conn.close()
+                        except Exception:
+                            pass
+                        conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+class Worker:
+    """Polls the queue of every tenant over one connection per tenant"""
+
+    def __init__(self, dialect: str, tenant_config: TenantConfig, name: Optional[str] = None):
+        self.dialect = dialect
+        self.tenant_config = tenant_config
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.connections = TenantConnections(dialect, tenant_config)
+        self.stopping = threading.Event()
+
+    def process(self, conn, cur, job: Dict[str, Any], tenant: str) -> str:
+        """Run one claimed job; returns its outcome"""
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            fail(cur, job, f"Unknown job kind: {job['kind']}", self.dialect, permanent=True)
+            conn.commit()
+            return 'failed'
+        heartbeat = Heartbeat(self, tenant, job)
+        heartbeat.start()
+        try:
+            return self._run_handler(conn, cur, job, handler)
+        finally:
+            # После commit: до него продление ждало бы блокировки строки, взятой finish/fail
+            heartbeat.stop()
+
+    def _run_handler(self, conn, cur, job: Dict[str, Any], handler) -> str:
+        try:
+            result = handler(conn, cur, job['payload'], self.dialect)
+            finish(cur, job, result)
+            conn.commit()
+            return 'done'
+        except Exception as e:
+            conn.rollback()
+            # Ошибка во входных данных не исправится повтором
+            final = fail(cur, job, str(e) or type(e).__name__, self.dialect, permanent=isinstance(e, FilterError))
+            conn.commit()
+            logger.warning('job %s (%s) failed on attempt %s: %s', job['id'], job['kind'], job['attempts'], e,
+                           exc_info=not isinstance(e, FilterError))
+            return 'failed' if final else 'retry'
+
+    def drain(self, tenant: str) -> int:
+        """Process ready jobs of one tenant until the queue is empty"""
+        conn = self.connections.get(tenant)
+        cur = conn.cursor()
+        try:
+            reclaimed = reclaim(cur, self.dialect, JOB_LEASE)
+            conn.commit()
+            if reclaimed:
+                logger.warning('%s: %s abandoned jobs returned to the queue', tenant, reclaimed)
+            processed = 0
+            while not self.stopping.is_set():
+                job = claim(conn, cur, self.name)
+                if job is None:
+                    break
+                outcome = self.process(conn, cur, job, tenant)
+                JOBS_PROCESSED.inc(job['kind'], outcome)
+                processed += 1
+            return processed
+        finally:
+            cur.close()
+
+    def run_once(self) -> int:
+        processed = 0
+        for tenant in sorted(self.tenant_config.tenants):
+            if self.stopping.is_set():
+                break
+            try:
+                processed += self.drain(tenant)
+            except Exception:
+                # Недоступный шард не останавливает остальных тенантов
+                logger.exception('%s: queue poll failed', tenant)
+                self.connections.drop(tenant)
+        return processed
+
+    def run(self, interval: float = JOB_POLL_INTERVAL) -> None:
+        logger.info('worker %s started (%s, tenants: %s)', self.name, self.dialect,
+                    ', '.join(sorted(self.tenant_config.tenants)))
+        while not self.stopping.is_set():
+            if not self.run_once():
+                self.stopping.wait(interval)
+        self.connections.close()
+        logger.info('worker %s stopped', self.name)
+
+    def stop(self, *_) -> None:
+        """Finish the current job and exit"""
+        self.stopping.set()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mysql', action='store_true', help='use the MySQL database of app_mysql.py')
+    parser.add_argument('--once', action='store_true', help='drain the queues once and exit')
+    parser.add_argument('--interval', type=float, default=JOB_POLL_INTERVAL, help='seconds between empty polls')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    worker = Worker('mysql' if args.mysql else 'postgres', TenantConfig.from_env())
+    if args.once:
+        logger.info('processed %s jobs', worker.run_once())
+        worker.connections.close()
+        return
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(args.interval)
+
+
+if __name__ == '__main__':
+    main()